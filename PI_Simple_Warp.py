@@ -47,6 +47,7 @@ from SandyBarbourUtilities import *
 from PythonScriptMessaging import *
 from XPLMProcessing import *
 from XPLMUtilities import *
+from XPLMScenery import *
 
 from numbers import Number
 from datetime import datetime
@@ -54,15 +55,28 @@ from collections import namedtuple
 from timeit import default_timer as timer
 import os, platform, string, ConfigParser, math
 
+from SimpleWarp.NavData import NavAid, FILE_INF, FindNavDataFile, ReadCycle
+from SimpleWarp.Geodesy import NavDistance
+from SimpleWarp.Engine import WarpEngine, WarpSettings, WarpError, SUGGEST_COUNT, AI_PLANES, AI_KEYS
+from SimpleWarp.Cruise import FastCruise
+from SimpleWarp.Journal import WarpJournal
+from SimpleWarp.FindCache import FindCache
+from SimpleWarp.Loader import NavIndexLoader
+from SimpleWarp.Prefs import PrefStore
+from SimpleWarp.Log import AsyncLog, LEVELS, INFO
+from SimpleWarp.Stats import ACTIONS
+from SimpleWarp.View import WindowView
+from SimpleWarp.WarpQueue import (WarpQueue, WarpResult, ParseRequest,
+                                  MSG_WARP_REQUEST, MSG_WARP_CANCEL, MSG_WARP_RESULT)
+
 #import pyperclip
 
 FILE_INI = "Simple_Warp.ini"
 FILE_LOG = "Simple_Warp.txt"
 FILE_PRE = "Simple_Warp.prf"
-FILE_INF = "cycle_info.txt"
-FILE_AWY = "earth_awy.dat"
-FILE_FIX = "earth_fix.dat"
-FILE_NAV = "earth_nav.dat"
+FILE_NAC = "Simple_Warp.nav"
+FILE_JRN = "Simple_Warp.jrn"
+FILE_IDS = "Simple_Warp.ids"
 
 SHOW_MENU = 1
 PREF_MENU = 2
@@ -71,45 +85,278 @@ MARGIN_W = 30
 MARGIN_H = 30
 WINDOW_W = 350
 WINDOW_H = 50
+SUGGEST_H = 15
+
+# Seconds between a preference change and its write
+PREFS_DELAY = 5.0
+
+# Timings published per action: count, p50, p95, max in ms
+STATS_DATAREF  = "lzh/python/Simple_Warp/stats/{}"
+STATS_INTERVAL = 1.0   # seconds between refreshes of the stats section
+DRE_SIGNATURE  = "xplanesdk.examples.DataRefEditor"
+DRE_ADD_DATAREF = 0x01000000
 
-NavType = {
-    xplm_Nav_Unknown:       "UKN",
-    xplm_Nav_Airport:       "APT",
-    xplm_Nav_NDB:           "NDB",
-    xplm_Nav_VOR:           "VOR",
-    xplm_Nav_ILS:           "ILS",
-    xplm_Nav_Localizer:     "LOC",
-    xplm_Nav_GlideSlope:    "GS",
-    xplm_Nav_OuterMarker:   "OM",
-    xplm_Nav_MiddleMarker:  "MM",
-    xplm_Nav_InnerMarker:   "IM",
-    xplm_Nav_Fix:           "FIX",
-    xplm_Nav_DME:           "DME",
-    xplm_Nav_LatLon:        "L/L"}
-
-NavAid  = namedtuple('NavAid' , ['typ', 'lat', 'lon','name','height','freq'])
-Segment = namedtuple('Segment',['Start','End'])
 Coords  = namedtuple('Coords' ,['lat','lon'])
 
+DATAREFS = {
+    "lat":         "sim/flightmodel/position/latitude",
+    "lon":         "sim/flightmodel/position/longitude",
+    "local_x":     "sim/flightmodel/position/local_x",
+    "local_y":     "sim/flightmodel/position/local_y",
+    "local_z":     "sim/flightmodel/position/local_z",
+    "elevation":   "sim/flightmodel/position/elevation",
+    "ias":         "sim/flightmodel/position/indicated_airspeed",
+    "groundspeed": "sim/flightmodel/position/groundspeed",
+    "ap_altitude": "sim/cockpit/autopilot/altitude",
+    "gauge_alt":   "sim/cockpit2/gauges/indicators/altitude_ft_pilot",
+    "num_tanks":   "sim/aircraft/overflow/acf_num_tanks",
+    "num_engines": "sim/aircraft/engine/acf_num_engines",
+    "tank_rat":    "sim/aircraft/overflow/acf_tank_rat",
+    "m_fuel":      "sim/flightmodel/weight/m_fuel",
+    "m_total":     "sim/flightmodel/weight/m_total",
+    "fuel_flow":   "sim/cockpit2/engine/indicators/fuel_flow_kg_sec",
+    "zulu_time":   "sim/time/zulu_time_sec",
+    "paused":      "sim/time/paused"}
+# The AI aircraft positions, plane1_x to plane19_z
+for plane in AI_KEYS:
+    for key in plane:
+        DATAREFS[key] = "sim/multiplayer/position/" + key
+
+# Height after a warp, cycled by the height button
+WARP_HEIGHTS = ["KEEP", "TERRAIN", "AUTOPILOT"]
+HEIGHT_LABELS = {
+    "KEEP":      "Keep altitude after warp",
+    "TERRAIN":   "Keep altitude, clear of terrain",
+    "AUTOPILOT": "Autopilot altitude, clear of terrain"}
+
+# Name in Simple_Warp.prf, type, default, minimum, allowed values
+PREFS = [
+    ("Translucent",    bool, True),
+    ("Debug_Level",    str,  "INFO", None, LEVELS),
+    ("Warp_Dst",       int,  10),     # nm short of the destination
+    ("Warp_Min",       int,  20),     # nm, shortest warp worth doing
+    ("Warp_Max",       int,  100),    # nm
+    ("Warp_Alt",       int,  200),    # flight level
+    ("Warp_Spd",       int,  200),    # kt
+    ("Warp_Use",       bool, False),
+    ("Warp_Step",      int,  0,   0),
+    ("Warp_Steps_Max", int,  100, 1),
+    ("Warp_Height",    str,  "KEEP", None, WARP_HEIGHTS),
+    ("Warp_Clearance", int,  1000, 0),  # ft above terrain
+    ("Warp_Cruise",    int,  10,  2),   # fast cruise time factor
+    ("Warp_AI",        bool, False),    # AI aircraft warp along
+    ("Show_Stats",     bool, False)]
+
+# Text fields holding a number preference
+NUMBER_FIELDS = [
+    ("WrpDst", "Warp_Dst"),
+    ("WrpMax", "Warp_Max"),
+    ("WrpStp", "Warp_Step"),
+    ("WrpCrs", "Warp_Cruise")]
+
+# Captions lit in a translucent window
+CAPTIONS = (["WarnMsg", "WrpLb0", "WrpLb1", "WrpLb2", "WrpLb3", "WrpLb4", "WrpLb6", "WrpLb7", "WrpLb8", "Pref1Lbl", "StatsLbl"] +
+            ["WrpCnd{}".format(i) for i in range(SUGGEST_COUNT)] +
+            ["WrpStats{}".format(i) for i in range(len(ACTIONS))])
+
+# Preferences mirrored in WarpSettings
+SETTINGS = {
+    "Warp_Dst":       "warp_Dst",
+    "Warp_Min":       "warp_Min",
+    "Warp_Max":       "warp_Max",
+    "Warp_Alt":       "warp_Alt",
+    "Warp_Spd":       "warp_Spd",
+    "Warp_Use":       "warp_Use",
+    "Warp_Step":      "warp_Step",
+    "Warp_Steps_Max": "warp_StepsMax",
+    "Warp_Height":    "warp_Height",
+    "Warp_Clearance": "warp_Clearance",
+    "Warp_Cruise":    "warp_Cruise",
+    "Warp_AI":        "warp_AI"}
+
+class DataRefRegistry:
+    # DataRef handles looked up once, with the accessors matching their type
+    def __init__(self, names):
+        self.names    = names
+        self.handles  = {}
+        self.getters  = {}
+        self.setters  = {}
+        self.writable = {}
+        self.missing  = []
+
+    def Resolve(self):
+        self.missing = []
+        for key, name in self.names.items():
+            ref = XPLMFindDataRef(name)
+            if not ref:
+                self.missing.append(name)
+                continue
+            types = XPLMGetDataRefTypes(ref)
+            if types & xplmType_Double:
+                getter, setter = XPLMGetDatad, XPLMSetDatad
+            elif types & xplmType_Float:
+                getter, setter = XPLMGetDataf, XPLMSetDataf
+            elif types & xplmType_Int:
+                getter, setter = XPLMGetDatai, XPLMSetDatai
+            elif types & xplmType_FloatArray:
+                getter, setter = XPLMGetDatavf, XPLMSetDatavf
+            elif types & xplmType_IntArray:
+                getter, setter = XPLMGetDatavi, XPLMSetDatavi
+            else:
+                self.missing.append(name)
+                continue
+            self.handles[key]  = ref
+            self.getters[key]  = getter
+            self.setters[key]  = setter
+            self.writable[key] = bool(XPLMCanWriteDataRef(ref))
+
+    def Get(self, key):
+        return self.getters[key](self.handles[key])
+
+    def GetMany(self, keys):
+        return [self.getters[key](self.handles[key]) for key in keys]
+
+    def GetArray(self, key, count, offset = 0):
+        values = []
+        self.getters[key](self.handles[key], values, offset, count)
+        return values
+
+    def CanWrite(self, *keys):
+        return all(self.writable.get(key, False) for key in keys)
+
+    def Set(self, key, value):
+        self.setters[key](self.handles[key], value)
+
+    def SetMany(self, pairs):
+        # Lists go to array DataRefs from their first element
+        for key, value in pairs:
+            if isinstance(value, list):
+                self.setters[key](self.handles[key], value, 0, len(value))
+            else:
+                self.setters[key](self.handles[key], value)
+
+    def SetArray(self, key, values, offset = 0):
+        self.setters[key](self.handles[key], values, offset, len(values))
+
+class XPLMSim(DataRefRegistry):
+    # WarpEngine adapter on top of the XPLM API
+    def __init__(self, names):
+        DataRefRegistry.__init__(self, names)
+        self.probe = None
+
+    def WorldToLocal(self, lat, lon, alt):
+        return XPLMWorldToLocal(lat, lon, alt)
+
+    def LocalToWorld(self, x, y, z):
+        return XPLMLocalToWorld(x, y, z)
+
+    def NavAids(self, typ = None):
+        if typ is None:
+            myAid, lastAid = XPLMGetFirstNavAid(), None
+        else:
+            myAid, lastAid = XPLMFindFirstNavAidOfType(typ), XPLMFindLastNavAidOfType(typ)
+        while myAid != XPLM_NAV_NOT_FOUND:
+            outType, outLat, outLon, outHeight, outFreq, outID, outName = [], [], [], [], [], [], []
+            XPLMGetNavAidInfo(myAid, outType, outLat, outLon, outHeight, outFreq, None, outID, outName, None)
+            yield NavAid(int(outType[0]), outLat[0], outLon[0], outName[0], outHeight[0], outFreq[0], outID[0], "")
+            if myAid == lastAid:
+                break
+            myAid = XPLMGetNextNavAid(myAid)
+
+    def ProbeTerrain(self, lat, lon):
+        # One probe for the session, created on first use
+        if self.probe is None:
+            self.probe = XPLMCreateProbe(xplm_ProbeY)
+        x, y, z = XPLMWorldToLocal(lat, lon, 0.0)
+        info = []
+        if XPLMProbeTerrainXYZ(self.probe, x, y, z, info) != xplm_ProbeHitTerrain:
+            return None
+        return XPLMLocalToWorld(info[1], info[2], info[3])[2]
+
+    def ReleaseProbe(self):
+        if self.probe is not None:
+            XPLMDestroyProbe(self.probe)
+            self.probe = None
+
+    def CountFMSEntries(self):
+        return XPLMCountFMSEntries()
+
+    def GetFMSEntry(self, index):
+        outType, outID, outLat, outLon = [], [], [], []
+        XPLMGetFMSEntryInfo(index, outType, outID, None, None, outLat, outLon)
+        return outType[0], outID[0], outLat[0], outLon[0]
+
+    def GetDestinationFMSEntry(self):
+        return XPLMGetDestinationFMSEntry()
+
+    def SetDestinationFMSEntry(self, index):
+        XPLMSetDestinationFMSEntry(index)
+
+    def SetFMSEntry(self, index, ident, lat, lon, altitude):
+        # The navaid when X-Plane knows it, so the FMS shows its ID
+        ref = XPLMFindNavAid(None, ident, lat, lon, None, xplm_Nav_Airport | xplm_Nav_NDB | xplm_Nav_VOR | xplm_Nav_Fix)
+        if ref != XPLM_NAV_NOT_FOUND:
+            # The closest ID holding ident, check it is that one
+            outLat, outLon, outID = [], [], []
+            XPLMGetNavAidInfo(ref, None, outLat, outLon, None, None, None, outID, None, None)
+            if outID[0] == ident and NavDistance(lat, lon, outLat[0], outLon[0]) < 1.0:
+                XPLMSetFMSEntryInfo(index, ref, int(altitude))
+                return
+        XPLMSetFMSEntryLatLon(index, lat, lon, int(altitude))
+
+    def ClearFMSEntry(self, index):
+        XPLMClearFMSEntry(index)
+
+    def OtherAircraft(self):
+        # Active AI aircraft, none while another plugin drives them
+        outTotal, outActive, outController = [], [], []
+        XPLMCountAircraft(outTotal, outActive, outController)
+        if outController[0] not in (XPLM_NO_PLUGIN_ID, XPLMGetMyID()):
+            return 0
+        count = max(0, min(AI_PLANES, outActive[0] - 1))
+        while count > 0 and not self.CanWrite(*AI_KEYS[count - 1]):
+            count -= 1
+        return count
+
 class PythonInterface:
     def XPluginStart(self):
+        start = timer()
         self.Name = "Simple Warp v" + VERSION
         self.Sig = "lzh.python.Simple_Warp"
         self.Desc = "Teleport aircraft close to next waypoint"
         self.NavInfo = ""
         self.SWWindowCreated = False
-        self.SearchFix = ""
-        self.destLat  = 0.0
-        self.destLon  = 0.0
-        self.destName = ""
-        self.findAid = 0
-        self.foundAid = False
+        self.view = WindowView(XPSetWidgetDescriptor, XPSetWidgetProperty)
+        self.log = AsyncLog(self.Name)
+        self.settings = WarpSettings()
+        self.sim = XPLMSim(DATAREFS)
+        self.engine = WarpEngine(self.sim, self.settings, self.log)
+        self.cruise = FastCruise(self.engine)
+        self.navLoader = None
 
         # Load preferences
+        self.prefs = PrefStore(os.path.join(XPLMGetSystemPath(), "Output", "preferences", FILE_PRE), PREFS, self.log, self.engine.stats)
+        self.DebugToConsole = True
+        self.DebugToFile    = True
         self.LoadPrefs()
         # Debug
         self.DebugInit()
-        self.DebugPrint("Debug to console: {}, debug to file: {}".format(self.DebugToConsole,self.DebugToFile))
+        self.log.Info("Debug to console: {}, debug to file: {}, level: {}", self.DebugToConsole, self.DebugToFile, self.DebugLevel)
+        self.InitView()
+
+        # Warp history, for undo
+        fileJrn = os.path.join(XPLMGetSystemPath(), "Output", "preferences", FILE_JRN)
+        journal = WarpJournal(fileJrn)
+        try:
+            journal.Open()
+            self.engine.journal = journal
+        except (IOError, OSError, ValueError):
+            self.log.Warning("Failed to open warp history {}, undo is disabled", fileJrn)
+
+        # IDs found in earlier sessions, for this AIRAC cycle
+        fileInf = FindNavDataFile(XPLMGetSystemPath(), FILE_INF)
+        self.engine.findCache = FindCache(os.path.join(XPLMGetSystemPath(), "Output", "preferences", FILE_IDS), self.log)
+        self.engine.findCache.Load(ReadCycle(fileInf) if fileInf else None)
 
         # Menus
         self.SWMenuHandlerCB = self.SWMenuHandler
@@ -121,28 +368,114 @@ class PythonInterface:
         self.SWToggle = XPLMCreateCommand("lzh/python/Simple_Warp_toggle", "Toggle Simple Warp window")
         self.SWToggleHandlerCB = self.SWToggleHandler
         XPLMRegisterCommandHandler(self, self.SWToggle, self.SWToggleHandlerCB, 1, 0)
-
+        self.SWWarp = XPLMCreateCommand("lzh/python/Simple_Warp/warp", "Warp, or cancel the warp going on")
+        self.SWWarpHandlerCB = self.SWWarpHandler
+        XPLMRegisterCommandHandler(self, self.SWWarp, self.SWWarpHandlerCB, 1, 0)
+
+        # Scripted warps, from script messages and commands
+        self.warpQueue = WarpQueue(self.engine, self.ReplyWarp, self.cruise)
+        self.WarpQueueCB = self.WarpQueueLoop
+        XPLMRegisterFlightLoopCallback(self, self.WarpQueueCB, 0.0, 0)
+        self.SWWarpFms = XPLMCreateCommand("lzh/python/Simple_Warp/warp_fms", "Queue a warp toward the active FMS waypoint")
+        self.SWWarpFmsHandlerCB = self.SWWarpFmsHandler
+        XPLMRegisterCommandHandler(self, self.SWWarpFms, self.SWWarpFmsHandlerCB, 1, 0)
+        self.SWWarpClear = XPLMCreateCommand("lzh/python/Simple_Warp/warp_clear", "Drop the queued warps")
+        self.SWWarpClearHandlerCB = self.SWWarpClearHandler
+        XPLMRegisterCommandHandler(self, self.SWWarpClear, self.SWWarpClearHandlerCB, 1, 0)
+        self.SWRouteFms = XPLMCreateCommand("lzh/python/Simple_Warp/route_to_fms", "Load the airway route into the FMS")
+        self.SWRouteFmsHandlerCB = self.SWRouteFmsHandler
+        XPLMRegisterCommandHandler(self, self.SWRouteFms, self.SWRouteFmsHandlerCB, 1, 0)
+
+        # Deferred preference writes
+        self.PrefsCB = self.PrefsLoop
+        XPLMRegisterFlightLoopCallback(self, self.PrefsCB, 0.0, 0)
+
+        # Smooth warp flight loop, only scheduled while warping
+        self.SmoothWarpCB = self.SmoothWarpLoop
+        XPLMRegisterFlightLoopCallback(self, self.SmoothWarpCB, 0.0, 0)
+
+        # Fast cruise flight loop, every frame while on
+        self.CruiseCB = self.CruiseLoop
+        XPLMRegisterFlightLoopCallback(self, self.CruiseCB, 0.0, 0)
+        self.SWCruise = XPLMCreateCommand("lzh/python/Simple_Warp/fast_cruise", "Start or stop fast cruise")
+        self.SWCruiseHandlerCB = self.SWCruiseHandler
+        XPLMRegisterCommandHandler(self, self.SWCruise, self.SWCruiseHandlerCB, 1, 0)
+
+        # Navaid index flight loop, only scheduled while the index is built
+        self.NavIndexCB = self.NavIndexLoop
+        XPLMRegisterFlightLoopCallback(self, self.NavIndexCB, 0.0, 0)
+
+        # Timings, as DataRefs and in the window
+        self.StatsReadCB = self.StatsRead
+        self.statRefs = [XPLMRegisterDataAccessor(self, STATS_DATAREF.format(action), xplmType_FloatArray, 0,
+                                                  None, None, None, None, None, None, None, None,
+                                                  self.StatsReadCB, None, None, None, action, None)
+                         for action in ACTIONS]
+        self.StatsCB = self.StatsLoop
+        XPLMRegisterFlightLoopCallback(self, self.StatsCB, 0.0, 0)
+
+        self.log.Info("XPluginStart took {:.1f}ms", (timer() - start) * 1000)
         # Done with start, return identity
         return self.Name, self.Sig, self.Desc
 
     def XPluginStop(self):
         if self.SWWindowCreated:
             XPDestroyWidget(self, self.SWWindow, 1)
+            self.view.Unbind()
             self.SWWindowCreated = False
-        if self.DebugFile != None:
-            self.DebugFile.close()
+        if self.navLoader is not None:
+            self.navLoader.Cancel()
+        if self.engine.journal is not None:
+            self.engine.journal.Close()
+        self.prefs.Save()
+        self.engine.findCache.Save()
+        self.sim.ReleaseProbe()
+        self.log.Close()
         XPLMDestroyMenu(self,self.mMain)
         XPLMUnregisterCommandHandler(self, self.SWToggle, self.SWToggleHandlerCB, 0, 0)
+        XPLMUnregisterCommandHandler(self, self.SWWarp, self.SWWarpHandlerCB, 1, 0)
+        XPLMUnregisterCommandHandler(self, self.SWWarpFms, self.SWWarpFmsHandlerCB, 1, 0)
+        XPLMUnregisterCommandHandler(self, self.SWWarpClear, self.SWWarpClearHandlerCB, 1, 0)
+        XPLMUnregisterCommandHandler(self, self.SWRouteFms, self.SWRouteFmsHandlerCB, 1, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.WarpQueueCB, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.SmoothWarpCB, 0)
+        XPLMUnregisterCommandHandler(self, self.SWCruise, self.SWCruiseHandlerCB, 1, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.CruiseCB, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.NavIndexCB, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.PrefsCB, 0)
+        XPLMUnregisterFlightLoopCallback(self, self.StatsCB, 0)
+        for ref in self.statRefs:
+            XPLMUnregisterDataAccessor(self, ref)
         pass
 
     def XPluginEnable(self):
+        start = timer()
+        self.sim.Resolve()
+        for name in self.sim.missing:
+            self.log.Warning("DataRef not available: {}", name)
+        self.StartNavIndex()
+        # List the timings in DataRefEditor when it's installed
+        dre = XPLMFindPluginBySignature(DRE_SIGNATURE)
+        if dre != XPLM_NO_PLUGIN_ID:
+            for action in ACTIONS:
+                XPLMSendMessageToPlugin(dre, DRE_ADD_DATAREF, STATS_DATAREF.format(action))
+        self.log.Info("XPluginEnable took {:.1f}ms", (timer() - start) * 1000)
         return 1
 
     def XPluginDisable(self):
         pass
 
     def XPluginReceiveMessage(self, inFromWho, inMessage, inParam):
-        pass
+        if inMessage == MSG_WARP_REQUEST:
+            try:
+                request = ParseRequest(inParam, inFromWho)
+            except ValueError as e:
+                rid = inParam.get("id") if isinstance(inParam, dict) else None
+                self.ReplyWarp(inFromWho, WarpResult(rid, False, str(e), None, None))
+                return
+            self.QueueWarp(request)
+        elif inMessage == MSG_WARP_CANCEL:
+            self.warpQueue.Clear()
 
     def SWToggleHandler(self, inCommand, inPhase, inRefcon):
         # execute the command only on press
@@ -157,6 +490,35 @@ class PythonInterface:
                     XPHideWidget(self.SWWindow)
         return 0
 
+    def SWWarpHandler(self, inCommand, inPhase, inRefcon):
+        # Same as the Warp button, the window is not needed
+        if inPhase == 0:
+            if self.engine.Busy():
+                self.CancelSmoothWarp()
+            else:
+                self.WarpAircraft()
+        return 0
+
+    def SWWarpFmsHandler(self, inCommand, inPhase, inRefcon):
+        if inPhase == 0:
+            self.QueueWarp(ParseRequest({"id": "command", "fms": None}))
+        return 0
+
+    def SWWarpClearHandler(self, inCommand, inPhase, inRefcon):
+        if inPhase == 0:
+            self.warpQueue.Clear()
+        return 0
+
+    def SWRouteFmsHandler(self, inCommand, inPhase, inRefcon):
+        if inPhase == 0:
+            self.CmdDisplayWarning(self.engine.LoadRouteToFMS())
+        return 0
+
+    def SWCruiseHandler(self, inCommand, inPhase, inRefcon):
+        if inPhase == 0:
+            self.ToggleCruise()
+        return 0
+
     def SWMenuHandler(self, inMenuRef, inItemRef):
         if inItemRef == SHOW_MENU:
             if not self.SWWindowCreated:
@@ -166,7 +528,7 @@ class PythonInterface:
                 if not XPIsWidgetVisible(self.SWWindow):
                     XPShowWidget(self.SWWindow)
         else:
-            self.DebugPrint( "Unknown menu option " + str(inItemRef))
+            self.DebugPrint("Unknown menu option {}", inItemRef)
 
     def SWWindowHandler(self, inMessage, inWidget, inParam1, inParam2):
         # Close button will only hide window
@@ -178,7 +540,10 @@ class PythonInterface:
         # Handle all button pushes
         if inMessage == xpMsg_PushButtonPressed:
             if inParam1 == self.BtnWarp:
-                self.WarpAircraft()
+                if self.engine.Busy():
+                    self.CancelSmoothWarp()
+                else:
+                    self.WarpAircraft()
                 return 1
             if inParam1 == self.BtnWarn:
                 self.CmdClearWarning()
@@ -187,28 +552,77 @@ class PythonInterface:
                 self.CmdFindAid()
                 return 1
             if inParam1 == self.BtnNext:
-                self.CmdNextAid()
+                self.CmdNextAid(1)
+                return 1
+            if inParam1 == self.BtnPrev:
+                self.CmdNextAid(-1)
                 return 1
+            if inParam1 == self.BtnApt:
+                self.CmdNearestAirport()
+                return 1
+            if inParam1 == self.BtnHgt:
+                self.CmdNextHeight()
+                return 1
+            if inParam1 == self.BtnUndo:
+                self.CmdUndoWarp()
+                return 1
+            if inParam1 == self.BtnCrs:
+                self.ToggleCruise()
+                return 1
+            if inParam1 == self.BtnPlan:
+                self.CmdPreviewWarp()
+                return 1
+        elif inMessage == xpMsg_TextFieldChanged:
+            # The only place text is read back from a widget
+            buff = []
+            XPGetWidgetDescriptor(inParam1, buff, 256)
+            if inParam1 == self.WrpFix:
+                self.view.TextChanged("WrpFix", buff[0])
+                self.CmdSuggestAid()
+                return 1
+            for name, pref in NUMBER_FIELDS:
+                if inParam1 == getattr(self, name):
+                    self.CmdNumberChanged(name, pref, buff[0])
+                    return 1
         elif inMessage == xpMsg_ButtonStateChanged:
+            # inParam2 is the new state
+            state = bool(inParam2)
             if inParam1 == self.WrpUse:
-                self.warp_Use = bool(XPGetWidgetProperty(self.WrpUse, xpProperty_ButtonState, None))
+                self.view.PropertyChanged("WrpUse", xpProperty_ButtonState, state)
+                self.SetPref("Warp_Use", state)
+                self.SavePrefs()
+                return 1
+            if inParam1 == self.WrpAI:
+                self.view.PropertyChanged("WrpAI", xpProperty_ButtonState, state)
+                self.SetPref("Warp_AI", state)
+                self.SavePrefs()
                 return 1
             if inParam1 == self.Pref1Btn:
-                self.Translucent = bool(XPGetWidgetProperty(self.Pref1Btn, xpProperty_ButtonState, None))
+                self.view.PropertyChanged("Pref1Btn", xpProperty_ButtonState, state)
+                self.SetPref("Translucent", state)
                 self.SetTranslucency()
                 self.SavePrefs()
                 return 1
+            if inParam1 == self.StatsBtn:
+                self.view.PropertyChanged("StatsBtn", xpProperty_ButtonState, state)
+                self.SetPref("Show_Stats", state)
+                self.ShowStatsSection()
+                self.SavePrefs()
+                return 1
         return 0
 
     def CreateSWWindow(self):
+        # The timings section is only built once shown
         if self.SWWindowCreated:
             XPDestroyWidget(self, self.SWWindow, 1)
+            self.view.Unbind()
         outW, outH = [], []
         XPLMGetScreenSize(outW, outH)
         x, y, w, h = int(outW[0]) - WINDOW_W - MARGIN_W, int(outH[0]) - MARGIN_H, WINDOW_W, WINDOW_H
 
         x2 = x + w
-        y2 = y - 155
+        y2 = y - 255 - SUGGEST_COUNT * SUGGEST_H
+        self.SWWindowH = y - y2
         hhh, spx, spy, spt = 20, 15, 20, 5
         ww1, ww2, ww3, ww4, ww5, ww6 , ww7= 10, 85, 30, 40, 60, 65, 30
         xx1 = x+5
@@ -220,480 +634,389 @@ class PythonInterface:
         xx7 = xx6+ww6+spx
         yyi = y - 18
         Buffer = "Simple Warp rev. " + VERSION
+        view = self.view
 
         # Create the Main Widget window
-        self.SWWindow     = XPCreateWidget(x  , y  , x2  , y2  , 1, Buffer, 1,  0, xpWidgetClass_MainWindow)
+        self.SWWindow     = view.Bind("SWWindow", XPCreateWidget(x  , y  , x2  , y2  , 1, Buffer, 1,  0, xpWidgetClass_MainWindow))
         XPSetWidgetProperty(self.SWWindow, xpProperty_MainWindowHasCloseBoxes, 1)
         self.SWWindowTabs = XPCreateWidget(x+3, yyi, x2-3, y2+3, 1, ""    , 0, self.SWWindow, xpWidgetClass_SubWindow)
         yyi -= 4
 
         www = int( (w - 17 - 4*spt) / 5)
         # Message textbox and clear button
-        self.WarnMsg = XPCreateWidget(xx1  , yyi, x2-60, yyi-hhh, 1, "Welcome to Simple Warp", 0, self.SWWindow, xpWidgetClass_Caption)
-        self.BtnWarn = XPCreateWidget(x2-50, yyi, x2-5 , yyi-hhh, 1, "Clear"    , 0, self.SWWindow, xpWidgetClass_Button)
+        self.WarnMsg = view.Bind("WarnMsg", XPCreateWidget(xx1  , yyi, x2-60, yyi-hhh, 1, "", 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnWarn = view.Bind("BtnWarn", XPCreateWidget(x2-50, yyi, x2-5 , yyi-hhh, 1, "Clear", 0, self.SWWindow, xpWidgetClass_Button))
         XPSetWidgetProperty(self.BtnWarn, xpProperty_ButtonType, xpPushButton)
         yyi -= spy
 
         yyi -= int(spy/2)
         saveyyi = yyi
 
-        self.WrpFix  = XPCreateWidget(xx1    , yyi, xx1+40 , yyi-hhh, 1, ""             , 0, self.SWWindow, xpWidgetClass_TextField)
+        self.WrpFix  = view.Bind("WrpFix", XPCreateWidget(xx1    , yyi, xx1+40 , yyi-hhh, 1, ""             , 0, self.SWWindow, xpWidgetClass_TextField))
         self.BtnFind = XPCreateWidget(xx1+45 , yyi, xx1+85 , yyi-hhh, 1, "Find"         , 0, self.SWWindow, xpWidgetClass_Button)
-        self.BtnNext = XPCreateWidget(xx1+90 , yyi, xx1+130, yyi-hhh, 1, "Next"         , 0, self.SWWindow, xpWidgetClass_Button)
-        self.WrpLb0  = XPCreateWidget(xx1+135, yyi, xx1+250, yyi-hhh, 1, "Navaid ID (empty for FMS)", 0, self.SWWindow, xpWidgetClass_Caption)
-        self.BtnWarp = XPCreateWidget(x2-50  , yyi, x2-5   , yyi-hhh, 1, "!Warp!"       , 0, self.SWWindow, xpWidgetClass_Button)
+        self.BtnPrev = XPCreateWidget(xx1+90 , yyi, xx1+130, yyi-hhh, 1, "Prev"         , 0, self.SWWindow, xpWidgetClass_Button)
+        self.BtnNext = XPCreateWidget(xx1+135, yyi, xx1+175, yyi-hhh, 1, "Next"         , 0, self.SWWindow, xpWidgetClass_Button)
+        self.WrpLb0  = view.Bind("WrpLb0", XPCreateWidget(xx1+180, yyi, x2-55  , yyi-hhh, 1, "ID (empty=FMS)", 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnWarp = view.Bind("BtnWarp", XPCreateWidget(x2-50  , yyi, x2-5   , yyi-hhh, 1, ""             , 0, self.SWWindow, xpWidgetClass_Button))
         XPSetWidgetProperty(self.BtnFind, xpProperty_ButtonType, xpPushButton)
+        XPSetWidgetProperty(self.BtnPrev, xpProperty_ButtonType, xpPushButton)
         XPSetWidgetProperty(self.BtnNext, xpProperty_ButtonType, xpPushButton)
         XPSetWidgetProperty(self.BtnWarp, xpProperty_ButtonType, xpPushButton)
         yyi -= spy
 
-        self.WrpDst = XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField)
-        self.WrpLb1 = XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Warp as close as ... (min=1nm, default=10nm)", 0, self.SWWindow, xpWidgetClass_Caption)
-        XPSetWidgetDescriptor(self.WrpDst, str(self.warp_Dst))
+        # Closest matches of the ID field, updated as you type
+        for i in range(SUGGEST_COUNT):
+            view.Bind("WrpCnd{}".format(i), XPCreateWidget(xx1, yyi, x2-5, yyi-SUGGEST_H, 1, "", 0, self.SWWindow, xpWidgetClass_Caption))
+            yyi -= SUGGEST_H
+
+        self.WrpDst = view.Bind("WrpDst", XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField))
+        self.WrpLb1 = view.Bind("WrpLb1", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Warp as close as ... (min=1nm, default=10nm)", 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnApt = XPCreateWidget(x2-50 , yyi, x2-5   , yyi-hhh, 1, "APT"                                         , 0, self.SWWindow, xpWidgetClass_Button)
+        XPSetWidgetProperty(self.BtnApt, xpProperty_ButtonType, xpPushButton)
+        yyi -= spy
+
+        self.WrpMax = view.Bind("WrpMax", XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField))
+        self.WrpLb3 = view.Bind("WrpLb3", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Maximum Warp distance (default 100nm)"       , 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnUndo = XPCreateWidget(x2-50 , yyi, x2-5   , yyi-hhh, 1, "Undo"                                        , 0, self.SWWindow, xpWidgetClass_Button)
+        XPSetWidgetProperty(self.BtnUndo, xpProperty_ButtonType, xpPushButton)
         yyi -= spy
 
-        self.WrpMax = XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField)
-        self.WrpLb3 = XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Maximum Warp distance (default 100nm)"       , 0, self.SWWindow, xpWidgetClass_Caption)
-        XPSetWidgetDescriptor(self.WrpMax, str(self.warp_Max))
+        self.WrpStp = view.Bind("WrpStp", XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField))
+        self.WrpLb2 = view.Bind("WrpLb2", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Smooth warp nm per frame (0 = instant)"      , 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnPlan = XPCreateWidget(x2-50 , yyi, x2-5   , yyi-hhh, 1, "Plan"                                        , 0, self.SWWindow, xpWidgetClass_Button)
+        XPSetWidgetProperty(self.BtnPlan, xpProperty_ButtonType, xpPushButton)
+        yyi -= spy
+
+        self.WrpCrs = view.Bind("WrpCrs", XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_TextField))
+        self.WrpLb7 = view.Bind("WrpLb7", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Fast cruise time factor (default 10)"        , 0, self.SWWindow, xpWidgetClass_Caption))
+        self.BtnCrs = view.Bind("BtnCrs", XPCreateWidget(x2-50 , yyi, x2-5   , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_Button))
+        XPSetWidgetProperty(self.BtnCrs, xpProperty_ButtonType, xpPushButton)
+        yyi -= spy
+
+        self.BtnHgt = view.Bind("BtnHgt", XPCreateWidget(xx1   , yyi, xx1+40 , yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_Button))
+        self.WrpLb4 = view.Bind("WrpLb4", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, ""                                            , 0, self.SWWindow, xpWidgetClass_Caption))
+        XPSetWidgetProperty(self.BtnHgt, xpProperty_ButtonType, xpPushButton)
         yyi -= spy
 
         self.WrpUse = XPCreateWidget(xx1+30, yyi, xx1+40 , yyi-hhh, 1, ""                 , 0, self.SWWindow, xpWidgetClass_Button)
-        self.WrpLb6 = XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Update fuel and time after warp", 0, self.SWWindow, xpWidgetClass_Caption)
+        self.WrpLb6 = view.Bind("WrpLb6", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Update fuel and time after warp", 0, self.SWWindow, xpWidgetClass_Caption))
         XPSetWidgetProperty(self.WrpUse, xpProperty_ButtonType    , xpRadioButton)
         XPSetWidgetProperty(self.WrpUse, xpProperty_ButtonBehavior, xpButtonBehaviorCheckBox)
-        XPSetWidgetProperty(self.WrpUse, xpProperty_ButtonState   , self.warp_Use)
         XPSetWidgetProperty(self.WrpUse, xpProperty_Enabled, 1)
+        view.Bind("WrpUse", self.WrpUse)
+        yyi -= spy
+
+        self.WrpAI  = XPCreateWidget(xx1+30, yyi, xx1+40 , yyi-hhh, 1, ""                 , 0, self.SWWindow, xpWidgetClass_Button)
+        self.WrpLb8 = view.Bind("WrpLb8", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Move AI aircraft along"         , 0, self.SWWindow, xpWidgetClass_Caption))
+        XPSetWidgetProperty(self.WrpAI, xpProperty_ButtonType    , xpRadioButton)
+        XPSetWidgetProperty(self.WrpAI, xpProperty_ButtonBehavior, xpButtonBehaviorCheckBox)
+        XPSetWidgetProperty(self.WrpAI, xpProperty_Enabled, 1)
+        view.Bind("WrpAI", self.WrpAI)
         yyi -= spy
 
         self.Pref1Btn = XPCreateWidget(xx1+30, yyi, xx1+40, yyi-hhh, 1, ""                  , 0, self.SWWindow, xpWidgetClass_Button)
-        self.Pref1Lbl = XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Translucent window", 0, self.SWWindow, xpWidgetClass_Caption)
+        self.Pref1Lbl = view.Bind("Pref1Lbl", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Translucent window", 0, self.SWWindow, xpWidgetClass_Caption))
         XPSetWidgetProperty(self.Pref1Btn, xpProperty_ButtonType    , xpRadioButton)
         XPSetWidgetProperty(self.Pref1Btn, xpProperty_ButtonBehavior, xpButtonBehaviorCheckBox)
-        XPSetWidgetProperty(self.Pref1Btn, xpProperty_ButtonState   , self.Translucent)
         XPSetWidgetProperty(self.Pref1Btn, xpProperty_Enabled, 1)
+        view.Bind("Pref1Btn", self.Pref1Btn)
+        yyi -= spy
+
+        self.StatsBtn = XPCreateWidget(xx1+30, yyi, xx1+40, yyi-hhh, 1, ""                  , 0, self.SWWindow, xpWidgetClass_Button)
+        self.StatsLbl = view.Bind("StatsLbl", XPCreateWidget(xx1+45, yyi, xx1+250, yyi-hhh, 1, "Show timings"      , 0, self.SWWindow, xpWidgetClass_Caption))
+        XPSetWidgetProperty(self.StatsBtn, xpProperty_ButtonType    , xpRadioButton)
+        XPSetWidgetProperty(self.StatsBtn, xpProperty_ButtonBehavior, xpButtonBehaviorCheckBox)
+        XPSetWidgetProperty(self.StatsBtn, xpProperty_Enabled, 1)
+        view.Bind("StatsBtn", self.StatsBtn)
         yyi -= spy
 
         # Register the widget handler
         self.SWWindowHandlerCB = self.SWWindowHandler
         XPAddWidgetCallback(self, self.SWWindow, self.SWWindowHandlerCB)
         self.SetTranslucency()
+        self.ShowStatsSection()
+
+    def BuildStatsSection(self, left, top, right):
+        # Timings below the rest of the window, with Show_Stats
+        yyi = top - 3
+        for i in range(len(ACTIONS)):
+            self.view.Bind("WrpStats{}".format(i), XPCreateWidget(left+5, yyi, right-5, yyi-SUGGEST_H, 1, "", 0, self.SWWindow, xpWidgetClass_Caption))
+            yyi -= SUGGEST_H
+
+    def InitView(self):
+        # Window state before any widget exists
+        view = self.view
+        view.SetText("WarnMsg", "Welcome to Simple Warp")
+        view.SetText("BtnWarp", "!Warp!")
+        view.SetText("BtnCrs", "Cruise")
+        view.SetText("BtnHgt", self.settings.warp_Height[:4])
+        view.SetText("WrpLb4", HEIGHT_LABELS[self.settings.warp_Height])
+        for name, pref in NUMBER_FIELDS:
+            view.SetText(name, str(self.prefs.Get(pref)))
+        view.SetProperty("WrpUse", xpProperty_ButtonState, self.settings.warp_Use)
+        view.SetProperty("WrpAI", xpProperty_ButtonState, self.settings.warp_AI)
+        view.SetProperty("Pref1Btn", xpProperty_ButtonState, self.Translucent)
+        view.SetProperty("StatsBtn", xpProperty_ButtonState, self.ShowStats)
+        self.SetTranslucency()
 
     def SetTranslucency(self):
         if self.Translucent:
-            XPHideWidget(self.SWWindowTabs)
-            XPSetWidgetProperty(self.SWWindow, xpProperty_MainWindowType, xpMainWindowStyle_Translucent)
+            self.view.SetProperty("SWWindow", xpProperty_MainWindowType, xpMainWindowStyle_Translucent)
         else:
-            XPShowWidget(self.SWWindowTabs)
-            XPSetWidgetProperty(self.SWWindow, xpProperty_MainWindowType, xpMainWindowStyle_MainWindow)
-
-        XPSetWidgetProperty(self.WarnMsg, xpProperty_CaptionLit, self.Translucent)
-
-        XPSetWidgetProperty(self.Pref1Lbl, xpProperty_CaptionLit, self.Translucent)
-        #XPSetWidgetProperty(self.Pref2Lbl, xpProperty_CaptionLit, self.Translucent)
-        #XPSetWidgetProperty(self.Pref3Lbl, xpProperty_CaptionLit, self.Translucent)
-
-        XPSetWidgetProperty(self.WrpLb0, xpProperty_CaptionLit, self.Translucent)
-        XPSetWidgetProperty(self.WrpLb1, xpProperty_CaptionLit, self.Translucent)
-        #XPSetWidgetProperty(self.WrpLb2, xpProperty_CaptionLit, self.Translucent)
-        XPSetWidgetProperty(self.WrpLb3, xpProperty_CaptionLit, self.Translucent)
-        #XPSetWidgetProperty(self.WrpLb4, xpProperty_CaptionLit, self.Translucent)
-        #XPSetWidgetProperty(self.WrpLb5, xpProperty_CaptionLit, self.Translucent)
-        XPSetWidgetProperty(self.WrpLb6, xpProperty_CaptionLit, self.Translucent)
+            self.view.SetProperty("SWWindow", xpProperty_MainWindowType, xpMainWindowStyle_MainWindow)
+        self.view.SetProperties(CAPTIONS, xpProperty_CaptionLit, self.Translucent)
+        if self.view.Built("SWWindow"):
+            if self.Translucent:
+                XPHideWidget(self.SWWindowTabs)
+            else:
+                XPShowWidget(self.SWWindowTabs)
+
+    def ShowStatsSection(self):
+        # Grow or shrink the window from where it is now, it may have been dragged
+        left, top, right, bottom = [], [], [], []
+        XPGetWidgetGeometry(self.SWWindow, left, top, right, bottom)
+        bottom = top[0] - self.SWWindowH
+        names = ["WrpStats{}".format(i) for i in range(len(ACTIONS))]
+        if self.ShowStats:
+            if not self.view.Built(names[0]):
+                self.BuildStatsSection(left[0], bottom, right[0])
+            bottom -= len(names) * SUGGEST_H + 5
+        XPSetWidgetGeometry(self.SWWindow, left[0], top[0], right[0], bottom)
+        XPSetWidgetGeometry(self.SWWindowTabs, left[0] + 3, top[0] - 18, right[0] - 3, bottom + 3)
+        for name in names:
+            if not self.view.Built(name):
+                continue
+            if self.ShowStats:
+                XPShowWidget(self.view.widgets[name])
+            else:
+                XPHideWidget(self.view.widgets[name])
+        if self.ShowStats:
+            self.RefreshStats()
+            XPLMSetFlightLoopCallbackInterval(self, self.StatsCB, STATS_INTERVAL, 1, 0)
+
+    def RefreshStats(self):
+        lines = self.engine.stats.Lines() or ["No timings yet"]
+        for i in range(len(ACTIONS)):
+            self.view.SetText("WrpStats{}".format(i), lines[i] if i < len(lines) else "")
+
+    def StatsLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        if not (self.SWWindowCreated and self.ShowStats):
+            return 0
+        if XPIsWidgetVisible(self.SWWindow):
+            self.RefreshStats()
+        return STATS_INTERVAL
+
+    def StatsRead(self, inRefcon, outValues, inOffset, inMax):
+        # DataRef reader, inRefcon is the action
+        values = self.engine.stats.Summary(inRefcon)
+        if outValues is None:
+            return len(values)
+        values = values[inOffset:inOffset + inMax]
+        outValues.extend(values)
+        return len(values)
 
     def CmdClearWarning(self):
-        XPSetWidgetDescriptor(self.WarnMsg, " ")
-        XPSetWidgetProperty(self.BtnWarn, xpProperty_Enabled, 0)
-        XPSetWidgetDescriptor(self.WrpFix, "")
-        self.findAid = 0
-        self.foundAid = False
+        self.view.SetText("WarnMsg", " ")
+        self.view.SetProperty("BtnWarn", xpProperty_Enabled, 0)
+        self.view.SetText("WrpFix", "")
+        self.engine.Clear()
+        self.ShowSuggestions([])
 
     def CmdDisplayWarning(self,text):
-        XPSetWidgetDescriptor(self.WarnMsg, text)
-        XPSetWidgetProperty(self.BtnWarn, xpProperty_Enabled, 1)
+        self.view.SetText("WarnMsg", text)
+        self.view.SetProperty("BtnWarn", xpProperty_Enabled, 1)
+
+    def CmdNumberChanged(self, name, pref, text):
+        # Kept until the field holds a valid number again
+        self.view.TextChanged(name, text)
+        try:
+            self.SetPref(pref, text)
+        except ValueError:
+            self.view.errors[name] = text
+            return
+        self.view.errors.pop(name, None)
+        self.SavePrefs()
 
     def SavePrefs(self):
-        baseDir = os.path.join(XPLMGetSystemPath(), "Output", "preferences")
-        filePre = os.path.join(baseDir, FILE_PRE)
-        with open(filePre,"w") as fh:
-            fh.write("# Simple Warp preferences" + os.linesep)
-            fh.write("Translucent {}".format(self.Translucent) + os.linesep)
-            fh.write("Warp_Dst {}".format(self.warp_Dst) + os.linesep)
-            fh.write("Warp_Max {}".format(self.warp_Max) + os.linesep)
-            fh.write("Warp_Use {}".format(self.warp_Use) + os.linesep)
+        # Written a few seconds later on a background thread, at XPluginStop at the latest
+        if self.prefs.dirty:
+            XPLMSetFlightLoopCallbackInterval(self, self.PrefsCB, PREFS_DELAY, 1, 0)
+
+    def PrefsLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        self.prefs.SaveAsync()
+        # Still dirty when the previous write had not finished
+        return PREFS_DELAY if self.prefs.dirty else 0
 
     def LoadPrefs(self):
-        self.Translucent    = True
-        self.DebugToConsole = True
-        self.DebugToFile    = True
-        self.DebugFile      = None
-        self.warp_Dst = 10
-        #self.warp_Min = 20
-        self.warp_Max = 100
-        #self.warp_Alt = 200
-        #self.warp_Spd = 200
-        self.warp_Use = False
-
-        baseDir = os.path.join(XPLMGetSystemPath(), "Output", "preferences")
-        filePre = os.path.join(baseDir, FILE_PRE)
-        try:
-            with open(filePre,"rU") as fh:
-                lines = fh.read().splitlines()
-                self.DebugPrint( "Reading preferences from Output/preferences/{}".format(FILE_PRE))
-                for line in lines:
-                    fields = line.upper().strip().split()
-                    if len(fields) != 2: continue
-                    if fields[0] == "TRANSLUCENT"   and str(fields[1]) in ['1','YES','TRUE']:
-                        self.Translucent = True
-                    #if fields[0] == "DEBUGTOCONSOLE" and str(fields[1]) in ['1','YES','TRUE']:
-                    #    self.DebugToConsole = True
-                    #if fields[0] == "DEBUGTOFILE"    and str(fields[1]) in ['1','YES','TRUE']:
-                    #    self.DebugToFile = True
-                    if fields[0] == "WARP_USE"    and str(fields[1]) in ['1','YES','TRUE']:
-                        self.warp_Use = True
-                    if fields[0] == "WARP_DST":
-                        try:
-                            self.warp_Dst = int(fields[1])
-                        except:
-                            pass
-                    #if fields[0] == "WARP_MIN":
-                    #    try:
-                    #        self.warp_Min = int(fields[1])
-                    #    except:
-                    #        pass
-                    if fields[0] == "WARP_MAX":
-                        try:
-                            self.warp_Max = int(fields[1])
-                        except:
-                            pass
-                    #if fields[0] == "WARP_ALT":
-                    #    try:
-                    #        self.warp_Alt = int(fields[1])
-                    #    except:
-                    #        pass
-                    #if fields[0] == "WARP_SPD":
-                    #    try:
-                    #        self.warp_Spd = int(fields[1])
-                    #    except:
-                    #        pass
-
-        except:
-            self.DebugPrint("Caught top level exception in LoadPrefs")
-            pass
-        self.SavePrefs()
+        self.prefs.Load()
+        self.log.Info("Reading preferences from Output/preferences/{}", FILE_PRE)
+        self.ApplyPrefs()
 
-    def DebugPrint(self, Msg):
-        message = str(datetime.now()) + " " + self.Name + ": " + Msg
-        if self.DebugToConsole:
-            #SandyBarbourPrint(Msg)
-            print message
-        if self.DebugToFile and self.DebugFile:
-            self.DebugFile.write(message + os.linesep)
-            self.DebugFile.flush()
+    def SetPref(self, name, value):
+        self.prefs.Set(name, value)
+        self.ApplyPrefs()
+
+    def ApplyPrefs(self):
+        self.Translucent = self.prefs.Get("Translucent")
+        self.DebugLevel  = self.prefs.Get("Debug_Level")
+        self.ShowStats   = self.prefs.Get("Show_Stats")
+        for name, attr in SETTINGS.items():
+            setattr(self.settings, attr, self.prefs.Get(name))
+
+    def DebugPrint(self, Msg, *args):
+        # Nothing is formatted unless DEBUG is enabled
+        self.log.Debug(Msg, *args)
 
     def DebugInit(self):
-        self.DebugFile = None
+        self.log.level   = LEVELS.get(self.DebugLevel, INFO)
+        self.log.console = self.DebugToConsole
+        fileLog = None
         if self.DebugToFile:
             baseDir = os.path.join(XPLMGetSystemPath(), "Resources", "plugins", "PythonScripts")
             fileLog = os.path.join(baseDir, FILE_LOG)
-            try:
-                self.DebugFile = open(fileLog, "a")
-            except:
-                self.DebugToFile = False
-                self.DebugToConsole = True
-                self.DebugPrint("Failed to open debug log file, forcing debug to console.")
-                self.DebugPrint("-> {}".format(fileLog))
-
-    def GetMyCoords(self):
-        myLatDR = XPLMFindDataRef("sim/flightmodel/position/latitude")
-        myLonDR = XPLMFindDataRef("sim/flightmodel/position/longitude")
-        return XPLMGetDataf(myLatDR), XPLMGetDataf(myLonDR)
-
-    def NavDistance(self, degLat1, degLon1, degLat2, degLon2):
-        #radius = 6371 # km
-        radius = 3440.07 # nm
-        radLat1  = math.radians(degLat1)
-        radLat2  = math.radians(degLat2)
-        deltaLat = math.radians(degLat2-degLat1)
-        deltaLon = math.radians(degLon2-degLon1)
-
-        sLat = math.sin(deltaLat/2)
-        sLon = math.sin(deltaLon/2)
-        a = sLat*sLat + math.cos(radLat1) * math.cos(radLat2) * sLon*sLon
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        return radius * c
-
-    def GeoDistance(self, coords1, coords2):
-        degLat1, degLon1 = coords1
-        degLat2, degLon2 = coords2
-        #radius = 6371 # km
-        radius = 3440.07 # nm
-        radLat1  = math.radians(degLat1)
-        radLat2  = math.radians(degLat2)
-        deltaLat = math.radians(degLat2-degLat1)
-        deltaLon = math.radians(degLon2-degLon1)
-
-        sLat = math.sin(deltaLat/2)
-        sLon = math.sin(deltaLon/2)
-        a = sLat*sLat + math.cos(radLat1) * math.cos(radLat2) * sLon*sLon
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        return radius * c
+        self.log.Start(fileLog)
 
     def WarpAircraft(self):
-
-        if self.destLat == 0.0 and self.destLon == 0.0:
-            self.CmdDisplayWarning("Nowhere to warp to")
+        if self.cruise.active:
+            self.CmdDisplayWarning("Fast cruise on, stop it first")
             return
-
-        drx = XPLMFindDataRef("sim/flightmodel/position/local_x")
-        dry = XPLMFindDataRef("sim/flightmodel/position/local_y")
-        drz = XPLMFindDataRef("sim/flightmodel/position/local_z")
-        dre = XPLMFindDataRef("sim/flightmodel/position/elevation")
-        drp = XPLMFindDataRef("sim/cockpit/autopilot/altitude")
-        drg = XPLMFindDataRef("sim/cockpit2/gauges/indicators/altitude_ft_pilot")
-        dri = XPLMFindDataRef("sim/flightmodel/position/indicated_airspeed")
-        drs = XPLMFindDataRef("sim/flightmodel/position/groundspeed")
-
-        local_x   = XPLMGetDatad(drx)
-        local_y   = XPLMGetDatad(dry)
-        local_z   = XPLMGetDatad(drz)
-        elevation = XPLMGetDatad(dre)
-        autopilot = XPLMGetDataf(drp)
-        gauge_alt = XPLMGetDataf(drg)
-        IAS       = XPLMGetDataf(dri)
-        grounds   = XPLMGetDataf(drs)
-
-        buff = []
-        XPGetWidgetDescriptor(self.WrpDst, buff, 256)
-        try:
-            self.warp_Dst = int(buff[0])
-        except:
-            self.CmdDisplayWarning("{} is not a valid value".format(buff[0]))
+        # The fields were checked as they were typed
+        for name, pref in NUMBER_FIELDS:
+            if name in self.view.errors:
+                self.CmdDisplayWarning("{} is not a valid value".format(self.view.errors[name]))
+                return
+        self.CmdDisplayWarning(self.engine.Warp())
+        # Terrain probing and smooth warps go on over the next frames
+        if self.engine.Busy():
+            self.view.SetText("BtnWarp", "Cancel")
+            XPLMSetFlightLoopCallbackInterval(self, self.SmoothWarpCB, -1.0, 1, 0)
             return
+        self.SavePrefs()
+
+    def SmoothWarpLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        if not self.engine.Busy():
+            return 0
+        message = self.engine.Step()
+        if self.engine.Busy():
+            if message is not None:
+                self.CmdDisplayWarning(message)
+            return -1.0
+        self.EndSmoothWarp(message)
+        return 0
+
+    def CancelSmoothWarp(self):
+        XPLMSetFlightLoopCallbackInterval(self, self.SmoothWarpCB, 0.0, 1, 0)
+        self.EndSmoothWarp(self.engine.Cancel())
 
-        buff = []
-        XPGetWidgetDescriptor(self.WrpMax, buff, 256)
+    def EndSmoothWarp(self, message):
+        self.view.SetText("BtnWarp", "!Warp!")
+        self.CmdDisplayWarning(message)
+        self.SavePrefs()
+
+    def ToggleCruise(self):
+        if self.cruise.active:
+            XPLMSetFlightLoopCallbackInterval(self, self.CruiseCB, 0.0, 1, 0)
+            self.EndCruise(self.cruise.Stop())
+            return
+        if "WrpCrs" in self.view.errors:
+            self.CmdDisplayWarning("{} is not a valid value".format(self.view.errors["WrpCrs"]))
+            return
         try:
-            self.warp_Max = int(buff[0])
-        except:
-            self.CmdDisplayWarning("{} is not a valid value".format(buff[0]))
+            self.CmdDisplayWarning(self.cruise.Start())
+        except WarpError as e:
+            self.CmdDisplayWarning(str(e))
             return
+        self.view.SetText("BtnCrs", "Stop")
+        XPLMSetFlightLoopCallbackInterval(self, self.CruiseCB, -1.0, 1, 0)
+
+    def CruiseLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        if not self.cruise.active:
+            return 0
+        message = self.cruise.Step(inElapsedSinceLastCall)
+        if self.cruise.active:
+            return -1.0
+        self.EndCruise(message)
+        return 0
 
-        my_Lat, my_Lon = self.GetMyCoords()
-
-        self.DebugPrint("Preparing warp")
-        wpt_x, wpt_y, wpt_z = XPLMWorldToLocal(self.destLat, self.destLon, local_y)
-        #self.DebugPrint("WPT: {} {} {}".format(wpt_x, wpt_y, wpt_z))
-        delta_x = wpt_x - local_x
-        delta_y = wpt_y - local_y
-        delta_z = wpt_z - local_z
-
-        # Too close to warp
-        distance = math.sqrt(delta_x*delta_x + delta_y*delta_y + delta_z*delta_z) / 1852.0
-        #if distance < self.warp_Min:
-        #    self.CmdDisplayWarning("Too close to next waypoint ({}nm)".format(int(distance)))
-        #    self.DebugPrint("Too close to next waypoint ({}nm)".format(int(distance)))
-        #    return
-
-        # Warp 5nm from destination or 100nm max (params now)
-        travel = min(self.warp_Max, distance - self.warp_Dst)
-        warp_factor = travel / distance
-        self.DebugPrint("Distance {}nm, warp factor {}".format(int(travel*100)/100.0, warp_factor))
-        warp_x = warp_factor * delta_x
-        warp_y = warp_factor * delta_y
-        warp_z = warp_factor * delta_z
-
-        # Now doing what is recommened not to do, trying to be at same altitude...
-        outLat, outLon, outAlt = XPLMLocalToWorld(local_x + warp_x, local_y + warp_y, local_z + warp_z)
-        #wpt_x, wpt_y, wpt_z = XPLMWorldToLocal(outLat, outLon, local_y)
-        wpt_x, wpt_y, wpt_z = XPLMWorldToLocal(outLat, outLon, elevation)
-
-        # Let's burn some fuel
-        burnt = 0
-        if self.warp_Use:
-            travel_meters = travel * 1852
-            time_saved = travel_meters / grounds
-
-            dr_num_tanks   = XPLMFindDataRef("sim/aircraft/overflow/acf_num_tanks")
-            dr_num_engines = XPLMFindDataRef("sim/aircraft/engine/acf_num_engines")
-            num_tanks   = XPLMGetDatai(dr_num_tanks)
-            num_engines = XPLMGetDatai(dr_num_engines)
-
-            dr_tanks = XPLMFindDataRef("sim/flightmodel/weight/m_fuel")
-            tanks = []
-            XPLMGetDatavf(dr_tanks, tanks, 0, num_tanks)
-            total_fuel = 0
-            for i in range(num_tanks):
-                total_fuel += tanks[i]
-                self.DebugPrint("Tank #{}: {} kg".format(i, tanks[i]))
-
-            dr_flows = XPLMFindDataRef("sim/cockpit2/engine/indicators/fuel_flow_kg_sec")
-            flows = []
-            XPLMGetDatavf(dr_flows, flows, 0, num_engines)
-            total_flow = 0
-            for i in range(num_engines):
-                total_flow += flows[i]
-                self.DebugPrint("Engine #{}: {} kg/sec".format(i, flows[i]))
-
-            self.DebugPrint("Total fuel: {:.2f}kg Total fuel flow: {:.2f}".format(total_fuel, total_flow))
-            usage = time_saved * total_flow
-            burnt = usage
-            self.DebugPrint("Fuel to burn for {:.2f}nm in {:.2f}sec : {:.2f}kg".format(travel, time_saved, usage))
-
-            self.DebugPrint("Tanks before: {}".format(tanks))
-
-            if usage > total_fuel:
-                self.CmdDisplayWarning("Not enough fuel, you're in trouble...")
-                return
-            # take from central tank if there's such
-            center = 0
-            if num_tanks % 2:
-                center = (num_tanks - 1) / 2
-                if tanks[center] > usage:
-                    tanks[center] -= usage
-                    usage = 0.0
-                else:
-                    usage -= tanks[center]
-                    tanks[center] = 0.0
-                tl, tr = center - 1, center + 1
-            else:
-                tr = num_tanks / 2
-                tl = tr -1
-            # then start emptying from center to outside, 2 by 2
-            while usage > 0.0 and tl >= 0:
-                # not enough in those tanks, empty them
-                if (tanks[tl] + tanks[tr]) < usage:
-                    usage -= (tanks[tl] + tanks[tr])
-                    tanks[tl], tanks[tr] = 0.0, 0.0
-                    tl -= 1
-                    tr += 1
-                    continue
-                # enough excess in left tank, take all from there
-                if tanks[tl] - tanks[tr] > usage:
-                    tanks[tl] -= usage
-                    break
-                # enough excess in right tank, take all from there
-                if tanks[tr] - tanks[tl] > usage:
-                    tanks[tr] -= usage
-                    break
-                # enough in tanks combined, even the tanks
-                delta = tanks[tl] - tanks[tr]
-                tanks[tl] -= (usage + delta) / 2
-                tanks[tr] -= (usage - delta) / 2
-                break
-            # Update tanks with new values
-            self.DebugPrint("Tanks after: {}".format(tanks))
-            XPLMSetDatavf(dr_tanks, tanks, 0, num_tanks)
-			
-			# Advance time
-            dr_zulu_time_sec = XPLMFindDataRef("sim/time/zulu_time_sec")
-            zulu_time_sec = XPLMGetDataf(dr_zulu_time_sec)
-            XPLMSetDataf(dr_zulu_time_sec, zulu_time_sec + time_saved)
-
-        # Do it!
-        XPLMSetDatad(drx, wpt_x)
-        XPLMSetDatad(dry, wpt_y)
-        XPLMSetDatad(drz, wpt_z)
-
-        self.CmdDisplayWarning("Warped {}nm using {:.0f}kg".format(int(travel*100)/100.0, burnt))
-        self.SavePrefs()
+    def EndCruise(self, message):
+        self.view.SetText("BtnCrs", "Cruise")
+        self.CmdDisplayWarning(message)
 
     def ResetWarpDefaults(self):
-        self.warp_Dst = 10
-        self.warp_Min = 20
-        self.warp_Max = 100
-        self.warp_Alt = 200
-        self.warp_Spd = 200
-        self.warp_Use = False
-        XPSetWidgetDescriptor(self.WrpDst, str(self.warp_Dst))
-        XPSetWidgetDescriptor(self.WrpMin, str(self.warp_Min))
-        XPSetWidgetDescriptor(self.WrpMax, str(self.warp_Max))
-        XPSetWidgetDescriptor(self.WrpAlt, str(self.warp_Alt))
-        XPSetWidgetDescriptor(self.WrpSpd, str(self.warp_Spd))
-        XPSetWidgetProperty(self.WrpUse, xpProperty_ButtonState, self.warp_Use)
+        self.prefs.Reset(["Warp_Dst", "Warp_Min", "Warp_Max", "Warp_Alt", "Warp_Spd", "Warp_Use"])
+        self.ApplyPrefs()
+        for name, pref in NUMBER_FIELDS:
+            self.view.SetText(name, str(self.prefs.Get(pref)))
+            self.view.errors.pop(name, None)
+        self.view.SetProperty("WrpUse", xpProperty_ButtonState, self.settings.warp_Use)
         self.SavePrefs()
 
     def CmdFindAid(self):
-        my_Lat, my_Lon = self.GetMyCoords()
-        self.foundAid = False
-
-        buff = []
-        XPGetWidgetDescriptor(self.WrpFix, buff, 256)
-        self.SearchFix = buff[0].upper()
-
-        if self.SearchFix == "":
-            num_FMS = XPLMCountFMSEntries()
-            self.DebugPrint("XPLMCountFMSEntries() : {}".format(num_FMS))
-            dest_FMS = XPLMGetDestinationFMSEntry()
-            self.DebugPrint("XPLMGetDestinationFMSEntry() : {}".format(dest_FMS))
-            disp_FMS = XPLMGetDisplayedFMSEntry()
-            self.DebugPrint("XPLMGetDisplayedFMSEntry() : {}".format(disp_FMS))
-            if num_FMS < 1:
-                self.CmdDisplayWarning("You're not heading to a FMS waypoint")
-                return
+        self.CmdDisplayWarning(self.engine.Find(self.view.Text("WrpFix")))
 
-            outType, outID, outLat, outLon = [], [], [], []
-            XPLMGetFMSEntryInfo(dest_FMS, outType, outID, None, None, outLat, outLon)
-            dest_Type = NavType[int(outType[0])]
-            self.SearchFix = outID[0]
-            self.destLat  = float(outLat[0])
-            self.destLon  = float(outLon[0])
-            self.destName = outID[0]
-            dist = self.NavDistance(my_Lat, my_Lon, self.destLat, self.destLon)
-            if self.destLat == 0.0 and self.destLon == 0.0:
-                self.CmdDisplayWarning("You're not heading to a FMS waypoint")
-                return
-            self.CmdDisplayWarning("FMS[{}] is {} [{}] at {:.1f} nm".format(dest_FMS, outID[0], dest_Type, dist))
+    def CmdSuggestAid(self):
+        if self.engine.navIndex is None:
+            self.ShowSuggestions([self.navLoader.Progress()] if self.navLoader is not None else [])
             return
-        else:
-            notdone = True
-            myAid = XPLMGetFirstNavAid()
-            while notdone:
-                outType, outID, outLat, outLon, outName = [], [], [], [], []
-                XPLMGetNavAidInfo(myAid, outType, outLat, outLon, None, None, None, outID, outName, None)
-                if outID[0] == self.SearchFix:
-                    self.destLat  = outLat[0]
-                    self.destLon  = outLon[0]
-                    self.destName = outName[0]
-                    dist = self.NavDistance(my_Lat, my_Lon, self.destLat, self.destLon)
-                    self.CmdDisplayWarning("{} [{}] at {:.1f} nm is {}".format(self.SearchFix, NavType[outType[0]], dist, self.destName))
-                    self.findAid = myAid
-                    self.foundAid = True
-                    return
-                myAid = XPLMGetNextNavAid(myAid)
-                if myAid == XPLM_NAV_NOT_FOUND:
-                    notdone = False
-        self.destLat = 0.0
-        self.destLon = 0.0
-        self.CmdDisplayWarning("{} not found".format(self.SearchFix))
-
-    def CmdNextAid(self):
-        if not self.foundAid:
-            self.CmdDisplayWarning("No previous search")
+        self.ShowSuggestions(self.engine.Suggest(self.view.Text("WrpFix")))
+
+    def ShowSuggestions(self, lines):
+        for i in range(SUGGEST_COUNT):
+            self.view.SetText("WrpCnd{}".format(i), lines[i] if i < len(lines) else "")
+
+    def CmdNearestAirport(self):
+        self.CmdDisplayWarning(self.engine.NearestAirport())
+
+    def CmdNextHeight(self):
+        height = WARP_HEIGHTS[(WARP_HEIGHTS.index(self.settings.warp_Height) + 1) % len(WARP_HEIGHTS)]
+        self.SetPref("Warp_Height", height)
+        self.view.SetText("BtnHgt", height[:4])
+        self.view.SetText("WrpLb4", HEIGHT_LABELS[height])
+        self.SavePrefs()
+
+    def CmdPreviewWarp(self):
+        # In the suggestion lines, until the ID field changes
+        self.ShowSuggestions(self.engine.Preview())
+
+    def CmdUndoWarp(self):
+        if self.cruise.active:
+            self.CmdDisplayWarning("Fast cruise on, stop it first")
             return
+        self.CmdDisplayWarning(self.engine.Undo())
 
-        my_Lat, my_Lon = self.GetMyCoords()
-        notdone = True
-        myAid = XPLMGetNextNavAid(self.findAid)
-        while notdone:
-            outType, outID, outLat, outLon, outName = [], [], [], [], []
-            XPLMGetNavAidInfo(myAid, outType, outLat, outLon, None, None, None, outID, outName, None)
-            if outID[0] == self.SearchFix:
-                self.destLat  = outLat[0]
-                self.destLon  = outLon[0]
-                self.destName = outName[0]
-                dist = self.NavDistance(my_Lat, my_Lon, self.destLat, self.destLon)
-                self.CmdDisplayWarning("{} [{}] at {:.1f} nm is {}".format(self.SearchFix, NavType[outType[0]], dist, self.destName))
-                self.findAid = myAid
-                self.foundAid = True
-                return
-            myAid = XPLMGetNextNavAid(myAid)
-            if myAid == XPLM_NAV_NOT_FOUND:
-                notdone = False
-        self.findAid = ""
-        self.foundAid = False
-        self.destLat = 0.0
-        self.destLon = 0.0
-        self.CmdDisplayWarning("No more entries for {}".format(self.SearchFix))
+    def CmdNextAid(self, step):
+        self.CmdDisplayWarning(self.engine.Next(step))
+
+    def QueueWarp(self, request):
+        if self.warpQueue.Submit(request):
+            XPLMSetFlightLoopCallbackInterval(self, self.WarpQueueCB, -1.0, 1, 0)
 
+    def WarpQueueLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        # Every frame until the queue is empty
+        return -1.0 if self.warpQueue.Step() else 0
 
+    def ReplyWarp(self, sender, result):
+        self.log.Info("Scripted warp {}: {}", result.id, result.message)
+        self.CmdDisplayWarning(result.message)
+        # Commands have no one to answer
+        if sender is not None:
+            PI_SendMessageToScript(self, sender, MSG_WARP_RESULT, dict(result._asdict()))
 
+    def StartNavIndex(self):
+        # Built once per session, Find and APT walk the navaid database meanwhile
+        if self.engine.navIndex is not None or (self.navLoader is not None and not self.navLoader.done):
+            return
+        xplaneRoot = XPLMGetSystemPath()
+        self.navLoader = NavIndexLoader(self.engine, xplaneRoot, os.path.join(xplaneRoot, "Output", "preferences", FILE_NAC))
+        self.navLoader.Start()
+        XPLMSetFlightLoopCallbackInterval(self, self.NavIndexCB, -1.0, 1, 0)
+
+    def NavIndexLoop(self, inElapsedSinceLastCall, inElapsedTimeSinceLastFlightLoop, inCounter, inRefcon):
+        # Every frame while the sim database is read, a few times a second otherwise
+        if self.navLoader.Feed():
+            if self.SWWindowCreated and XPIsWidgetVisible(self.SWWindow):
+                self.CmdSuggestAid()
+            return -1.0 if self.navLoader.feedWanted else 0.25
+        if self.SWWindowCreated:
+            self.CmdSuggestAid()
+        return 0
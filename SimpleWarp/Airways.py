@@ -0,0 +1,227 @@
+# Simple Warp - airway network
+# See PI_Simple_Warp.py for license.
+#
+# earth_awy.dat as a graph: one node per fix, numbered in the order they
+# are met, and the segments in compressed sparse rows. The segments leaving
+# node n are targets[offsets[n]:offsets[n + 1]], with their great circle
+# length and airway name next to them. One-way segments are only stored in
+# the direction they can be flown.
+#
+# Path is A*, guided by the great circle distance to the end point. Edge
+# lengths are great circle distances too, so the first route to reach the
+# end is the shortest. Start and end are points with the nodes they join
+# the network at: the node itself for a fix on an airway, the closest
+# nodes for an airport or any other position.
+
+from array import array
+import heapq, math
+
+from SimpleWarp.NavData import NAV_FIX
+from SimpleWarp.NavIndex import NavGrid
+from SimpleWarp.Geodesy import NavDistance, RADIUS
+
+ATTACH_COUNT  = 4     # nodes a point off the network joins it at
+ATTACH_RADIUS = 200   # nm
+
+class AirwayGraph:
+    def __init__(self):
+        # Nodes, the columns NavGrid needs plus the ID
+        self.typ     = array('H')
+        self.lat     = array('d')
+        self.lon     = array('d')
+        self.ident   = []
+        self.x       = array('d')
+        self.y       = array('d')
+        self.z       = array('d')
+        # Segments
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.lengths = array('d')
+        self.airway  = array('i')
+        self.names   = []
+        self.byIdent = {}
+        self.grid    = None
+        self.skipped = 0   # segments with a fix not found
+
+    def __len__(self):
+        return len(self.ident)
+
+    @classmethod
+    def Build(cls, airways, table=None):
+        # From ReadAwy records. 1100 records have no coordinates, their
+        # fixes are looked up by ID and region in the navaid table.
+        graph = cls()
+        records = list(airways)
+        coords = {}
+        if table is not None:
+            wanted = set()
+            for awy in records:
+                if awy.lat1 is None:
+                    wanted.add((awy.id1, awy.reg1))
+                    wanted.add((awy.id2, awy.reg2))
+            # Fixes before VOR and NDB of the same ID and region
+            for row in range(len(table)):
+                key = (table.ident[row], table.region[row])
+                if key in wanted and (key not in coords or table.typ[row] == NAV_FIX):
+                    coords[key] = (table.typ[row], table.lat[row], table.lon[row])
+        nodes = {}
+        names = {}
+        edges = []
+        for awy in records:
+            if awy.lat1 is None:
+                fix1, fix2 = coords.get((awy.id1, awy.reg1)), coords.get((awy.id2, awy.reg2))
+                if fix1 is None or fix2 is None:
+                    graph.skipped += 1
+                    continue
+            else:
+                fix1, fix2 = (NAV_FIX, awy.lat1, awy.lon1), (NAV_FIX, awy.lat2, awy.lon2)
+            u = graph.Node(nodes, awy.id1, awy.reg1, fix1)
+            v = graph.Node(nodes, awy.id2, awy.reg2, fix2)
+            if u == v:
+                continue
+            name = names.get(awy.names)
+            if name is None:
+                name = names[awy.names] = len(graph.names)
+                graph.names.append(awy.names)
+            length = NavDistance(fix1[1], fix1[2], fix2[1], fix2[2])
+            edges.append((u, v, length, name))
+            if not awy.oneway:
+                edges.append((v, u, length, name))
+        graph.Link(edges)
+        graph.grid = NavGrid(graph)
+        return graph
+
+    def Node(self, nodes, ident, region, fix):
+        # Same fix: same ID and region, or same ID and place in 640 files
+        typ, lat, lon = fix
+        key = (ident, region) if region else (ident, round(lat, 4), round(lon, 4))
+        node = nodes.get(key)
+        if node is None:
+            node = nodes[key] = len(self.ident)
+            self.typ.append(typ)
+            self.lat.append(lat)
+            self.lon.append(lon)
+            self.ident.append(ident)
+            radLat, radLon = math.radians(lat), math.radians(lon)
+            self.x.append(math.cos(radLat) * math.cos(radLon))
+            self.y.append(math.cos(radLat) * math.sin(radLon))
+            self.z.append(math.sin(radLat))
+            self.byIdent.setdefault(ident, []).append(node)
+        return node
+
+    def Link(self, edges):
+        # Counting sort of (from, to, length, airway) into the rows
+        count = len(self.ident)
+        starts = [0] * (count + 1)
+        for u, v, length, name in edges:
+            starts[u + 1] += 1
+        for n in range(count):
+            starts[n + 1] += starts[n]
+        self.offsets = array('i', starts)
+        size = len(edges)
+        self.targets = array('i', [0]) * size
+        self.lengths = array('d', [0.0]) * size
+        self.airway  = array('i', [0]) * size
+        fill = starts[:count]
+        for u, v, length, name in edges:
+            k = fill[u]
+            fill[u] = k + 1
+            self.targets[k] = v
+            self.lengths[k] = length
+            self.airway[k]  = name
+
+    def Segments(self):
+        return len(self.targets)
+
+    # Route end points: (lat, lon, ident, [(node, nm to the node)])
+
+    def Fix(self, ident, lat, lon):
+        # The node with this ID closest to lat, lon, None when not on an airway
+        nodes = self.byIdent.get(ident)
+        if not nodes:
+            return None
+        node = min(nodes, key=lambda n: NavDistance(lat, lon, self.lat[n], self.lon[n]))
+        return self.lat[node], self.lon[node], ident, [(node, 0.0)]
+
+    def Attach(self, lat, lon, ident):
+        # A point off the network, joined at the closest nodes
+        nearest = self.grid.Nearest(lat, lon, ATTACH_COUNT, radius=ATTACH_RADIUS)
+        if not nearest:
+            return None
+        return lat, lon, ident, [(node, dist) for dist, node in nearest]
+
+    # Search
+
+    def Path(self, start, end):
+        # (nm, [node], [segment]) of the shortest route, None when there's
+        # none. A segment is an index in targets, the one into the first
+        # node is None.
+        endLat, endLon = math.radians(end[0]), math.radians(end[1])
+        ex, ey, ez = math.cos(endLat) * math.cos(endLon), math.cos(endLat) * math.sin(endLon), math.sin(endLat)
+        xs, ys, zs = self.x, self.y, self.z
+        offsets, targets, lengths = self.offsets, self.targets, self.lengths
+        asin, sqrt, push, pop = math.asin, math.sqrt, heapq.heappush, heapq.heappop
+        inf = float("inf")
+
+        def Estimate(v):
+            # Straight to the end point, never longer than the airways
+            dx, dy, dz = xs[v] - ex, ys[v] - ey, zs[v] - ez
+            return 2 * RADIUS * asin(min(1.0, sqrt(dx*dx + dy*dy + dz*dz) / 2))
+
+        exits = dict(end[3])
+        cost = {}
+        came = {}
+        heap = []
+        for node, dist in start[3]:
+            if dist < cost.get(node, inf):
+                cost[node] = dist
+                came[node] = (-1, None)
+                push(heap, (dist + Estimate(node), node))
+        done = set()
+        total, last = inf, None
+        while heap:
+            f, u = pop(heap)
+            if u == -1:
+                # The end point, through node last
+                nodes, segments = self.Unwind(came, last)
+                return total, nodes, segments
+            if u in done:
+                continue
+            done.add(u)
+            g = cost[u]
+            if u in exits and g + exits[u] < total:
+                total, last = g + exits[u], u
+                push(heap, (total, -1))
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                d = g + lengths[k]
+                if d < cost.get(v, inf):
+                    cost[v] = d
+                    came[v] = (u, k)
+                    push(heap, (d + Estimate(v), v))
+        return None
+
+    def Unwind(self, came, node):
+        nodes, segments = [], []
+        while node != -1:
+            nodes.append(node)
+            node, segment = came[node]
+            segments.append(segment)
+        nodes.reverse()
+        segments.reverse()
+        return nodes, segments
+
+    def Describe(self, start, end, nodes, segments):
+        # "KJFK DCT MERIT J60 DRYER DCT KLAX", one airway name per run
+        words = [start[2]]
+        if nodes and self.ident[nodes[0]] != start[2]:
+            words.extend(["DCT", self.ident[nodes[0]]])
+        for node, segment in zip(nodes[1:], segments[1:]):
+            name = self.names[self.airway[segment]]
+            if len(words) >= 2 and words[-2] == name:
+                words[-1] = self.ident[node]
+            else:
+                words.extend([name, self.ident[node]])
+        if nodes and self.ident[nodes[-1]] != end[2]:
+            words.extend(["DCT", end[2]])
+        return " ".join(words)
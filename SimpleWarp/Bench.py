@@ -0,0 +1,574 @@
+# Simple Warp - benchmarks
+# See PI_Simple_Warp.py for license.
+#
+# Runs outside X-Plane:
+#   python -m SimpleWarp.Bench [--save FILE] [--baseline FILE] [name ...]
+# With --baseline, any timing more than 1.5 times its baseline value is
+# reported and the exit status is 1.
+
+from __future__ import print_function
+
+from timeit import default_timer as timer
+import heapq, json, math, os, random, sys, tempfile, time
+
+from SimpleWarp import Geodesy
+from SimpleWarp import Fuel
+from SimpleWarp import Projection
+from SimpleWarp.Airways import AirwayGraph
+from SimpleWarp.Cruise import FastCruise
+from SimpleWarp.Engine import WarpEngine, WarpSettings, WarpError, AI_PLANES, AI_KEYS
+from SimpleWarp.FakeSim import FakeSim, SyntheticAirways
+from SimpleWarp.FindCache import FindCache
+from SimpleWarp.Journal import WarpJournal, WarpEntry
+from SimpleWarp.Loader import NavIndexLoader
+from SimpleWarp.Log import NullLog
+from SimpleWarp.NavData import NavTable, ReadAwy
+from SimpleWarp.Stats import Stats, Profiled
+from SimpleWarp.WarpQueue import WarpQueue, ParseRequest
+
+RESULTS = {}
+
+def Timed(label, func, *args):
+    start = timer()
+    result = func(*args)
+    elapsed = (timer() - start) * 1000
+    RESULTS[label] = elapsed
+    print("  {:<44} {:10.2f} ms".format(label, elapsed))
+    return result
+
+def RandomPoints(count, seed=1):
+    rnd = random.Random(seed)
+    return [rnd.uniform(-80, 80) for i in range(count)], [rnd.uniform(-180, 180) for i in range(count)]
+
+def BenchGeodesy(count=100000):
+    print("Geodesy, {} points, numpy {}".format(count, "yes" if Geodesy.numpy else "no"))
+    lats, lons = RandomPoints(count)
+    refLat, refLon = 50.0, 8.6
+    scalar = Timed("NavDistance one pair at a time", lambda: [Geodesy.NavDistance(refLat, refLon, lat, lon) for lat, lon in zip(lats, lons)])
+    batch  = Timed("Distances", Geodesy.Distances, refLat, refLon, lats, lons)
+    print("  max difference {:.2e} nm".format(max(abs(a - b) for a, b in zip(scalar, batch))))
+    brgs = Timed("Bearings", Geodesy.Bearings, refLat, refLon, lats, lons)
+    Timed("Destinations", Geodesy.Destinations, refLat, refLon, brgs, batch)
+    Timed("CrossTracks", Geodesy.CrossTracks, refLat, refLon, 40.6, -73.8, lats, lons)
+
+def BenchEngine(sizes=(10000, 100000, 300000, 1000000)):
+    for size in sizes:
+        # The plugin runs on X-Plane's embedded Python 2.7, time it there
+        print("Engine, {} navaids, Python {}.{}".format(size, *sys.version_info[:2]))
+        sim = FakeSim(size)
+        settings = WarpSettings()
+        settings.warp_Use = True
+        engine = WarpEngine(sim, settings, NullLog())
+        Timed("{} build index".format(size), engine.BuildNavIndex, None, None)
+        ident = sim.navaids[size // 2].ident
+        Timed("{} Find".format(size), engine.Find, ident)
+        Timed("{} Next x1000".format(size), lambda: [engine.Next(1) for i in range(1000)])
+        # Typing 100 IDs one letter at a time
+        typed = [aid.ident[:i] for aid in sim.navaids[::size // 100] for i in range(1, len(aid.ident) + 1)]
+        Timed("{} Suggest x{} keystrokes".format(size, len(typed)), lambda: [engine.Suggest(text) for text in typed])
+        count, p50, p95, top = engine.stats.Summary("suggest")
+        print("    keystroke ms p50 {:.2f} p95 {:.2f} max {:.2f}".format(p50, p95, top))
+        RESULTS["{} keystroke p95".format(size)] = p95
+        RESULTS["{} keystroke max".format(size)] = top
+        Timed("{} nearest airport".format(size), engine.NearestAirport)
+        # Close enough for a warp to always make sense
+        engine.destLat, engine.destLon = sim.Get("lat") + 3, sim.Get("lon") + 3
+        Timed("{} Warp".format(size), engine.Warp)
+        for line in engine.stats.Lines():
+            print("    " + line)
+
+def BenchFuel(count=10000):
+    print("Fuel, {} tank layouts, numpy {}".format(count, "yes" if Fuel.numpy else "no"))
+    rnd = random.Random(1)
+    layouts = [[rnd.uniform(0, 5000) for t in range(rnd.randint(1, 9))] for i in range(count)]
+    usages  = [rnd.uniform(0, sum(tanks)) for tanks in layouts]
+    # Symmetric capacities with random shares, and fully asymmetric ones
+    ratios  = []
+    for tanks in layouts:
+        half = [rnd.uniform(0.05, 1) for t in range((len(tanks) + 1) // 2)]
+        ratios.append(half + half[len(tanks) // 2 - 1::-1] if len(tanks) > 1 else half)
+    skewed  = [[rnd.uniform(0.05, 1) for t in tanks] for tanks in layouts]
+    old = Timed("DrainTanks x{}".format(count), lambda: [Fuel.DrainTanks(t, u) for t, u in zip(layouts, usages)])
+    new = Timed("Redistribute x{}".format(count), lambda: [Fuel.Redistribute(t, u) for t, u in zip(layouts, usages)])
+    Timed("Redistribute with capacities x{}".format(count), lambda: [Fuel.Redistribute(t, u, r) for t, u, r in zip(layouts, usages, ratios)])
+    tanks = layouts[0] + layouts[1]
+    candidates = [rnd.uniform(0, sum(tanks)) for i in range(count)]
+    batch = Timed("RedistributeMany {} usages".format(count), Fuel.RedistributeMany, tanks, candidates, ratios[0] + ratios[1])
+    single = [Fuel.Redistribute(tanks, u, ratios[0] + ratios[1]) for u in candidates]
+    times = [rnd.uniform(0, 20000) for i in range(count)]
+    Timed("BurnMany {} times".format(count), Fuel.BurnMany, 0.8, times, 60000.0)
+
+    # Randomized cross-check against DrainTanks and the invariants
+    errors = []
+    def Check(ok, what):
+        if not ok and len(errors) < 10:
+            errors.append(what)
+    for tanks, usage, a, b in zip(layouts, usages, old, new):
+        Check(max(abs(x - y) for x, y in zip(a, b)) < 1e-6, "equal capacities differ from DrainTanks {} {}".format(tanks, usage))
+    for tanks, usage, rat in list(zip(layouts, usages, ratios)) + list(zip(layouts, usages, skewed)):
+        after = Fuel.Redistribute(tanks, usage, rat)
+        Check(abs(sum(tanks) - sum(after) - usage) < 1e-6, "fuel not conserved {} {} {}".format(tanks, usage, rat))
+        Check(all(-1e-9 <= y <= x + 1e-9 for x, y in zip(tanks, after)), "a tank gained or went negative {} {} {}".format(tanks, usage, rat))
+    Check(Fuel.Redistribute([100.0, 100.0], 201.0) is None, "more than the tanks hold")
+    for a, b in zip(batch, single):
+        Check(max(abs(x - y) for x, y in zip(a, b)) < 1e-6, "RedistributeMany differs from Redistribute")
+    for seconds in (0.0, 60.0, 3600.0, 20000.0):
+        # Closed form against one second steps
+        weight, burnt = 60000.0, 0.0
+        for i in range(int(seconds)):
+            step = 0.8 * weight / 60000.0
+            burnt, weight = burnt + step, weight - step
+        Check(abs(Fuel.Burn(0.8, seconds, 60000.0) - burnt) < 1e-3 * max(1.0, burnt), "Burn differs from integration {}".format(seconds))
+        Check(Fuel.Burn(0.8, seconds, 60000.0) <= 0.8 * seconds + 1e-9, "Burn above constant flow {}".format(seconds))
+    print("  cross-check: {}".format("ok" if not errors else "FAILED"))
+    for error in errors:
+        print("    " + error)
+    return errors
+
+def BenchLoader(sizes=(10000, 100000, 1000000)):
+    # Background build from the sim database, one Feed per simulated frame
+    for size in sizes:
+        print("Loader, {} navaids".format(size))
+        sim = FakeSim(size)
+        engine = WarpEngine(sim, WarpSettings(), NullLog())
+        loader = NavIndexLoader(engine, None, None)
+        frames = []
+        def Build():
+            loader.Start()
+            while True:
+                start = timer()
+                busy = loader.Feed()
+                frames.append(timer() - start)
+                if not busy:
+                    break
+                time.sleep(0.001)
+        Timed("{} background build".format(size), Build)
+        RESULTS["{} slowest frame".format(size)] = max(frames) * 1000
+        print("  {:<44} {:10.2f} ms".format("{} slowest frame".format(size), max(frames) * 1000))
+        # What Find costs until the index is published
+        engine.navIndex = None
+        Timed("{} Find without index".format(size), engine.Find, sim.navaids[size // 2].ident)
+
+def BenchJournal(count=10000):
+    print("Journal, {} warps".format(count))
+    path = os.path.join(tempfile.mkdtemp(), "bench.jrn")
+    journal = WarpJournal(path)
+    Timed("journal open", journal.Open)
+    entry = WarpEntry(0.0, 50.0, 8.0, 10000.0, 51.0, 9.0, 10000.0, 36000.0, 36400.0, 3,
+                      [4000.0, 8000.0, 4000.0], [4000.0, 7500.0, 4000.0])
+    Timed("journal append x{}".format(count), lambda: [journal.Append(entry) for i in range(count)])
+    Timed("journal undo x{}".format(journal.capacity), lambda: [journal.Pop() for i in range(journal.capacity)])
+    journal.Close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+class StatsSubject:
+    # The same method with and without timing
+    def __init__(self):
+        self.stats = Stats()
+
+    def Plain(self, x):
+        return x
+
+    @Profiled("find")
+    def Timed(self, x):
+        return x
+
+def BenchStats(count=100000):
+    print("Stats, {} calls".format(count))
+    obj = StatsSubject()
+    Timed("plain method x{}".format(count), lambda: [obj.Plain(i) for i in range(count)])
+    Timed("profiled method x{}".format(count), lambda: [obj.Timed(i) for i in range(count)])
+    # A DataRef read right after each sample, the worst case for the summary
+    def ReadEach():
+        for i in range(1000):
+            obj.stats.Add("find", 0.001)
+            obj.stats.Summary("find")
+    Timed("summary after each sample x1000", ReadEach)
+
+def BenchQueue(count=1000):
+    print("Warp queue, {} requests".format(count))
+    sim = FakeSim(100000)
+    # Fuel left alone, the tanks would run dry after a few hundred warps
+    engine = WarpEngine(sim, WarpSettings(), NullLog())
+    engine.BuildNavIndex(None, None)
+    results = []
+    cruise = FastCruise(engine)
+    queue = WarpQueue(engine, lambda sender, result: results.append(result), cruise)
+    rnd = random.Random(1)
+    # Half toward coordinates, half toward navaids
+    for i in range(count):
+        if i % 2:
+            queue.Submit(ParseRequest({"id": i, "ident": rnd.choice(sim.navaids).ident}))
+        else:
+            queue.Submit(ParseRequest({"id": i, "lat": rnd.uniform(-60, 70), "lon": rnd.uniform(-180, 180)}))
+    frames = []
+    def Run():
+        while True:
+            start = timer()
+            more = queue.Step()
+            frames.append(timer() - start)
+            if not more:
+                break
+    Timed("queue x{}".format(count), Run)
+    frames.sort()
+    print("  {} frames, {} ok, frame ms p50 {:.3f} p95 {:.3f} max {:.3f}".format(
+          len(frames), sum(1 for result in results if result.ok),
+          frames[len(frames) // 2] * 1000, frames[int(len(frames) * 0.95)] * 1000, frames[-1] * 1000))
+    if len(results) != count:
+        print("  FAILED: {} results for {} requests".format(len(results), count))
+        return ["queue"]
+    # A script asking for an ID gets that ID or nothing, no prefix or name match
+    idents = set(aid.ident for aid in sim.navaids)
+    prefix = next(aid.ident[:2] for aid in sim.navaids if aid.ident[:2] not in idents)
+    del results[:]
+    for i, ident in enumerate((prefix, "SYNTH")):
+        queue.Submit(ParseRequest({"id": i, "ident": ident}))
+    while queue.Step():
+        pass
+    if [(result.ok, result.message) for result in results] != [(False, "{} not found".format(prefix)), (False, "SYNTH not found")]:
+        print("  FAILED: partial IDs warped: {}".format(results))
+        return ["queue"]
+    # Nothing moves the aircraft under fast cruise
+    lat, lon = Geodesy.Destination(sim.Get("lat"), sim.Get("lon"), 80.0, 300.0)
+    engine.SetDestination(lat, lon, "BENCH")
+    cruise.Start()
+    position = sim.GetMany(("lat", "lon"))
+    del results[:]
+    queue.Submit(ParseRequest({"id": 0, "lat": 10.0, "lon": 10.0}))
+    while queue.Step():
+        pass
+    refused = [(result.ok, result.message) for result in results] == [(False, "fast cruise active")]
+    if not refused or not cruise.active or sim.GetMany(("lat", "lon")) != position:
+        print("  FAILED: queued warp ran under fast cruise: {}".format(results))
+        return ["queue"]
+    cruise.Stop()
+    return []
+
+def BenchCruise(factor=16, fps=60.0):
+    # 300nm at 230 m/s, 60 frames a second
+    print("Fast cruise x{}, {:.0f} fps".format(factor, fps))
+    sim = FakeSim(1000)
+    settings = WarpSettings()
+    settings.warp_Use = True
+    settings.warp_Cruise = factor
+    engine = WarpEngine(sim, settings, NullLog())
+    lat, lon = Geodesy.Destination(sim.Get("lat"), sim.Get("lon"), 80.0, 300.0 + settings.warp_Dst)
+    engine.SetDestination(lat, lon, "BENCH")
+    cruise = FastCruise(engine)
+    cruise.Start()
+    zulu, fuel = sim.Get("zulu_time"), sum(sim.Get("m_fuel"))
+    def Run():
+        while cruise.active:
+            cruise.Step(1 / fps)
+    Timed("cruise 300nm", Run)
+    times = sorted(cruise.frameTimes)
+    print("  {} frames, frame us p50 {:.1f} p95 {:.1f} of the last {}, max {:.1f}".format(
+          cruise.frames, times[len(times) // 2] * 1e6, times[int(len(times) * 0.95)] * 1e6, len(times), cruise.frameMax * 1e6))
+    RESULTS["cruise frame p95"] = times[int(len(times) * 0.95)] * 1000
+    # Stopped warp_Dst short, time and fuel for what was skipped
+    left = Geodesy.NavDistance(sim.Get("lat"), sim.Get("lon"), lat, lon)
+    skipped = sim.Get("zulu_time") - zulu
+    burnt = fuel - sum(sim.Get("m_fuel"))
+    expected = 300.0 * 1852 / sim.Get("groundspeed")
+    print("  {:.2f}nm left, {:.1f}sec skipped for {:.1f}, {:.1f}kg burnt".format(left, skipped, expected, burnt))
+    if abs(left - settings.warp_Dst) > 0.01 or abs(skipped - expected) > 0.01 * expected:
+        print("  FAILED: fast cruise ended off target")
+        return ["cruise"]
+    return []
+
+def LegacyDirectWarp(sim, destLat, destLon, warpMax, warpDst):
+    # Warp point as it was worked out before, interpolated in the local
+    # frame: three conversions with the final one
+    local_x, local_y, local_z, elevation = sim.GetMany(("local_x", "local_y", "local_z", "elevation"))
+    wpt_x, wpt_y, wpt_z = sim.WorldToLocal(destLat, destLon, local_y)
+    delta_x, delta_y, delta_z = wpt_x - local_x, wpt_y - local_y, wpt_z - local_z
+    distance = math.sqrt(delta_x*delta_x + delta_y*delta_y + delta_z*delta_z) / 1852.0
+    factor = min(warpMax, distance - warpDst) / distance
+    outLat, outLon, outAlt = sim.LocalToWorld(local_x + factor * delta_x, local_y + factor * delta_y, local_z + factor * delta_z)
+    return outLat, outLon, sim.WorldToLocal(outLat, outLon, elevation)
+
+class CountingSim:
+    # Counts the local frame conversions of the sim it wraps
+    def __init__(self, sim):
+        self.sim = sim
+        self.conversions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.sim, name)
+
+    def WorldToLocal(self, lat, lon, alt):
+        self.conversions += 1
+        return self.sim.WorldToLocal(lat, lon, alt)
+
+    def LocalToWorld(self, x, y, z):
+        self.conversions += 1
+        return self.sim.LocalToWorld(x, y, z)
+
+def BenchProjection(count=2000, ranges=(100, 500, 3000)):
+    # Warps of up to 3000nm in any direction, on the round earth frame of FakeSim
+    print("Projection, {} warps".format(count))
+    sim = CountingSim(FakeSim(1000))
+    settings = WarpSettings()
+    settings.warp_Max = ranges[-1]
+    engine = WarpEngine(sim, settings, NullLog())
+    my_Lat, my_Lon, elevation = sim.GetMany(("lat", "lon", "elevation"))
+    rnd = random.Random(1)
+    targets = [Projection.Direct(my_Lat, my_Lon, rnd.uniform(0, 360), rnd.uniform(settings.warp_Dst + 1, ranges[-1]))
+               for i in range(count)]
+    def Legacy():
+        return [LegacyDirectWarp(sim, lat, lon, settings.warp_Max, settings.warp_Dst)[:2] for lat, lon in targets]
+    def Ellipsoid():
+        points = []
+        for lat, lon in targets:
+            engine.destLat, engine.destLon = lat, lon
+            outLat, outLon, travel = engine.PlanDirectWarp(my_Lat, my_Lon)
+            sim.WorldToLocal(outLat, outLon, elevation)
+            points.append((outLat, outLon))
+        return points
+    failed = []
+    for label, func in (("local frame interpolation", Legacy), ("ellipsoid", Ellipsoid)):
+        sim.conversions = 0
+        points = Timed("{} x{}".format(label, count), func)
+        print("    {:.0f} conversions per warp".format(sim.conversions / float(count)))
+        # How far from warp_Dst short of the target, and off the geodesic
+        worst = dict((limit, [0.0, 0.0]) for limit in ranges)
+        for (lat, lon), (outLat, outLon) in zip(targets, points):
+            distance, azimuth = Projection.Inverse(my_Lat, my_Lon, lat, lon)
+            flown, course = Projection.Inverse(my_Lat, my_Lon, outLat, outLon)
+            short = abs(Projection.Inverse(outLat, outLon, lat, lon)[0] - settings.warp_Dst)
+            off = abs(flown * math.sin(math.radians(course - azimuth)))
+            limit = min(limit for limit in ranges if distance <= limit)
+            worst[limit] = [max(worst[limit][0], short), max(worst[limit][1], off)]
+        for limit in ranges:
+            print("    up to {:>4}nm: max {:.4f}nm off warp_Dst, {:.4f}nm off the geodesic".format(limit, *worst[limit]))
+        if label == "ellipsoid" and max(max(values) for values in worst.values()) > 1e-6:
+            print("  FAILED: ellipsoid warp points off target")
+            failed.append("projection")
+    # The frame is only worked out again when the reference point moves
+    frame = sim.sim.frame
+    shifts = frame.shifts
+    sim.ShiftOrigin(my_Lat + 1.0, my_Lon)
+    Ellipsoid()
+    print("  {} frame rebuilds for {} conversions after one origin shift".format(frame.shifts - shifts, count))
+    # Closer than warp_Dst there's nowhere to go, never away from the target
+    engine.destLat, engine.destLon = Projection.Direct(my_Lat, my_Lon, 45.0, settings.warp_Dst / 2.0)
+    try:
+        engine.PlanDirectWarp(my_Lat, my_Lon)
+        print("  FAILED: warp planned within warp_Dst of the destination")
+        failed.append("projection")
+    except WarpError:
+        pass
+    return failed
+
+def BenchFormation(count=1000):
+    # Warps with the AI aircraft moved along, none, one and all of them
+    print("Formation, {} warps".format(count))
+    failed = []
+    for aircraft in (0, 1, AI_PLANES):
+        sim = FakeSim(1000)
+        sim.aircraft = aircraft
+        settings = WarpSettings()
+        settings.warp_AI = aircraft > 0
+        engine = WarpEngine(sim, settings, NullLog())
+        keys = [key for plane in AI_KEYS[:aircraft] for key in plane]
+        before = [a - b for a, b in zip(sim.GetMany(keys), sim.GetMany(("local_x", "local_y", "local_z") * aircraft))]
+        rnd = random.Random(1)
+        def Warps():
+            for i in range(count):
+                lat, lon = sim.GetMany(("lat", "lon"))
+                engine.destLat, engine.destLon = Geodesy.Destination(lat, lon, rnd.uniform(0, 360),
+                                                                     rnd.uniform(settings.warp_Dst + 1, 80))
+                engine.DoWarp()
+        Timed("{} AI aircraft, warp x{}".format(aircraft, count), Warps)
+        # Same place around the aircraft after all the warps
+        after = [a - b for a, b in zip(sim.GetMany(keys), sim.GetMany(("local_x", "local_y", "local_z") * aircraft))]
+        drift = max([abs(a - b) for a, b in zip(before, after)] or [0.0])
+        print("    max offset change {:.2e}m".format(drift))
+        if drift > 1e-3:
+            print("  FAILED: AI aircraft did not keep their offsets")
+            failed.append("formation")
+    return failed
+
+def BenchFindCache(size=100000, count=300):
+    # Cold start, before the index is built: Find walks the navaid database,
+    # unless the ID was cached in an earlier session
+    print("ID cache, {} navaids, {} IDs".format(size, count))
+    sim = FakeSim(size)
+    idents = sorted(set(aid.ident for aid in sim.navaids[::size // count]))
+    path = os.path.join(tempfile.mkdtemp(), "Simple_Warp.ids")
+    results = []
+    for label in ("first session", "next session"):
+        engine = WarpEngine(sim, WarpSettings(), NullLog())
+        engine.findCache = FindCache(path, NullLog())
+        Timed("{} load".format(label), engine.findCache.Load, "1710")
+        def Finds():
+            for ident in idents:
+                engine.Find(ident)
+                results.append([(aid.ident, aid.lat, aid.lon) for aid in engine.findList])
+        Timed("{} Find x{}".format(label, len(idents)), Finds)
+        print("    {} hits, {} misses".format(engine.findCache.hits, engine.findCache.misses))
+        Timed("{} save".format(label), engine.findCache.Save)
+    # Another AIRAC cycle starts over
+    stale = FindCache(path, NullLog())
+    stale.Load("1711")
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+    if results[:len(idents)] != results[len(idents):] or len(stale):
+        print("  FAILED: cached results differ, or kept for another cycle")
+        return ["findcache"]
+    return []
+
+def BenchPlanner(count=100):
+    # Reachable range over a full FMS plan, one batch against one plan per waypoint
+    print("Planner, {} FMS waypoints, numpy {}".format(count, "yes" if Fuel.numpy else "no"))
+    sim = FakeSim(1000)
+    settings = WarpSettings()
+    settings.warp_Use = True
+    engine = WarpEngine(sim, settings, NullLog())
+    lat, lon = sim.Get("lat"), sim.Get("lon")
+    for i in range(count):
+        wptLat, wptLon = Geodesy.Destination(lat, lon, 90.0, 40.0 * (i + 1))
+        sim.SetFMSEntry(i, "W{}".format(i), wptLat, wptLon, 35000)
+    reach = Timed("Reachable x{}".format(count), engine.Reachable)
+    targets = [(plan.lat, plan.lon, plan.travel, wpt.index) for wpt, plan in reach if plan is not None]
+    targets.append((0.0, 0.0, 1e5, None))
+    batch = Timed("PlanMany x{}".format(len(targets)), engine.PlanMany, targets)
+    grounds = sim.Get("groundspeed")
+    single = Timed("PlanFuel x{}".format(len(targets)), lambda: [engine.PlanFuel(travel, grounds) for lat, lon, travel, fmsDest in targets])
+    print("    fuel reaches {} of {} waypoints".format(len(targets) - 1, len(reach)))
+    failed = []
+    for plan, fuel in zip(batch, single):
+        if (plan is None) != (fuel is None) or (plan and max(abs(a - b) for a, b in zip(plan.tanks, fuel[0])) > 1e-6):
+            failed.append("planner")
+            break
+    # A warp the fuel can't cover writes nothing
+    engine.SetDestination(*(Geodesy.Destination(lat, lon, 90.0, 5000.0) + ("FAR",)))
+    settings.warp_Max = 5000
+    before = (sim.Get("local_x"), sim.Get("local_z"), list(sim.Get("m_fuel")), sim.Get("zulu_time"))
+    try:
+        engine.DoWarp()
+        failed.append("planner")
+    except WarpError:
+        pass
+    if (sim.Get("local_x"), sim.Get("local_z"), list(sim.Get("m_fuel")), sim.Get("zulu_time")) != before:
+        failed.append("planner")
+    # Standing still there's no fuel to plan, refused rather than failing
+    settings.warp_Max = 100
+    sim.Set("groundspeed", 0.0)
+    message = "Groundspeed is zero, cannot plan fuel"
+    if engine.Preview() != [message] or engine.Warp() != message:
+        failed.append("planner")
+    if failed:
+        print("  FAILED: batch plans differ from single ones, or a refused warp wrote something")
+    return failed
+
+def BenchAirways(spacing=0.7, queries=50, checks=5):
+    # Synthetic network about the size of the real one, read from an 1100 file
+    fixes, lines = SyntheticAirways(spacing)
+    print("Airways, {} fixes, {} records".format(len(fixes), len(lines)))
+    table = NavTable()
+    table.Extend(fixes)
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "earth_awy.dat")
+    with open(path, "w") as fh:
+        fh.write("I\n1100 Version\n\n")
+        fh.write("\n".join(lines))
+        fh.write("\n99\n")
+    graph = Timed("cold load", lambda: AirwayGraph.Build(ReadAwy(path), table))
+    os.remove(path)
+    os.rmdir(folder)
+    print("  {} nodes, {} segments".format(len(graph), graph.Segments()))
+    # Continent scale queries, 1500 to 3000nm
+    rnd = random.Random(1)
+    pairs = []
+    while len(pairs) < queries:
+        a, b = rnd.randrange(len(graph)), rnd.randrange(len(graph))
+        if 1500 <= Geodesy.NavDistance(graph.lat[a], graph.lon[a], graph.lat[b], graph.lon[b]) <= 3000:
+            pairs.append((graph.Fix(graph.ident[a], graph.lat[a], graph.lon[a]),
+                          graph.Fix(graph.ident[b], graph.lat[b], graph.lon[b])))
+    times = []
+    paths = []
+    def Queries():
+        for start, end in pairs:
+            begin = timer()
+            paths.append(graph.Path(start, end))
+            times.append(timer() - begin)
+    Timed("A* x{}".format(queries), Queries)
+    times.sort()
+    print("  query ms p50 {:.1f} p95 {:.1f} max {:.1f}, {} without route".format(
+          times[len(times) // 2] * 1000, times[int(len(times) * 0.95)] * 1000, times[-1] * 1000,
+          sum(1 for found in paths if found is None)))
+    # A* must find the same distance as a plain Dijkstra search
+    failed = []
+    for (start, end), found in list(zip(pairs, paths))[:checks]:
+        reference = Dijkstra(graph, start[3][0][0], end[3][0][0])
+        if (found is None) != (reference is None) or (found and abs(found[0] - reference) > 1e-6):
+            failed.append("airways")
+            print("  FAILED: A* {} Dijkstra {}".format(found and found[0], reference))
+    return failed
+
+def Dijkstra(graph, source, target):
+    # nm of the shortest route, None when there's none
+    cost = {source: 0.0}
+    heap = [(0.0, source)]
+    done = set()
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u == target:
+            return d
+        if u in done:
+            continue
+        done.add(u)
+        for k in range(graph.offsets[u], graph.offsets[u + 1]):
+            v = graph.targets[k]
+            if d + graph.lengths[k] < cost.get(v, float("inf")):
+                cost[v] = d + graph.lengths[k]
+                heapq.heappush(heap, (cost[v], v))
+    return None
+
+BENCHES = [
+    ("geodesy", BenchGeodesy),
+    ("engine",  BenchEngine),
+    ("fuel",    BenchFuel),
+    ("journal", BenchJournal),
+    ("loader",  BenchLoader),
+    ("stats",   BenchStats),
+    ("queue",   BenchQueue),
+    ("cruise",  BenchCruise),
+    ("projection", BenchProjection),
+    ("formation", BenchFormation),
+    ("findcache", BenchFindCache),
+    ("planner", BenchPlanner),
+    ("airways", BenchAirways)]
+
+def Main(args):
+    saveFile = baselineFile = None
+    selected = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--save":
+            saveFile = args.pop(0)
+        elif arg == "--baseline":
+            baselineFile = args.pop(0)
+        else:
+            selected.append(arg)
+    failed = False
+    for name, bench in BENCHES:
+        if not selected or name in selected:
+            # Benches with a cross-check return the failures
+            failed = bool(bench()) or failed
+    if saveFile:
+        with open(saveFile, "w") as fh:
+            json.dump(RESULTS, fh, indent=1, sort_keys=True)
+    if baselineFile:
+        with open(baselineFile) as fh:
+            baseline = json.load(fh)
+        slower = [label for label, ms in sorted(RESULTS.items()) if label in baseline and ms > 1.5 * baseline[label]]
+        for label in slower:
+            print("Regression: {} {:.2f} ms, baseline {:.2f} ms".format(label, RESULTS[label], baseline[label]))
+        return 1 if slower or failed else 0
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,176 @@
+# Simple Warp - fast cruise
+# See PI_Simple_Warp.py for license.
+#
+# Instead of one jump, the aircraft is moved every frame along the great
+# circle toward the destination, covering warp_Cruise times what it flies
+# at its groundspeed. X-Plane flies the first time, the cruise moves it
+# the other warp_Cruise - 1 times and, with warp_Use, moves zulu time on
+# by as much. It stops by itself warp_Dst short of the destination.
+#
+# Step runs every frame and is kept to a few DataRef reads, one
+# WorldToLocal and one write. The destination is a unit vector worked out
+# once, the next position is a rotation of the aircraft's unit vector
+# toward it, with no bearing or haversine. Fuel is burnt for the time
+# skipped and written to the tanks once per CRUISE_FUEL_INTERVAL seconds.
+
+from collections import deque
+from timeit import default_timer as timer
+import math
+
+from SimpleWarp.Engine import WarpError
+from SimpleWarp.Fuel import Burn, Redistribute
+from SimpleWarp.Geodesy import RADIUS
+from SimpleWarp.Stats import Profiled, STATS_WINDOW
+
+CRUISE_FUEL_INTERVAL = 1.0   # seconds between tank writes
+CRUISE_FRAME_MAX     = 0.25  # seconds, longer frames are taken as this
+
+class FastCruise:
+    def __init__(self, engine):
+        self.engine = engine
+        self.stats  = engine.stats
+        self.active = False
+        self.frames = 0
+        self.frameMax = 0.0
+        self.frameTimes = deque(maxlen=STATS_WINDOW)   # the last frames only, a cruise lasts hours
+
+    def Start(self):
+        # Message to show, WarpError when the cruise can't start
+        engine, sim, settings = self.engine, self.engine.sim, self.engine.settings
+        if self.active:
+            raise WarpError("Fast cruise already on")
+        if engine.Busy():
+            raise WarpError("Warp in progress")
+        if engine.destLat == 0.0 and engine.destLon == 0.0:
+            raise WarpError("Nowhere to cruise to")
+        factor = settings.warp_Cruise
+        if factor < 2:
+            raise WarpError("Fast cruise factor must be 2 or more")
+        if not sim.CanWrite("local_x", "local_y", "local_z"):
+            raise WarpError("Aircraft position is not writable")
+        if settings.warp_Use and not sim.CanWrite("m_fuel", "zulu_time"):
+            raise WarpError("Fuel and time are not writable")
+
+        radLat, radLon = math.radians(engine.destLat), math.radians(engine.destLon)
+        self.target = (math.cos(radLat) * math.cos(radLon), math.cos(radLat) * math.sin(radLon), math.sin(radLat))
+        self.stopAngle = settings.warp_Dst / RADIUS
+        my_Lat, my_Lon = engine.GetMyCoords()
+        if self.Remaining(my_Lat, my_Lon) <= self.stopAngle:
+            raise WarpError("Already within {}nm of {}".format(settings.warp_Dst, engine.destName))
+
+        self.factor    = factor
+        self.extra     = factor - 1.0
+        self.useFuel   = settings.warp_Use
+        self.numEngines, self.numTanks = sim.GetMany(("num_engines", "num_tanks"))
+        self.ratios    = sim.GetArray("tank_rat", self.numTanks)
+        self.pre       = engine.WarpState()
+        self.last      = (my_Lat, my_Lon, self.pre[2])
+        self.travel    = 0.0   # nm moved by the cruise
+        self.skipped   = 0.0   # seconds skipped
+        self.unburnt   = 0.0   # seconds skipped, not burnt yet
+        self.burnt     = 0.0
+        self.frames    = 0
+        self.frameMax  = 0.0
+        self.frameTimes.clear()
+        self.active    = True
+        engine.lastWarp = None
+        return "Fast cruise x{} to {}, {:.0f}nm to go".format(factor, engine.destName,
+                                                            (self.Remaining(my_Lat, my_Lon) - self.stopAngle) * RADIUS)
+
+    def Remaining(self, lat, lon):
+        # Angle to the destination, radians
+        radLat, radLon = math.radians(lat), math.radians(lon)
+        cosLat = math.cos(radLat)
+        tx, ty, tz = self.target
+        dot = cosLat * math.cos(radLon) * tx + cosLat * math.sin(radLon) * ty + math.sin(radLat) * tz
+        return math.acos(max(-1.0, min(1.0, dot)))
+
+    @Profiled("cruise")
+    def Step(self, elapsed):
+        # Once per frame with the seconds since the last one. None while
+        # cruising, the final message when done.
+        start = timer()
+        sim = self.engine.sim
+        lat, lon, elevation, grounds, zulu_time, paused = sim.GetMany(
+            ("lat", "lon", "elevation", "groundspeed", "zulu_time", "paused"))
+        if paused or grounds <= 0.0 or elapsed <= 0.0:
+            return None
+        seconds = min(elapsed, CRUISE_FRAME_MAX) * self.extra
+        angle = grounds * seconds / (1852.0 * RADIUS)
+
+        # Aircraft and destination unit vectors
+        radLat, radLon = math.radians(lat), math.radians(lon)
+        cosLat = math.cos(radLat)
+        px, py, pz = cosLat * math.cos(radLon), cosLat * math.sin(radLon), math.sin(radLat)
+        tx, ty, tz = self.target
+        dot = max(-1.0, min(1.0, px * tx + py * ty + pz * tz))
+        remaining = math.acos(dot)
+        done = remaining - angle <= self.stopAngle
+        if done:
+            angle = max(0.0, remaining - self.stopAngle)
+            seconds = angle * 1852.0 * RADIUS / grounds
+
+        # Turn p by angle toward t, along the great circle through both
+        nx, ny, nz = tx - dot * px, ty - dot * py, tz - dot * pz
+        norm = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if norm > 0.0:
+            c, s = math.cos(angle), math.sin(angle) / norm
+            qx, qy, qz = px * c + nx * s, py * c + ny * s, pz * c + nz * s
+            lat = math.degrees(math.asin(max(-1.0, min(1.0, qz))))
+            lon = math.degrees(math.atan2(qy, qx))
+            wpt_x, wpt_y, wpt_z = sim.WorldToLocal(lat, lon, elevation)
+            self.engine.MoveTo(wpt_x, wpt_y, wpt_z)
+        self.last = (lat, lon, elevation)
+        self.travel += angle * RADIUS
+
+        self.skipped += seconds
+        fuelDue = False
+        if self.useFuel:
+            sim.Set("zulu_time", zulu_time + seconds)
+            self.unburnt += seconds
+            fuelDue = self.unburnt >= CRUISE_FUEL_INTERVAL * self.extra
+        took = timer() - start
+        self.frames += 1
+        self.frameMax = max(self.frameMax, took)
+        self.frameTimes.append(took)
+
+        if fuelDue and not self.BurnFuel():
+            return self.End("Out of fuel, fast cruise stopped")
+        if done:
+            return self.End(None)
+        return None
+
+    def BurnFuel(self):
+        # Fuel for the time skipped since the last write, False when the tanks can't hold it
+        sim = self.engine.sim
+        seconds, self.unburnt = self.unburnt, 0.0
+        flow = sum(sim.GetArray("fuel_flow", self.numEngines))
+        usage = Burn(flow, seconds, sim.Get("m_total"))
+        tanks = Redistribute(sim.GetArray("m_fuel", self.numTanks), usage, self.ratios)
+        if tanks is None:
+            return False
+        sim.SetArray("m_fuel", tanks)
+        self.burnt += usage
+        return True
+
+    def Stop(self):
+        # Cancelled, message to show
+        if not self.active:
+            return "Fast cruise is off"
+        return self.End("Fast cruise stopped")
+
+    def End(self, reason):
+        engine = self.engine
+        self.active = False
+        if self.useFuel and self.unburnt > 0.0 and not self.BurnFuel():
+            engine.log.Warning("Not enough fuel left after fast cruise")
+        engine.Record(self.pre, *self.last)
+        times = sorted(self.frameTimes)
+        if times:
+            engine.log.Info("Fast cruise x{} {:.1f}nm in {} frames, {:.0f}sec skipped, frame us p50 {:.1f} of the last {}, max {:.1f}",
+                            self.factor, self.travel, self.frames, self.skipped,
+                            times[len(times) // 2] * 1e6, len(times), self.frameMax * 1e6)
+        summary = "{:.1f}nm, {:.0f}min skipped, {:.0f}kg".format(self.travel, self.skipped / 60, self.burnt)
+        if reason is None:
+            return "Fast cruise done, {}".format(summary)
+        return "{}, {}".format(reason, summary)
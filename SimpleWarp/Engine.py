@@ -0,0 +1,818 @@
+# Simple Warp - warp engine
+# See PI_Simple_Warp.py for license.
+#
+# Navaid search, warp geometry and fuel logic, free of any XPLM call.
+# Everything the engine needs from the simulator goes through the sim
+# adapter: PI_Simple_Warp.XPLMSim in X-Plane, SimpleWarp.FakeSim outside.
+#
+# Adapter interface:
+#   Get(key), GetMany(keys), GetArray(key, count), CanWrite(*keys)
+#   Set(key, value), SetMany(pairs), SetArray(key, values)
+#                                     SetMany takes lists for array DataRefs
+#   WorldToLocal(lat, lon, alt), LocalToWorld(x, y, z)
+#   NavAids(typ=None)                 NavAid records, all or one type
+#   ProbeTerrain(lat, lon)            terrain elevation m, None if not loaded
+#   CountFMSEntries(), GetFMSEntry(i) (type, id, lat, lon)
+#   GetDestinationFMSEntry(), SetDestinationFMSEntry(i)
+#   SetFMSEntry(i, id, lat, lon, altitude ft), ClearFMSEntry(i)
+#   OtherAircraft()                   AI aircraft that may be moved, 0 to AI_PLANES
+
+from collections import namedtuple
+from timeit import default_timer as timer
+import bisect, heapq, math, os, time
+
+from SimpleWarp.NavData import (FILE_INF, FILE_AWY, FILE_FIX, FILE_NAV, NAV_AIRPORT, NavType,
+                                NavTable, FindNavDataFile, ReadCycle, ReadNav, ReadFix, ReadAwy)
+from SimpleWarp.NavIndex import NavIndex
+from SimpleWarp.Airways import AirwayGraph
+from SimpleWarp.Geodesy import NavDistance, Bearing, Destination
+from SimpleWarp.Projection import Inverse, Direct
+from SimpleWarp.Route import Route, Waypoint
+from SimpleWarp.Fuel import Burn, BurnMany, Redistribute, RedistributeMany
+from SimpleWarp.Journal import WarpEntry
+from SimpleWarp.Terrain import TerrainSampler, LinePoints
+from SimpleWarp.Log import DEBUG
+from SimpleWarp.Stats import Stats, Profiled
+
+# Candidates listed while typing, and kept by Find when the ID is not exact
+SUGGEST_COUNT = 5
+FIND_COUNT    = 20
+
+# X-Plane's FMS holds 100 entries
+FMS_ENTRIES = 100
+
+# AI aircraft with sim/multiplayer/position/planeN_x/y/z DataRefs, keyed plane1_x...
+AI_PLANES = 19
+AI_KEYS = [tuple("plane{}_{}".format(n, axis) for axis in "xyz") for n in range(1, AI_PLANES + 1)]
+
+# What a warp does, worked out before anything is written. tanks is None
+# when fuel and time are left alone, zulu is the zulu time after the warp.
+WarpPlan = namedtuple('WarpPlan', ['fromLat', 'fromLon', 'lat', 'lon', 'elevation', 'travel', 'grounds',
+                                   'timeSaved', 'tanks', 'burnt', 'zulu', 'fmsDest'])
+
+def ZuluText(seconds):
+    return "{:02d}:{:02d}Z".format(int(seconds // 3600) % 24, int(seconds % 3600 // 60))
+
+class WarpError(Exception):
+    # Carries the message shown to the pilot
+    pass
+
+class WarpSettings:
+    def __init__(self):
+        self.warp_Dst = 10
+        self.warp_Min = 20
+        self.warp_Max = 100
+        self.warp_Alt = 200
+        self.warp_Spd = 200
+        self.warp_Use = False
+        self.warp_Step = 0
+        self.warp_StepsMax = 100
+        self.warp_Height = "KEEP"    # KEEP, TERRAIN or AUTOPILOT
+        self.warp_Clearance = 1000   # ft above the highest terrain on the way
+        self.warp_Cruise = 10        # fast cruise time factor
+        self.warp_AI = False         # move the AI aircraft along
+
+class WarpEngine:
+    def __init__(self, sim, settings, log):
+        self.sim      = sim
+        self.settings = settings
+        self.log      = log    # SimpleWarp.Log.AsyncLog
+        self.navIndex = None
+        self.airways  = None   # SimpleWarp.Airways.AirwayGraph, once loaded
+        self.airwayRoute = None
+        self.SearchFix = ""
+        self.destLat  = 0.0
+        self.destLon  = 0.0
+        self.destName = ""
+        self.findList = []
+        self.findPos  = 0
+        self.suggestList = []
+        self.routeMode  = None
+        self.routeValue = None
+        self.smoothActive = False
+        self.probeActive  = False
+        self.pending  = None
+        self.terrain  = TerrainSampler(sim)
+        self.unknown  = None   # (points, of points) where the terrain was unknown
+        self.journal  = None   # SimpleWarp.Journal.WarpJournal, optional
+        self.findCache = None  # SimpleWarp.FindCache.FindCache, optional
+        self.lastWarp = None   # (lat, lon, elevation) of the last warp done
+        self.stats    = Stats()
+        self.aiKeys   = (0, ())   # (count, keys) of the AI aircraft last moved
+
+    def GetMyCoords(self):
+        return self.sim.GetMany(("lat", "lon"))
+
+    # Navaid index
+
+    @Profiled("index")
+    def BuildNavIndex(self, xplaneRoot, fileNac):
+        # Once per session, from the binary cache when it matches the AIRAC
+        # cycle. SimpleWarp.Loader runs the same steps off the sim thread.
+        start = timer()
+        table, cycle = self.LoadNavCache(xplaneRoot, fileNac)
+        source = "cache"
+        if table is None:
+            table, simType, source = self.ReadNavFiles(xplaneRoot)
+            table.Extend(self.sim.NavAids(simType))
+            self.SaveNavCache(table, fileNac, cycle)
+        self.navIndex = NavIndex(table)
+        self.log.Info("Navaid index built from {} (cycle {}): {} entries in {:.2f}sec", source, cycle, self.navIndex.count, timer() - start)
+        self.LoadAirways(xplaneRoot, table)
+
+    def LoadNavCache(self, xplaneRoot, fileNac):
+        # (table, cycle), table is None without a cache for the current cycle
+        fileInf = FindNavDataFile(xplaneRoot, FILE_INF) if xplaneRoot else None
+        cycle = ReadCycle(fileInf) if fileInf else None
+        table = NavTable.Load(fileNac, cycle) if cycle else None
+        return table, cycle
+
+    def SaveNavCache(self, table, fileNac, cycle):
+        if not cycle:
+            return
+        try:
+            table.Save(fileNac, cycle)
+        except (IOError, OSError):
+            self.log.Warning("Failed to write navaid cache {}", fileNac)
+
+    def LoadAirways(self, xplaneRoot, table):
+        # The fixes of 1100 airway files are looked up in table
+        fileAwy = FindNavDataFile(xplaneRoot, FILE_AWY) if xplaneRoot else None
+        if not fileAwy:
+            self.log.Info("No {}, airway routes are disabled", FILE_AWY)
+            return
+        start = timer()
+        graph = AirwayGraph.Build(ReadAwy(fileAwy), table)
+        self.airways = graph
+        self.log.Info("Airways loaded: {} fixes, {} segments, {} skipped, in {:.2f}sec",
+                      len(graph), graph.Segments(), graph.skipped, timer() - start)
+
+    def ReadNavFiles(self, xplaneRoot):
+        # (table, type, source): what the navdata files hold, and the navaid
+        # type still to read from the simulator, None for all of them
+        table = NavTable()
+        fileNav = FindNavDataFile(xplaneRoot, FILE_NAV) if xplaneRoot else None
+        fileFix = FindNavDataFile(xplaneRoot, FILE_FIX) if xplaneRoot else None
+        if fileNav and fileFix:
+            table.Extend(ReadNav(fileNav))
+            table.Extend(ReadFix(fileFix))
+            # Airports are not in earth_*.dat, only walk their part of the database
+            return table, NAV_AIRPORT, "navdata files"
+        return table, None, "navaid database"
+
+    # Search
+
+    def Clear(self):
+        self.findList = []
+        self.findPos  = 0
+        self.suggestList = []
+        self.routeMode = None
+
+    def SetDestination(self, lat, lon, name):
+        # Given directly, nothing to step through with Next
+        self.Clear()
+        self.destLat  = lat
+        self.destLon  = lon
+        self.destName = name
+
+    @Profiled("find")
+    def Find(self, text):
+        my_Lat, my_Lon = self.GetMyCoords()
+        self.findList = []
+        self.findPos  = 0
+        self.SearchFix = text.upper()
+        self.routeMode = None
+
+        # "#5" is FMS entry 5 along the route, "@250" is 250nm along the route
+        if self.SearchFix[:1] in ("#", "@"):
+            return self.FindOnRoute()
+        # "ABC>XYZ" is the airway route from ABC to XYZ, ">XYZ" from here
+        if ">" in self.SearchFix:
+            return self.FindAirwayRoute(my_Lat, my_Lon)
+
+        if self.SearchFix == "":
+            num_FMS = self.sim.CountFMSEntries()
+            self.log.Debug("CountFMSEntries() : {}", num_FMS)
+            dest_FMS = self.sim.GetDestinationFMSEntry()
+            self.log.Debug("GetDestinationFMSEntry() : {}", dest_FMS)
+            if num_FMS < 1:
+                return "You're not heading to a FMS waypoint"
+
+            outType, outID, outLat, outLon = self.sim.GetFMSEntry(dest_FMS)
+            dest_Type = NavType[int(outType)]
+            self.SearchFix = outID
+            self.destLat  = float(outLat)
+            self.destLon  = float(outLon)
+            self.destName = outID
+            dist = NavDistance(my_Lat, my_Lon, self.destLat, self.destLon)
+            if self.destLat == 0.0 and self.destLon == 0.0:
+                return "You're not heading to a FMS waypoint"
+            return "FMS[{}] is {} [{}] at {:.1f} nm".format(dest_FMS, outID, dest_Type, dist)
+
+        # Closest first, Next/Prev only move the cursor afterwards
+        navIndex = self.navIndex
+        self.findList = self.FindExact(self.SearchFix, my_Lat, my_Lon)
+        if not self.findList and navIndex is not None:
+            # No such ID, take the IDs and names starting with the text
+            self.findList = [aid for dist, aid in navIndex.Search(self.SearchFix, my_Lat, my_Lon, FIND_COUNT)]
+        self.findPos  = 0
+        if self.findList:
+            return self.ShowFoundAid(my_Lat, my_Lon)
+        self.destLat = 0.0
+        self.destLon = 0.0
+        return "{} not found".format(self.SearchFix)
+
+    def FindExact(self, ident, my_Lat, my_Lon):
+        # Every navaid with exactly this ID, closest first
+        navIndex = self.navIndex
+        cache = self.findCache
+        cached = cache.Get(ident) if cache is not None else None
+        if cached is not None:
+            found = sorted(cached, key=lambda aid: NavDistance(my_Lat, my_Lon, aid.lat, aid.lon))
+        elif navIndex is None:
+            # Still loading, walk the navaid database instead
+            found = self.ScanNavAids(ident, my_Lat, my_Lon)
+        else:
+            found = navIndex.FindNearest(ident, my_Lat, my_Lon)
+        if cache is not None:
+            if cached is None and found:
+                cache.Put(ident, found)
+            self.log.Debug("ID cache {}: {} hits, {} misses", "hit" if cached is not None else "miss", cache.hits, cache.misses)
+        return found
+
+    def ScanNavAids(self, ident, my_Lat, my_Lon):
+        # Every navaid with this ID, closest first, without the index
+        found = [aid for aid in self.sim.NavAids() if aid.ident == ident]
+        found.sort(key=lambda aid: NavDistance(my_Lat, my_Lon, aid.lat, aid.lon))
+        return found
+
+    @Profiled("suggest")
+    def Suggest(self, text):
+        # Called on every keystroke in the ID field, one line per candidate
+        prefix = text.strip().upper()
+        self.suggestList = []
+        if not prefix or prefix[:1] in ("#", "@") or self.navIndex is None:
+            return []
+        my_Lat, my_Lon = self.GetMyCoords()
+        self.suggestList = self.navIndex.Search(prefix, my_Lat, my_Lon, SUGGEST_COUNT)
+        return ["{} [{}] {:.0f} nm {}".format(aid.ident, NavType[aid.typ], dist, aid.name)
+                for dist, aid in self.suggestList]
+
+    def FindOnRoute(self):
+        route = self.ReadRoute()
+        if not route.legs:
+            return "No FMS route"
+        try:
+            value = float(self.SearchFix[1:])
+        except ValueError:
+            return "{} is not a valid value".format(self.SearchFix)
+        if self.SearchFix[0] == "#":
+            pos = route.Position(int(value))
+            if pos is None:
+                return "FMS[{}] is not in the route".format(int(value))
+            wpt = route.waypoints[pos]
+            self.routeMode, self.routeValue = "#", wpt.index
+            self.destLat, self.destLon, self.destName = wpt.lat, wpt.lon, wpt.ident
+            return "FMS[{}] is {} at {:.1f} nm along route".format(wpt.index, wpt.ident, route.cumul[pos])
+        self.routeMode, self.routeValue = "@", value
+        self.destLat, self.destLon, leg = route.PositionAt(value)
+        self.destName = "{:.0f}nm along route".format(value)
+        return "{:.0f}nm along route is on leg to {} ({:.0f}nm total)".format(value, route.legs[leg].End.ident, route.Length())
+
+    @Profiled("route")
+    def FindAirwayRoute(self, my_Lat, my_Lon):
+        if self.airways is None:
+            return "Airways not loaded"
+        first, sep, last = self.SearchFix.partition(">")
+        first, last = first.strip(), last.strip()
+        if first:
+            start = self.AirwayPoint(first, my_Lat, my_Lon)
+        else:
+            start = self.airways.Attach(my_Lat, my_Lon, "PPOS")
+        if start is None:
+            return "{} is not near any airway".format(first or "Aircraft")
+        end = self.AirwayPoint(last, start[0], start[1]) if last else None
+        if end is None:
+            return "{} is not near any airway".format(last)
+        path = self.airways.Path(start, end)
+        if path is None:
+            return "No airway route from {} to {}".format(start[2], end[2])
+        total, nodes, segments = path
+        graph = self.airways
+        waypoints = [Waypoint(-1, start[2], start[0], start[1])]
+        waypoints.extend(Waypoint(-1, graph.ident[n], graph.lat[n], graph.lon[n]) for n in nodes)
+        waypoints.append(Waypoint(-1, end[2], end[0], end[1]))
+        # No zero length legs where the ends are on the network
+        waypoints = [w for i, w in enumerate(waypoints) if i == 0 or (w.lat, w.lon) != (waypoints[i-1].lat, waypoints[i-1].lon)]
+        self.airwayRoute = Route(Waypoint(i, w.ident, w.lat, w.lon) for i, w in enumerate(waypoints))
+        self.routeMode = "awy"
+        self.destLat, self.destLon, self.destName = end[0], end[1], end[2]
+        description = graph.Describe(start, end, nodes, segments)
+        self.log.Info("Airway route {:.0f}nm: {}", total, description)
+        return "{:.0f}nm {}".format(total, description)
+
+    def AirwayPoint(self, ident, lat, lon):
+        # A fix on an airway, else the closest navaid with this ID joined
+        # to the network
+        point = self.airways.Fix(ident, lat, lon)
+        if point is not None:
+            return point
+        if self.navIndex is not None:
+            found = self.navIndex.FindNearest(ident, lat, lon)
+        else:
+            found = self.ScanNavAids(ident, lat, lon)
+        if not found:
+            return None
+        return self.airways.Attach(found[0].lat, found[0].lon, ident)
+
+    def LoadRouteToFMS(self):
+        # The last airway route, replacing the FMS plan
+        route = self.airwayRoute
+        if route is None:
+            return "No airway route, enter FROM>TO first"
+        sim = self.sim
+        waypoints = route.waypoints[:FMS_ENTRIES]
+        altitude = self.settings.warp_Alt * 100
+        for wpt in waypoints:
+            sim.SetFMSEntry(wpt.index, wpt.ident, wpt.lat, wpt.lon, altitude)
+        for i in range(sim.CountFMSEntries() - 1, len(waypoints) - 1, -1):
+            sim.ClearFMSEntry(i)
+        sim.SetDestinationFMSEntry(min(1, len(waypoints) - 1))
+        if len(waypoints) < len(route.waypoints):
+            return "FMS holds the first {} of {} waypoints".format(len(waypoints), len(route.waypoints))
+        return "Route of {} waypoints loaded into the FMS".format(len(waypoints))
+
+    @Profiled("nearest")
+    def NearestAirport(self):
+        my_Lat, my_Lon = self.GetMyCoords()
+        self.routeMode = None
+        # Skip the airports we would not warp any closer to
+        if self.navIndex is None:
+            nearest = heapq.nsmallest(20, self.sim.NavAids(NAV_AIRPORT),
+                                      key=lambda aid: NavDistance(my_Lat, my_Lon, aid.lat, aid.lon))
+        else:
+            nearest = self.navIndex.Nearest(my_Lat, my_Lon, 20, NAV_AIRPORT)
+        self.findList = [aid for aid in nearest if NavDistance(my_Lat, my_Lon, aid.lat, aid.lon) > self.settings.warp_Dst]
+        self.findPos  = 0
+        if self.findList:
+            return self.ShowFoundAid(my_Lat, my_Lon)
+        self.destLat = 0.0
+        self.destLon = 0.0
+        return "No airport found"
+
+    @Profiled("next")
+    def Next(self, step):
+        if not self.findList:
+            return "No previous search"
+
+        my_Lat, my_Lon = self.GetMyCoords()
+        self.findPos = (self.findPos + step) % len(self.findList)
+        return self.ShowFoundAid(my_Lat, my_Lon)
+
+    def ShowFoundAid(self, my_Lat, my_Lon):
+        aid = self.findList[self.findPos]
+        self.destLat  = aid.lat
+        self.destLon  = aid.lon
+        self.destName = aid.name
+        dist = NavDistance(my_Lat, my_Lon, self.destLat, self.destLon)
+        return "{} [{}] at {:.1f} nm is {} ({} of {})".format(aid.ident, NavType[aid.typ], dist, self.destName,
+                                                            self.findPos + 1, len(self.findList))
+
+    # Warp
+
+    def Warp(self):
+        try:
+            return self.DoWarp()
+        except WarpError as e:
+            return str(e)
+
+    @Profiled("warp")
+    def DoWarp(self):
+        plan = self.PlanWarp()
+        pre = self.WarpState()
+        self.unknown = None
+        if self.settings.warp_Height == "KEEP":
+            return self.ExecuteWarp(pre, plan)
+        # Probe the terrain on the way first, a batch per frame
+        self.terrain.Start(LinePoints(plan.fromLat, plan.fromLon, plan.lat, plan.lon))
+        self.pending = (pre, plan)
+        self.probeActive = True
+        return "Probing terrain at {} of {} points".format(len(self.terrain.queue), len(self.terrain.points))
+
+    def PlanWarp(self):
+        # The whole warp in one pass, nothing written. WarpError when it
+        # can't be done, before any geometry when it's the sim's fault.
+        sim, settings = self.sim, self.settings
+        if self.destLat == 0.0 and self.destLon == 0.0:
+            raise WarpError("Nowhere to warp to")
+
+        if not sim.CanWrite("local_x", "local_y", "local_z"):
+            raise WarpError("Aircraft position is not writable")
+        if settings.warp_Use and not sim.CanWrite("m_fuel", "zulu_time"):
+            raise WarpError("Fuel and time are not writable")
+
+        my_Lat, my_Lon, elevation, grounds, zulu_time = sim.GetMany(("lat", "lon", "elevation", "groundspeed", "zulu_time"))
+        if settings.warp_Use and grounds <= 0:
+            raise WarpError("Groundspeed is zero, cannot plan fuel")
+
+        self.log.Debug("Preparing warp")
+        fmsDest = None
+        if self.routeMode is not None:
+            outLat, outLon, travel, fmsDest = self.PlanRouteWarp(my_Lat, my_Lon)
+        else:
+            outLat, outLon, travel = self.PlanDirectWarp(my_Lat, my_Lon)
+        timeSaved = travel * 1852 / grounds if grounds > 0 else 0.0
+        plan = WarpPlan(my_Lat, my_Lon, outLat, outLon, elevation, travel, grounds, timeSaved, None, 0.0, zulu_time, fmsDest)
+        return self.Refuel(plan)
+
+    def Refuel(self, plan):
+        # plan with the tanks and time from the current ones
+        if not self.settings.warp_Use:
+            return plan
+        fuel = self.PlanFuel(plan.travel, plan.grounds)
+        if fuel is None:
+            raise WarpError("Not enough fuel, you're in trouble...")
+        tanks, time_saved, burnt = fuel
+        return plan._replace(tanks=tuple(tanks), burnt=burnt, zulu=self.sim.Get("zulu_time") + time_saved)
+
+    def ExecuteWarp(self, pre, plan):
+        # Spread the move over several frames so scenery paging keeps up
+        if self.settings.warp_Step > 0:
+            return self.StartSmoothWarp(plan.fromLat, plan.fromLon, plan.lat, plan.lon, plan.elevation,
+                                        plan.travel, plan.grounds, plan.fmsDest, pre)
+
+        # Do it!
+        self.ApplyPlan(plan)
+        self.Record(pre, plan.lat, plan.lon, plan.elevation)
+        return "Warped {}nm using {:.0f}kg{}".format(int(plan.travel*100)/100.0, plan.burnt, self.UnknownText())
+
+    def PlanMany(self, targets):
+        # WarpPlan per (lat, lon, travel, fmsDest) target, from where the
+        # aircraft is now, None where the fuel doesn't last. The fuel of all
+        # of them is worked out in one batch.
+        sim = self.sim
+        my_Lat, my_Lon, elevation, grounds, zulu_time = sim.GetMany(("lat", "lon", "elevation", "groundspeed", "zulu_time"))
+        times = [travel * 1852 / grounds if grounds > 0 else 0.0 for lat, lon, travel, fmsDest in targets]
+        plans = [WarpPlan(my_Lat, my_Lon, lat, lon, elevation, travel, grounds, seconds, None, 0.0, zulu_time, fmsDest)
+                 for (lat, lon, travel, fmsDest), seconds in zip(targets, times)]
+        if not self.settings.warp_Use or not plans:
+            return plans
+        num_tanks, num_engines, weight = sim.GetMany(("num_tanks", "num_engines", "m_total"))
+        tanks = sim.GetArray("m_fuel", num_tanks)
+        flow = sum(sim.GetArray("fuel_flow", num_engines))
+        usages = BurnMany(flow, times, weight)
+        rows = RedistributeMany(tanks, usages, sim.GetArray("tank_rat", num_tanks))
+        return [None if row is None else plan._replace(tanks=tuple(row), burnt=float(usage), zulu=zulu_time + plan.timeSaved)
+                for plan, usage, row in zip(plans, usages, rows)]
+
+    def Reachable(self):
+        # (waypoint, WarpPlan or None) for each FMS waypoint ahead, warped
+        # to in one go along the route, warp_Max aside
+        route = self.ReadRoute()
+        if not route.legs:
+            return []
+        my_Lat, my_Lon = self.GetMyCoords()
+        myPos = route.Position(self.sim.GetDestinationFMSEntry())
+        myAlong = route.AlongTrack(max(0, (myPos or 0) - 1), my_Lat, my_Lon)
+        targets, waypoints = [], []
+        for pos, wpt in enumerate(route.waypoints):
+            targetAlong = route.cumul[pos] - self.settings.warp_Dst
+            if targetAlong > myAlong:
+                lat, lon, leg = route.PositionAt(targetAlong)
+                targets.append((lat, lon, targetAlong - myAlong, wpt.index))
+                waypoints.append(wpt)
+        return list(zip(waypoints, self.PlanMany(targets)))
+
+    def Preview(self):
+        # Lines telling what a warp would do, and how far the fuel goes
+        try:
+            plan = self.PlanWarp()
+        except WarpError as e:
+            return [str(e)]
+        lines = ["Warp {:.1f}nm toward {}, {:.0f}min saved".format(plan.travel, self.destName, plan.timeSaved / 60)]
+        if plan.tanks is None:
+            lines.append("Fuel and time left alone")
+        else:
+            lines.append("Burns {:.0f}kg, {:.0f}kg left, zulu {}".format(plan.burnt, sum(plan.tanks), ZuluText(plan.zulu)))
+            lines.append("Tanks after: {}".format(" ".join("{:.0f}".format(tank) for tank in plan.tanks)))
+            # Farther waypoints burn more, the reachable ones come first
+            reach = self.Reachable()
+            reached = [(wpt, wptPlan) for wpt, wptPlan in reach if wptPlan is not None]
+            if reach and not reached:
+                lines.append("Fuel short of the next FMS waypoint")
+            elif reach and len(reached) == len(reach):
+                lines.append("Fuel reaches all {} FMS waypoints ahead".format(len(reach)))
+            elif reach:
+                wpt, wptPlan = reached[-1]
+                lines.append("Fuel reaches FMS[{}] {}, {:.0f}nm along route".format(wpt.index, wpt.ident, wptPlan.travel))
+        return lines
+
+    def ApplyPlan(self, plan):
+        # Position, tanks and time in one batch
+        # Now doing what is recommened not to do, trying to be at same altitude...
+        wpt_x, wpt_y, wpt_z = self.sim.WorldToLocal(plan.lat, plan.lon, plan.elevation)
+        extra = ()
+        if plan.tanks is not None:
+            extra = (("m_fuel", list(plan.tanks)), ("zulu_time", plan.zulu))
+        self.MoveTo(wpt_x, wpt_y, wpt_z, extra)
+        if plan.fmsDest is not None:
+            self.sim.SetDestinationFMSEntry(plan.fmsDest)
+
+    def MoveTo(self, wpt_x, wpt_y, wpt_z, extra=()):
+        # Writes the aircraft position, and the extra (key, value) pairs in
+        # the same batch. With warp_AI the AI aircraft get the same
+        # displacement, so they keep their place around the aircraft.
+        sim = self.sim
+        pairs = [("local_x", wpt_x), ("local_y", wpt_y), ("local_z", wpt_z)]
+        if self.settings.warp_AI:
+            keys = self.AIKeys()
+            if keys:
+                values = sim.GetMany(("local_x", "local_y", "local_z") + keys)
+                delta = (wpt_x - values[0], wpt_y - values[1], wpt_z - values[2])
+                pairs.extend((key, value + delta[i % 3]) for i, (key, value) in enumerate(zip(keys, values[3:])))
+        pairs.extend(extra)
+        sim.SetMany(pairs)
+
+    def AIKeys(self):
+        # DataRef keys of the AI aircraft, x, y, z for each
+        count = min(AI_PLANES, self.sim.OtherAircraft())
+        if count != self.aiKeys[0]:
+            self.aiKeys = (count, tuple(key for plane in AI_KEYS[:count] for key in plane))
+        return self.aiKeys[1]
+
+    def PlanDirectWarp(self, my_Lat, my_Lon):
+        # Along the geodesic toward the destination, stopping warp_Dst short.
+        # Worked out on the ellipsoid, the local frame is only needed to
+        # write the position.
+        distance, azimuth = Inverse(my_Lat, my_Lon, self.destLat, self.destLon)
+
+        # Warp 5nm from destination or 100nm max (params now)
+        travel = min(self.settings.warp_Max, distance - self.settings.warp_Dst)
+        if travel <= 0:
+            raise WarpError("Too close to destination")
+        self.log.Debug("Distance {}nm, warp {}nm on azimuth {:.1f}", int(distance*100)/100.0, int(travel*100)/100.0, azimuth)
+        outLat, outLon = Direct(my_Lat, my_Lon, azimuth, travel)
+        return outLat, outLon, travel
+
+    def PlanRouteWarp(self, my_Lat, my_Lon):
+        # Along the FMS route, from abeam the aircraft on the active leg
+        if self.routeMode == "awy":
+            return self.PlanAirwayWarp(my_Lat, my_Lon)
+        route = self.ReadRoute()
+        if not route.legs:
+            raise WarpError("No FMS route")
+        myPos = route.Position(self.sim.GetDestinationFMSEntry())
+        myAlong = route.AlongTrack(max(0, (myPos or 0) - 1), my_Lat, my_Lon)
+        if self.routeMode == "#":
+            pos = route.Position(self.routeValue)
+            if pos is None:
+                raise WarpError("FMS[{}] is not in the route".format(self.routeValue))
+            targetAlong = route.cumul[pos] - self.settings.warp_Dst
+        else:
+            targetAlong = self.routeValue
+        travel = min(self.settings.warp_Max, targetAlong - myAlong)
+        if travel <= 0:
+            raise WarpError("Already past that point of the route")
+        outLat, outLon, leg = route.PositionAt(myAlong + travel)
+        self.log.Debug("Route warp from {:.1f}nm to {:.1f}nm along track, leg {}", myAlong, myAlong + travel, leg)
+        return outLat, outLon, travel, route.legs[leg].End.index
+
+    def PlanAirwayWarp(self, my_Lat, my_Lon):
+        # Leg by leg along the airway route: to the next waypoint ahead,
+        # warp_Dst short of the last one
+        route = self.airwayRoute
+        myAlong = route.Locate(my_Lat, my_Lon)
+        # Skip the waypoint the aircraft is at
+        pos = bisect.bisect_right(route.cumul, myAlong + 1.0)
+        if pos >= len(route.cumul) - 1:
+            targetAlong = route.Length() - self.settings.warp_Dst
+        else:
+            targetAlong = route.cumul[pos]
+        travel = min(self.settings.warp_Max, targetAlong - myAlong)
+        if travel <= 0:
+            raise WarpError("Already at the end of the airway route")
+        outLat, outLon, leg = route.PositionAt(myAlong + travel)
+        self.log.Debug("Airway warp from {:.1f}nm to {:.1f}nm along route, leg {}", myAlong, myAlong + travel, leg)
+        return outLat, outLon, travel, None
+
+    def ReadRoute(self):
+        # All FMS entries in one pass
+        waypoints = []
+        for i in range(self.sim.CountFMSEntries()):
+            outType, outID, outLat, outLon = self.sim.GetFMSEntry(i)
+            waypoints.append(Waypoint(i, outID, float(outLat), float(outLon)))
+        return Route(waypoints)
+
+    # Fuel
+
+    @Profiled("fuel")
+    def PlanFuel(self, travel, grounds):
+        # New tank contents and time saved for travel nm, None if not enough fuel
+        travel_meters = travel * 1852
+        time_saved = travel_meters / grounds
+
+        num_tanks, num_engines, weight = self.sim.GetMany(("num_tanks", "num_engines", "m_total"))
+
+        tanks = self.sim.GetArray("m_fuel", num_tanks)
+        ratios = self.sim.GetArray("tank_rat", num_tanks)
+        total_fuel = 0
+        for i in range(num_tanks):
+            total_fuel += tanks[i]
+            self.log.Debug("Tank #{}: {} kg, {} of capacity", i, tanks[i], ratios[i])
+
+        flows = self.sim.GetArray("fuel_flow", num_engines)
+        total_flow = 0
+        for i in range(num_engines):
+            total_flow += flows[i]
+            self.log.Debug("Engine #{}: {} kg/sec", i, flows[i])
+
+        self.log.Debug("Total fuel: {:.2f}kg Total fuel flow: {:.2f} Weight: {:.0f}kg", total_fuel, total_flow, weight)
+        # Flow goes down as the aircraft gets lighter
+        usage = Burn(total_flow, time_saved, weight)
+        self.log.Debug("Fuel to burn for {:.2f}nm in {:.2f}sec : {:.2f}kg", travel, time_saved, usage)
+
+        self.log.Debug("Tanks before: {}", tanks)
+
+        tanks = Redistribute(tanks, usage, ratios)
+        if tanks is None:
+            return None
+        self.log.Debug("Tanks after: {}", tanks)
+        return tanks, time_saved, usage
+
+    def ApplyFuel(self, fuel):
+        # Returns the kg burnt
+        if fuel is None:
+            return 0
+        tanks, time_saved, burnt = fuel
+        # New tanks and time together
+        zulu_time_sec = self.sim.Get("zulu_time")
+        self.sim.SetMany((("m_fuel", list(tanks)), ("zulu_time", zulu_time_sec + time_saved)))
+        return burnt
+
+    # Terrain probing then smooth warp, Step is called once per frame while Busy
+
+    def Busy(self):
+        return self.probeActive or self.smoothActive
+
+    @Profiled("warp_step")
+    def Step(self):
+        # None or a message to show
+        if self.probeActive:
+            if not self.terrain.Step():
+                return None
+            self.probeActive = False
+            (pre, plan), self.pending = self.pending, None
+            samples = self.terrain.Elevations()
+            elevation = self.SafeElevation(plan.elevation, samples)
+            self.unknown = (sum(1 for sample in samples if sample is None), len(samples))
+            try:
+                # Frames went by, fuel and time are planned again
+                return self.ExecuteWarp(pre, self.Refuel(plan._replace(elevation=elevation)))
+            except WarpError as e:
+                return str(e)
+        if self.smoothActive:
+            return self.SmoothStep()
+        return None
+
+    def Cancel(self):
+        if self.probeActive:
+            self.probeActive = False
+            self.pending = None
+            return "Warp cancelled"
+        return self.CancelSmoothWarp()
+
+    def SafeElevation(self, elevation, samples):
+        # Meters: the current or the autopilot altitude, at least
+        # warp_Clearance above the highest terrain sampled on the way
+        if self.settings.warp_Height == "AUTOPILOT":
+            elevation = self.sim.Get("ap_altitude") * 0.3048
+        known = [sample for sample in samples if sample is not None]
+        if len(known) < len(samples):
+            self.log.Info("Terrain unknown at {} of {} points, scenery not loaded there", len(samples) - len(known), len(samples))
+        if known:
+            elevation = max(elevation, max(known) + self.settings.warp_Clearance * 0.3048)
+        self.log.Debug("Warp elevation {:.0f}m, highest terrain {}", elevation, max(known) if known else None)
+        return elevation
+
+    def UnknownText(self):
+        # Added to the warp message, the clearance only holds where the terrain was known
+        if not self.unknown or not self.unknown[0]:
+            return ""
+        return ", terrain unknown at {}/{} points".format(*self.unknown)
+
+    def ProbeEnd(self, outLat, outLon):
+        # Last smooth warp step: the destination has had the whole warp to
+        # page in, probe it again when it was unknown
+        if not self.unknown or not self.unknown[0] or self.terrain.cache.Get(outLat, outLon) is not None:
+            return
+        terrain = self.sim.ProbeTerrain(outLat, outLon)
+        if terrain is None:
+            return
+        self.terrain.cache.Put(outLat, outLon, terrain)
+        self.unknown = (self.unknown[0] - 1, self.unknown[1])
+        self.smoothElev = max(self.smoothElev, terrain + self.settings.warp_Clearance * 0.3048)
+        self.log.Info("Terrain at the destination {:.0f}m, warp elevation {:.0f}m", terrain, self.smoothElev)
+
+
+    def StartSmoothWarp(self, my_Lat, my_Lon, outLat, outLon, elevation, travel, grounds, fmsDest, pre):
+        # Follow the great circle to the warp point, at most warp_StepsMax frames
+        distance = NavDistance(my_Lat, my_Lon, outLat, outLon)
+        self.smoothStart    = (my_Lat, my_Lon)
+        self.smoothEnd      = (outLat, outLon)
+        self.smoothBearing  = Bearing(my_Lat, my_Lon, outLat, outLon)
+        self.smoothDistance = distance
+        self.smoothElev     = elevation
+        self.smoothTravel   = travel
+        self.smoothGrounds  = grounds
+        self.smoothFmsDest  = fmsDest
+        self.smoothPre      = pre
+        self.smoothLast     = (my_Lat, my_Lon)
+        self.smoothSteps    = max(1, min(self.settings.warp_StepsMax, int(math.ceil(distance / self.settings.warp_Step))))
+        self.smoothStep     = 0
+        self.smoothTimes    = []
+        self.smoothActive   = True
+        return "Warping {:.1f}nm in {} steps".format(travel, self.smoothSteps)
+
+    def SmoothStep(self):
+        # None while warping, the final message on the last step
+        start = timer()
+        self.smoothStep += 1
+        if self.smoothStep >= self.smoothSteps:
+            outLat, outLon = self.smoothEnd
+            self.ProbeEnd(outLat, outLon)
+        else:
+            outLat, outLon = Destination(self.smoothStart[0], self.smoothStart[1], self.smoothBearing,
+                                         self.smoothDistance * self.smoothStep / self.smoothSteps)
+        # Convert every frame, X-Plane may shift the local origin while paging scenery
+        wpt_x, wpt_y, wpt_z = self.sim.WorldToLocal(outLat, outLon, self.smoothElev)
+        self.MoveTo(wpt_x, wpt_y, wpt_z)
+        self.smoothLast = (outLat, outLon)
+        self.smoothTimes.append(timer() - start)
+        if self.smoothStep >= self.smoothSteps:
+            return self.EndSmoothWarp(self.smoothTravel)
+        return None
+
+    def CancelSmoothWarp(self):
+        return self.EndSmoothWarp(self.smoothTravel * self.smoothStep / self.smoothSteps)
+
+    def EndSmoothWarp(self, travel):
+        self.smoothActive = False
+        if self.smoothFmsDest is not None and self.smoothStep >= self.smoothSteps:
+            self.sim.SetDestinationFMSEntry(self.smoothFmsDest)
+        # Burn for what was actually flown, a cancelled warp stops short
+        burnt = 0
+        if self.settings.warp_Use and travel > 0:
+            fuel = self.PlanFuel(travel, self.smoothGrounds)
+            if fuel is None:
+                self.log.Warning("Not enough fuel left after smooth warp")
+            else:
+                burnt = self.ApplyFuel(fuel)
+        self.Record(self.smoothPre, self.smoothLast[0], self.smoothLast[1], self.smoothElev)
+        times = [t * 1000 for t in self.smoothTimes]
+        if times:
+            self.log.Info("Smooth warp {}/{} steps, step ms min {:.3f} avg {:.3f} max {:.3f}",
+                          self.smoothStep, self.smoothSteps, min(times), sum(times) / len(times), max(times))
+            if self.log.Enabled(DEBUG):
+                self.log.Debug("Smooth warp step ms: {}", " ".join("{:.3f}".format(t) for t in times))
+        return "Warped {}nm using {:.0f}kg{}".format(int(travel*100)/100.0, burnt, self.UnknownText())
+
+    # History
+
+    def WarpState(self):
+        # (lat, lon, elevation, zulu time, tanks, FMS destination)
+        sim = self.sim
+        lat, lon, elevation, zulu_time, num_tanks = sim.GetMany(("lat", "lon", "elevation", "zulu_time", "num_tanks"))
+        return lat, lon, elevation, zulu_time, sim.GetArray("m_fuel", num_tanks), sim.GetDestinationFMSEntry()
+
+    def Record(self, pre, outLat, outLon, elevation):
+        # Position DataRefs only follow local_* on the next frame, take
+        # the target instead; tanks and time are already written
+        self.lastWarp = (outLat, outLon, elevation)
+        if self.journal is None:
+            return
+        post = self.WarpState()
+        self.journal.Append(WarpEntry(time.time(), pre[0], pre[1], pre[2], outLat, outLon, elevation,
+                                      pre[3], post[3], pre[5], pre[4], post[4]))
+
+    @Profiled("undo")
+    def Undo(self):
+        # Back to where the last warp started, with its fuel and time
+        sim = self.sim
+        if self.Busy():
+            return "Warp in progress"
+        if self.journal is None or not len(self.journal):
+            return "No warp to undo"
+        if not sim.CanWrite("local_x", "local_y", "local_z"):
+            return "Aircraft position is not writable"
+        entry = self.journal.Pop()
+        wpt_x, wpt_y, wpt_z = sim.WorldToLocal(entry.preLat, entry.preLon, entry.preElev)
+        # Only put back what the warp changed, not what was burnt flying since
+        extra = ()
+        if entry.preZulu != entry.postZulu and sim.CanWrite("m_fuel", "zulu_time"):
+            extra = (("m_fuel", list(entry.preTanks)), ("zulu_time", entry.preZulu))
+        self.MoveTo(wpt_x, wpt_y, wpt_z, extra)
+        if 0 <= entry.preFms < sim.CountFMSEntries():
+            sim.SetDestinationFMSEntry(entry.preFms)
+        travel = NavDistance(entry.preLat, entry.preLon, entry.postLat, entry.postLon)
+        self.log.Info("Undid warp of {:.1f}nm from {:.4f} {:.4f}", travel, entry.preLat, entry.preLon)
+        return "Undid warp of {:.1f}nm ({} more to undo)".format(travel, len(self.journal))
@@ -0,0 +1,184 @@
+# Simple Warp - in-memory simulator stand-in
+# See PI_Simple_Warp.py for license.
+#
+# Implements the WarpEngine adapter interface without X-Plane: DataRefs
+# are a dictionary, the local frame is SimpleWarp.Projection.LocalFrame
+# around lat_ref/lon_ref, and the navaid database is synthetic with a
+# configurable size.
+
+import math, random
+
+from SimpleWarp.Engine import AI_PLANES
+from SimpleWarp.NavData import (NAV_AIRPORT, NAV_NDB, NAV_VOR, NAV_ILS, NAV_FIX, NAV_DME,
+                                NavAid, NavTable)
+from SimpleWarp.Projection import LocalFrame
+
+# Rough share of each type in a real navdata cycle
+SYNTHETIC_TYPES = [NAV_FIX] * 12 + [NAV_AIRPORT] * 4 + [NAV_VOR, NAV_NDB, NAV_ILS, NAV_DME]
+
+def SyntheticIdent(number, letters=3):
+    ident = ""
+    for i in range(letters):
+        number, digit = divmod(number, 26)
+        ident = chr(ord("A") + digit) + ident
+    return ident
+
+def SyntheticNavAids(count, seed=1):
+    # About 8 navaids share each ident, like the short VOR/NDB idents do
+    rnd = random.Random(seed)
+    idents = max(1, count // 8)
+    letters = 3 if idents <= 26 ** 3 else 5
+    for i in range(count):
+        typ = rnd.choice(SYNTHETIC_TYPES)
+        # Spread over the whole letter range, not only the first letters
+        ident = SyntheticIdent(rnd.randrange(idents) * 7919 % 26 ** letters, letters)
+        yield NavAid(typ, rnd.uniform(-60, 70), rnd.uniform(-180, 180), ident + " SYNTHETIC",
+                     0.0, 11000 if typ == NAV_VOR else 0, ident, "ZZ")
+
+def SyntheticAirways(spacing=0.7, seed=1, south=-60, north=70):
+    # A jittered grid of fixes, each linked east and north most of the time
+    # and diagonally sometimes. 1100 records and the fixes they need.
+    rnd = random.Random(seed)
+    rows, cols = int((north - south) / spacing), int(360 / spacing)
+    fixes = []
+    for r in range(rows):
+        for c in range(cols):
+            fixes.append(NavAid(NAV_FIX, south + (r + rnd.uniform(0.1, 0.9)) * spacing,
+                                -180 + (c + rnd.uniform(0.1, 0.9)) * spacing,
+                                "", 0.0, 0, SyntheticIdent(r * cols + c, 5), "ZZ"))
+    lines = []
+    for r in range(rows):
+        for c in range(cols):
+            for dr, dc, chance in ((0, 1, 0.8), (1, 0, 0.8), (1, 1, 0.2)):
+                if r + dr < rows and rnd.random() < chance:
+                    a, b = fixes[r * cols + c], fixes[(r + dr) * cols + (c + dc) % cols]
+                    name = "{}{}".format("J" if dr == 0 else "V", (r if dr == 0 else c) % 999 + 1)
+                    lines.append("{} ZZ 11 {} ZZ 11 {} 2 180 450 {}".format(
+                        a.ident, b.ident, "F" if rnd.random() < 0.05 else "N", name))
+    return fixes, lines
+
+class FakeSim:
+    def __init__(self, navaids=10000, seed=1, lat=50.0, lon=8.0):
+        # Navaids are kept sorted by type, like the XPLM database
+        self.navaids = sorted(SyntheticNavAids(navaids, seed), key=lambda aid: aid.typ)
+        self.frame = LocalFrame()
+        self.values = {
+            "lat":         lat,
+            "lon":         lon,
+            "local_x":     0.0,
+            "local_y":     10000.0,
+            "local_z":     0.0,
+            "elevation":   10000.0,
+            "ias":         130.0,
+            "groundspeed": 230.0,
+            "ap_altitude": 33000.0,
+            "gauge_alt":   33000.0,
+            "num_tanks":   3,
+            "num_engines": 2,
+            "tank_rat":    [0.25, 0.5, 0.25],
+            "m_fuel":      [4000.0, 8000.0, 4000.0],
+            "m_total":     60000.0,
+            "fuel_flow":   [0.6, 0.6],
+            "zulu_time":   36000.0,
+            "paused":      0,
+            "lat_ref":     lat,
+            "lon_ref":     lon}
+        # AI aircraft in line abreast 500m apart, the first self.aircraft of them active
+        for n in range(1, AI_PLANES + 1):
+            self.values.update({"plane{}_x".format(n): 500.0 * n, "plane{}_y".format(n): 10000.0,
+                                "plane{}_z".format(n): 0.0})
+        self.aircraft = 0
+        self.readOnly = set()
+        self.fms = []
+        self.fmsDest = 0
+        self.probes = 0
+
+    # DataRefs
+
+    def Get(self, key):
+        return self.values[key]
+
+    def GetMany(self, keys):
+        return [self.values[key] for key in keys]
+
+    def GetArray(self, key, count, offset = 0):
+        return list(self.values[key][offset:offset + count])
+
+    def CanWrite(self, *keys):
+        return not any(key in self.readOnly for key in keys)
+
+    def Set(self, key, value):
+        self.SetMany(((key, value),))
+
+    def SetMany(self, pairs):
+        moved = False
+        for key, value in pairs:
+            self.values[key] = value
+            moved = moved or key in ("local_x", "local_y", "local_z")
+        if moved:
+            lat, lon, alt = self.LocalToWorld(self.values["local_x"], self.values["local_y"], self.values["local_z"])
+            self.values.update(lat=lat, lon=lon, elevation=alt)
+
+    def SetArray(self, key, values, offset = 0):
+        self.values[key][offset:offset + len(values)] = list(values)
+
+    # Local frame: x east, y up, z south, in meters from lat_ref/lon_ref
+
+    def WorldToLocal(self, lat, lon, alt):
+        self.frame.SetOrigin(self.values["lat_ref"], self.values["lon_ref"])
+        return self.frame.ToLocal(lat, lon, alt)
+
+    def LocalToWorld(self, x, y, z):
+        self.frame.SetOrigin(self.values["lat_ref"], self.values["lon_ref"])
+        return self.frame.ToWorld(x, y, z)
+
+    def ShiftOrigin(self, lat, lon):
+        # What X-Plane does as the aircraft flies away from the reference point
+        lat0, lon0, alt = self.LocalToWorld(self.values["local_x"], self.values["local_y"], self.values["local_z"])
+        self.values.update(lat_ref=lat, lon_ref=lon)
+        x, y, z = self.WorldToLocal(lat0, lon0, alt)
+        self.values.update(local_x=x, local_y=y, local_z=z)
+
+    # Navigation
+
+    def NavAids(self, typ = None):
+        for aid in self.navaids:
+            if typ is None or aid.typ == typ:
+                yield aid
+
+    def ProbeTerrain(self, lat, lon):
+        # Hills up to 3000m, only around the aircraft where scenery is loaded
+        self.probes += 1
+        if abs(lat - self.values["lat"]) > 2 or abs(lon - self.values["lon"]) > 3:
+            return None
+        return max(0.0, 1500.0 + 1500.0 * math.sin(math.radians(lat) * 300) * math.cos(math.radians(lon) * 200))
+
+    def NavTable(self):
+        table = NavTable()
+        table.Extend(self.navaids)
+        return table
+
+    def CountFMSEntries(self):
+        return len(self.fms)
+
+    def GetFMSEntry(self, index):
+        return self.fms[index]
+
+    def GetDestinationFMSEntry(self):
+        return self.fmsDest
+
+    def SetDestinationFMSEntry(self, index):
+        self.fmsDest = index
+
+    def SetFMSEntry(self, index, ident, lat, lon, altitude):
+        entry = (NAV_FIX, ident, lat, lon)
+        if index < len(self.fms):
+            self.fms[index] = entry
+        else:
+            self.fms.append(entry)
+
+    def ClearFMSEntry(self, index):
+        del self.fms[index]
+
+    def OtherAircraft(self):
+        return self.aircraft
@@ -0,0 +1,101 @@
+# Simple Warp - ID cache
+# See PI_Simple_Warp.py for license.
+#
+# The navaids found for the last FIND_CACHE_SIZE IDs, least recently used
+# dropped first, kept across sessions in Simple_Warp.ids. Find looks here
+# before the navaid index or the database walk, so the IDs warped to
+# again and again are found even before the index is built. The file
+# belongs to one AIRAC cycle, another cycle starts it over.
+#
+# Text file, a header line then one tab separated navaid per line:
+#   cycle <AIRAC cycle>
+#   ident typ lat lon height freq region name
+
+from collections import OrderedDict
+from timeit import default_timer as timer
+import os
+
+from SimpleWarp.NavData import NavAid
+
+FIND_CACHE_SIZE = 500
+
+class FindCache:
+    def __init__(self, path, log, size=FIND_CACHE_SIZE):
+        self.path    = path
+        self.log     = log
+        self.size    = size
+        self.entries = OrderedDict()   # ident -> [NavAid], most recent last
+        self.cycle   = None
+        self.dirty   = False
+        self.hits    = 0
+        self.misses  = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def Get(self, ident):
+        # The navaids with this ID, None when not cached
+        aids = self.entries.pop(ident, None)
+        if aids is None:
+            self.misses += 1
+            return None
+        self.entries[ident] = aids
+        self.hits += 1
+        return aids
+
+    def Put(self, ident, aids):
+        self.entries.pop(ident, None)
+        self.entries[ident] = list(aids)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def Load(self, cycle):
+        # Only kept for the cycle it was built with, without a cycle nothing
+        # is read or written
+        self.cycle = cycle
+        self.entries.clear()
+        if not cycle:
+            return
+        start = timer()
+        try:
+            with open(self.path, "rU" if str is bytes else "r") as fh:
+                lines = fh.read().splitlines()
+        except (IOError, OSError):
+            return
+        if not lines or lines[0] != "cycle {}".format(cycle):
+            self.log.Info("ID cache {} is for another AIRAC cycle, starting over", self.path)
+            self.dirty = True
+            return
+        for line in lines[1:]:
+            fields = line.split("\t")
+            try:
+                aid = NavAid(int(fields[1]), float(fields[2]), float(fields[3]), fields[7],
+                             float(fields[4]), int(fields[5]), fields[0], fields[6])
+            except (IndexError, ValueError):
+                continue
+            if aid.ident in self.entries:
+                self.entries[aid.ident].append(aid)
+            else:
+                self.entries[aid.ident] = [aid]
+        self.log.Info("ID cache: {} IDs in {:.1f}ms", len(self.entries), (timer() - start) * 1000)
+
+    def Save(self):
+        if not self.dirty or not self.cycle:
+            return
+        lines = ["cycle {}".format(self.cycle)]
+        for ident, aids in self.entries.items():
+            lines.extend("\t".join((aid.ident, str(aid.typ), repr(aid.lat), repr(aid.lon), repr(float(aid.height)),
+                                    str(aid.freq), aid.region, aid.name)) for aid in aids)
+        tmpPath = self.path + ".tmp"
+        try:
+            with open(tmpPath, "w") as fh:
+                fh.write("\n".join(lines) + "\n")
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmpPath, self.path)
+        except (IOError, OSError) as e:
+            self.log.Warning("Failed to write ID cache {}: {}", self.path, e)
+            return
+        self.dirty = False
+        self.log.Info("ID cache: {} IDs saved, {} hits, {} misses this session", len(self.entries), self.hits, self.misses)
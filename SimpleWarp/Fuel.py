@@ -0,0 +1,178 @@
+# Simple Warp - fuel burn and tank redistribution
+# See PI_Simple_Warp.py for license.
+#
+# Tanks are drained in groups, from the center to the outside: the center
+# tank alone when there's an odd number of them, then the tanks 2 by 2.
+# Inside a group the fullest tanks are drained first, down to a common
+# level, measured against each tank's share of the capacity
+# (acf_tank_rat), so asymmetric tanks stay balanced. With equal
+# capacities this is what DrainTanks does.
+#
+# Burn integrates fuel flow over the skipped time, the flow going down
+# with the aircraft weight. The Many versions take a sequence of usages
+# or times and use NumPy when the embedded interpreter has it, plain
+# Python loops otherwise.
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def DrainTanks(tanks, usage):
+    # Take usage kg, from the central tank if there's such, then from the
+    # center to the outside 2 by 2, evening each pair. Returns new tanks.
+    tanks = list(tanks)
+    num_tanks = len(tanks)
+    center = 0
+    if num_tanks % 2:
+        center = (num_tanks - 1) // 2
+        if tanks[center] > usage:
+            tanks[center] -= usage
+            usage = 0.0
+        else:
+            usage -= tanks[center]
+            tanks[center] = 0.0
+        tl, tr = center - 1, center + 1
+    else:
+        tr = num_tanks // 2
+        tl = tr -1
+    while usage > 0.0 and tl >= 0:
+        # not enough in those tanks, empty them
+        if (tanks[tl] + tanks[tr]) < usage:
+            usage -= (tanks[tl] + tanks[tr])
+            tanks[tl], tanks[tr] = 0.0, 0.0
+            tl -= 1
+            tr += 1
+            continue
+        # enough excess in left tank, take all from there
+        if tanks[tl] - tanks[tr] > usage:
+            tanks[tl] -= usage
+            break
+        # enough excess in right tank, take all from there
+        if tanks[tr] - tanks[tl] > usage:
+            tanks[tr] -= usage
+            break
+        # enough in tanks combined, even the tanks
+        delta = tanks[tl] - tanks[tr]
+        tanks[tl] -= (usage + delta) / 2
+        tanks[tr] -= (usage - delta) / 2
+        break
+    return tanks
+
+def TankGroups(num_tanks):
+    # Tank indexes in drain order, center first
+    if num_tanks % 2:
+        center = (num_tanks - 1) // 2
+        groups = [[center]]
+        tl, tr = center - 1, center + 1
+    else:
+        groups = []
+        tr = num_tanks // 2
+        tl = tr - 1
+    while tl >= 0:
+        groups.append([tl, tr])
+        tl -= 1
+        tr += 1
+    return groups
+
+def Capacities(tanks, ratios):
+    # Tank shares, equal when acf_tank_rat is missing or unusable
+    if not ratios or len(ratios) < len(tanks) or any(r <= 0 for r in ratios[:len(tanks)]):
+        return [1.0] * len(tanks)
+    return [float(r) for r in ratios[:len(tanks)]]
+
+def Steps(amounts, caps):
+    # Breakpoints of draining one group, for RedistributeMany: (taken,
+    # amounts, capacities) once the fullest tanks are brought down to the
+    # share of the next one, the sums being over the tanks drained so far
+    order = sorted(range(len(amounts)), key=lambda i: amounts[i] / caps[i], reverse=True)
+    steps = []
+    amtSum = capSum = 0.0
+    for j, i in enumerate(order):
+        amtSum += amounts[i]
+        capSum += caps[i]
+        level = amounts[order[j + 1]] / caps[order[j + 1]] if j + 1 < len(order) else 0.0
+        steps.append((amtSum - level * capSum, amtSum, capSum))
+    return steps
+
+def Redistribute(tanks, usage, ratios=None):
+    # Take usage kg, group by group from the center. Returns new tanks,
+    # None if there is not that much fuel.
+    tanks = [float(t) for t in tanks]
+    if usage > sum(tanks):
+        return None
+    caps = Capacities(tanks, ratios)
+    for group in TankGroups(len(tanks)):
+        if usage <= 0.0:
+            break
+        if len(group) == 1:
+            i = group[0]
+            taken = min(tanks[i], usage)
+            tanks[i] -= taken
+            usage -= taken
+            continue
+        tl, tr = group
+        if tanks[tl] + tanks[tr] <= usage:
+            usage -= tanks[tl] + tanks[tr]
+            tanks[tl], tanks[tr] = 0.0, 0.0
+            continue
+        # Drain the fuller one (as a share of its capacity) down to the
+        # other, then both together
+        if tanks[tl] * caps[tr] < tanks[tr] * caps[tl]:
+            tl, tr = tr, tl
+        excess = tanks[tl] - tanks[tr] * caps[tl] / caps[tr]
+        if excess >= usage:
+            tanks[tl] -= usage
+        else:
+            level = (tanks[tl] + tanks[tr] - usage) / (caps[tl] + caps[tr])
+            tanks[tl], tanks[tr] = level * caps[tl], level * caps[tr]
+        usage = 0.0
+    return tanks
+
+def RedistributeMany(tanks, usages, ratios=None):
+    # One row of tanks per usage, all from the same starting tanks. Rows
+    # asking for more than there is come back as None.
+    if numpy is None:
+        return [Redistribute(tanks, usage, ratios) for usage in usages]
+    tanks  = [float(t) for t in tanks]
+    caps   = Capacities(tanks, ratios)
+    usages = numpy.asarray(usages, dtype=float)
+    rows   = numpy.tile(numpy.asarray(tanks), (len(usages), 1))
+    before = 0.0
+    for group in TankGroups(len(tanks)):
+        have = sum(tanks[i] for i in group)
+        # What each row takes from this group
+        take = numpy.clip(usages - before, 0.0, have)
+        before += have
+        amounts = [tanks[i] for i in group]
+        gcaps   = [caps[i] for i in group]
+        steps   = Steps(amounts, gcaps)
+        # The first breakpoint taking enough, the last one is the empty group
+        step = numpy.searchsorted(numpy.array([s[0] for s in steps]), take)
+        step = numpy.minimum(step, len(steps) - 1)
+        amtSum = numpy.array([s[1] for s in steps])[step]
+        capSum = numpy.array([s[2] for s in steps])[step]
+        level  = numpy.maximum(0.0, (amtSum - take) / capSum)
+        for j, i in enumerate(group):
+            # Tanks drained at a step take the common level, others keep their fuel
+            rows[:, i] = numpy.minimum(amounts[j], level * gcaps[j])
+    total = sum(tanks)
+    return [None if usage > total else list(row) for usage, row in zip(usages, rows)]
+
+def Burn(flow, seconds, weight=None):
+    # kg burnt in seconds, from flow kg/sec at the current weight kg.
+    # Flow scales with weight, dW/dt = -flow * W / weight, so the weight
+    # decays exponentially. Without a weight the flow stays constant.
+    if not weight or weight <= 0:
+        return flow * seconds
+    return weight * (1.0 - math.exp(-flow * seconds / weight))
+
+def BurnMany(flow, times, weight=None):
+    if numpy is None:
+        return [Burn(flow, seconds, weight) for seconds in times]
+    times = numpy.asarray(times, dtype=float)
+    if not weight or weight <= 0:
+        return flow * times
+    return weight * -numpy.expm1(-flow * times / weight)
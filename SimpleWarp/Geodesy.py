@@ -0,0 +1,106 @@
+# Simple Warp - great circle math
+# See PI_Simple_Warp.py for license.
+#
+# Scalar functions take and return degrees and nm. The batched versions
+# take one reference point and sequences of coordinates, and use NumPy
+# when the embedded interpreter has it, plain Python loops otherwise.
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#RADIUS = 6371 # km
+RADIUS = 3440.07 # nm
+
+def NavDistance(degLat1, degLon1, degLat2, degLon2):
+    radLat1  = math.radians(degLat1)
+    radLat2  = math.radians(degLat2)
+    deltaLat = math.radians(degLat2-degLat1)
+    deltaLon = math.radians(degLon2-degLon1)
+
+    sLat = math.sin(deltaLat/2)
+    sLon = math.sin(deltaLon/2)
+    a = sLat*sLat + math.cos(radLat1) * math.cos(radLat2) * sLon*sLon
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return RADIUS * c
+
+def Bearing(degLat1, degLon1, degLat2, degLon2):
+    # Initial true course from point 1 to point 2, 0-360
+    radLat1  = math.radians(degLat1)
+    radLat2  = math.radians(degLat2)
+    deltaLon = math.radians(degLon2-degLon1)
+    y = math.sin(deltaLon) * math.cos(radLat2)
+    x = math.cos(radLat1) * math.sin(radLat2) - math.sin(radLat1) * math.cos(radLat2) * math.cos(deltaLon)
+    return math.degrees(math.atan2(y, x)) % 360
+
+def Destination(degLat, degLon, bearing, distance):
+    # Point reached after distance nm on initial course bearing
+    radLat = math.radians(degLat)
+    radBrg = math.radians(bearing)
+    delta  = distance / RADIUS
+    sinLat = math.sin(radLat) * math.cos(delta) + math.cos(radLat) * math.sin(delta) * math.cos(radBrg)
+    radLat2 = math.asin(max(-1.0, min(1.0, sinLat)))
+    radLon2 = math.radians(degLon) + math.atan2(math.sin(radBrg) * math.sin(delta) * math.cos(radLat),
+                                                math.cos(delta) - math.sin(radLat) * sinLat)
+    return math.degrees(radLat2), (math.degrees(radLon2) + 540) % 360 - 180
+
+def CrossTrack(degLat1, degLon1, degLat2, degLon2, degLat, degLon):
+    # Distance off the great circle 1->2, positive right of course
+    delta13 = NavDistance(degLat1, degLon1, degLat, degLon) / RADIUS
+    theta13 = math.radians(Bearing(degLat1, degLon1, degLat, degLon))
+    theta12 = math.radians(Bearing(degLat1, degLon1, degLat2, degLon2))
+    return math.asin(max(-1.0, min(1.0, math.sin(delta13) * math.sin(theta13 - theta12)))) * RADIUS
+
+def AlongTrack(degLat1, degLon1, degLat2, degLon2, degLat, degLon):
+    # Distance from point 1 to the abeam point on the great circle 1->2
+    delta13 = NavDistance(degLat1, degLon1, degLat, degLon) / RADIUS
+    theta13 = math.radians(Bearing(degLat1, degLon1, degLat, degLon))
+    theta12 = math.radians(Bearing(degLat1, degLon1, degLat2, degLon2))
+    deltaXt = math.asin(max(-1.0, min(1.0, math.sin(delta13) * math.sin(theta13 - theta12))))
+    along = math.acos(max(-1.0, min(1.0, math.cos(delta13) / math.cos(deltaXt)))) * RADIUS
+    return along if math.cos(theta13 - theta12) >= 0 else -along
+
+def Distances(degLat, degLon, lats, lons):
+    if numpy is None:
+        return [NavDistance(degLat, degLon, lat, lon) for lat, lon in zip(lats, lons)]
+    radLat1 = math.radians(degLat)
+    radLat2 = numpy.radians(numpy.asarray(lats, dtype=float))
+    sLat = numpy.sin((radLat2 - radLat1) / 2)
+    sLon = numpy.sin(numpy.radians(numpy.asarray(lons, dtype=float) - degLon) / 2)
+    a = sLat*sLat + math.cos(radLat1) * numpy.cos(radLat2) * sLon*sLon
+    return RADIUS * 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1-a))
+
+def Bearings(degLat, degLon, lats, lons):
+    if numpy is None:
+        return [Bearing(degLat, degLon, lat, lon) for lat, lon in zip(lats, lons)]
+    radLat1  = math.radians(degLat)
+    radLat2  = numpy.radians(numpy.asarray(lats, dtype=float))
+    deltaLon = numpy.radians(numpy.asarray(lons, dtype=float) - degLon)
+    y = numpy.sin(deltaLon) * numpy.cos(radLat2)
+    x = math.cos(radLat1) * numpy.sin(radLat2) - math.sin(radLat1) * numpy.cos(radLat2) * numpy.cos(deltaLon)
+    return numpy.degrees(numpy.arctan2(y, x)) % 360
+
+def Destinations(degLat, degLon, bearings, distances):
+    # Returns (lats, lons)
+    if numpy is None:
+        points = [Destination(degLat, degLon, brg, dist) for brg, dist in zip(bearings, distances)]
+        return [p[0] for p in points], [p[1] for p in points]
+    radLat = math.radians(degLat)
+    radBrg = numpy.radians(numpy.asarray(bearings, dtype=float))
+    delta  = numpy.asarray(distances, dtype=float) / RADIUS
+    sinLat = math.sin(radLat) * numpy.cos(delta) + math.cos(radLat) * numpy.sin(delta) * numpy.cos(radBrg)
+    radLat2 = numpy.arcsin(numpy.clip(sinLat, -1.0, 1.0))
+    radLon2 = math.radians(degLon) + numpy.arctan2(numpy.sin(radBrg) * numpy.sin(delta) * math.cos(radLat),
+                                                   numpy.cos(delta) - math.sin(radLat) * sinLat)
+    return numpy.degrees(radLat2), (numpy.degrees(radLon2) + 540) % 360 - 180
+
+def CrossTracks(degLat1, degLon1, degLat2, degLon2, lats, lons):
+    if numpy is None:
+        return [CrossTrack(degLat1, degLon1, degLat2, degLon2, lat, lon) for lat, lon in zip(lats, lons)]
+    delta13 = Distances(degLat1, degLon1, lats, lons) / RADIUS
+    theta13 = numpy.radians(Bearings(degLat1, degLon1, lats, lons))
+    theta12 = math.radians(Bearing(degLat1, degLon1, degLat2, degLon2))
+    return numpy.arcsin(numpy.clip(numpy.sin(delta13) * numpy.sin(theta13 - theta12), -1.0, 1.0)) * RADIUS
@@ -0,0 +1,94 @@
+# Simple Warp - warp history
+# See PI_Simple_Warp.py for license.
+#
+# Every warp is recorded in a memory-mapped ring of fixed-size records:
+# position, tanks and zulu time before and after. Appending packs one
+# record in place and updates the header, whatever the history length.
+# Once the ring is full the oldest warp is overwritten, so the file never
+# grows past capacity records. Pop removes the newest warp, for undo.
+
+from collections import namedtuple
+import mmap, os, struct, time
+
+JOURNAL_MAGIC   = b"SWJR"
+JOURNAL_VERSION = 1
+MAX_TANKS       = 9   # acf_num_tanks is at most 9
+
+# magic, version, capacity, next slot, count
+JOURNAL_HEADER = struct.Struct("<4sIIII")
+# stamp, pre lat lon elev, post lat lon elev, pre post zulu, pre FMS dest,
+# tanks, pre tanks, post tanks
+JOURNAL_RECORD = struct.Struct("<d3d3d2dii{0}f{0}f".format(MAX_TANKS))
+
+WarpEntry = namedtuple('WarpEntry', ['stamp', 'preLat', 'preLon', 'preElev', 'postLat', 'postLon', 'postElev',
+                                     'preZulu', 'postZulu', 'preFms', 'preTanks', 'postTanks'])
+
+class WarpJournal:
+    def __init__(self, path, capacity=1000):
+        self.path     = path
+        self.capacity = capacity
+        self.file     = None
+        self.map      = None
+        self.next     = 0
+        self.count    = 0
+
+    def Open(self):
+        # A journal of another version or capacity is started over
+        size = JOURNAL_HEADER.size + self.capacity * JOURNAL_RECORD.size
+        self.file = open(self.path, "r+b" if os.path.exists(self.path) else "w+b")
+        fresh = os.path.getsize(self.path) != size
+        if fresh:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        magic, version, capacity, self.next, self.count = JOURNAL_HEADER.unpack_from(self.map, 0)
+        if fresh or magic != JOURNAL_MAGIC or version != JOURNAL_VERSION or capacity != self.capacity \
+                or self.next >= capacity or self.count > capacity:
+            self.next = self.count = 0
+            self.WriteHeader()
+
+    def Close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __len__(self):
+        return self.count
+
+    def WriteHeader(self):
+        JOURNAL_HEADER.pack_into(self.map, 0, JOURNAL_MAGIC, JOURNAL_VERSION, self.capacity, self.next, self.count)
+
+    def Offset(self, slot):
+        return JOURNAL_HEADER.size + slot * JOURNAL_RECORD.size
+
+    def Append(self, entry):
+        preTanks  = (list(entry.preTanks)  + [0.0] * MAX_TANKS)[:MAX_TANKS]
+        postTanks = (list(entry.postTanks) + [0.0] * MAX_TANKS)[:MAX_TANKS]
+        JOURNAL_RECORD.pack_into(self.map, self.Offset(self.next), entry.stamp or time.time(),
+                                 entry.preLat, entry.preLon, entry.preElev,
+                                 entry.postLat, entry.postLon, entry.postElev,
+                                 entry.preZulu, entry.postZulu, entry.preFms,
+                                 min(len(entry.preTanks), MAX_TANKS), *(preTanks + postTanks))
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.WriteHeader()
+
+    def Last(self):
+        # Newest warp, None when the journal is empty
+        if not self.count:
+            return None
+        fields = JOURNAL_RECORD.unpack_from(self.map, self.Offset((self.next - 1) % self.capacity))
+        tanks = fields[10]
+        return WarpEntry(*(fields[:10] + (list(fields[11:11 + tanks]),
+                                          list(fields[11 + MAX_TANKS:11 + MAX_TANKS + tanks]))))
+
+    def Pop(self):
+        entry = self.Last()
+        if entry is not None:
+            self.next = (self.next - 1) % self.capacity
+            self.count -= 1
+            self.WriteHeader()
+        return entry
@@ -0,0 +1,118 @@
+# Simple Warp - background navaid index build
+# See PI_Simple_Warp.py for license.
+#
+# The cache, the navdata files and the NavIndex are handled by a worker
+# thread. The XPLM navaid database may only be read from the sim thread,
+# so when the worker needs it, a flight loop calls Feed once per frame and
+# each call reads navaids for at most feedBudget seconds. The finished
+# index is published with a single assignment to engine.navIndex; until
+# then the engine falls back to walking the navaid database.
+
+from timeit import default_timer as timer
+import threading
+
+from SimpleWarp.NavIndex import NavIndex
+
+# Navaids read between two checks of the frame budget
+FEED_CHUNK = 50
+
+class NavIndexLoader:
+    def __init__(self, engine, xplaneRoot, fileNac, feedBudget=0.002):
+        self.engine     = engine
+        self.log        = engine.log
+        self.xplaneRoot = xplaneRoot
+        self.fileNac    = fileNac
+        self.feedBudget = feedBudget
+        self.state      = "idle"
+        self.done       = False
+        self.cancelled  = False
+        # Set by the worker when it needs navaids of feedType from the sim
+        self.feedWanted = False
+        self.feedType   = None
+        self.feedIter   = None
+        self.fed        = []
+        self.feedDone   = threading.Event()
+        self.feedTime   = 0.0
+        self.feedFrames = 0
+        self.thread     = None
+
+    def Start(self):
+        self.start = timer()
+        self.state = "reading cache"
+        self.thread = threading.Thread(target=self.Run, name="Simple Warp navaid index")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Cancel(self):
+        # Releases a worker waiting for navaids that will never be fed
+        self.cancelled = True
+        self.feedDone.set()
+
+    def Progress(self):
+        if self.state == "reading navaid database":
+            return "Navaid index: reading navaid database, {} entries".format(len(self.fed))
+        return "Navaid index: {}".format(self.state)
+
+    # Worker thread
+
+    def Run(self):
+        engine = self.engine
+        try:
+            table, cycle = engine.LoadNavCache(self.xplaneRoot, self.fileNac)
+            source = "cache"
+            if table is None:
+                self.state = "reading navdata files"
+                table, simType, source = engine.ReadNavFiles(self.xplaneRoot)
+                self.state = "reading navaid database"
+                self.feedType, self.feedWanted = simType, True
+                self.feedDone.wait()
+                if self.cancelled:
+                    return
+                table.Extend(self.fed)
+                self.fed = []
+                self.state = "writing cache"
+                engine.SaveNavCache(table, self.fileNac, cycle)
+            self.state = "indexing"
+            navIndex = NavIndex(table)
+            if self.cancelled:
+                return
+            engine.navIndex = navIndex
+            engine.stats.Add("index", timer() - self.start)
+            self.log.Info("Navaid index built from {} (cycle {}): {} entries in {:.2f}sec, {:.1f}ms on the sim thread in {} frames",
+                          source, cycle, navIndex.count, timer() - self.start, self.feedTime * 1000, self.feedFrames)
+            self.state = "reading airways"
+            engine.LoadAirways(self.xplaneRoot, table)
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.log.Error("Navaid index build failed: {}", e)
+        finally:
+            self.done = True
+
+    # Sim thread
+
+    def Feed(self):
+        # Once per frame from a flight loop, False once nothing is left to feed
+        if not self.feedWanted:
+            return not self.done
+        start = timer()
+        if self.feedIter is None:
+            self.feedIter = self.engine.sim.NavAids(self.feedType)
+        fed, feedIter = self.fed, self.feedIter
+        finished = True
+        try:
+            while timer() - start < self.feedBudget:
+                for i in range(FEED_CHUNK):
+                    fed.append(next(feedIter))
+            finished = False
+        except StopIteration:
+            pass
+        elapsed = timer() - start
+        self.feedTime += elapsed
+        self.engine.stats.Add("index_feed", elapsed)
+        self.feedFrames += 1
+        if finished:
+            self.feedWanted = False
+            self.feedIter = None
+            self.feedDone.set()
+        return True
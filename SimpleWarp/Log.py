@@ -0,0 +1,136 @@
+# Simple Warp - debug log
+# See PI_Simple_Warp.py for license.
+#
+# Callers only format and queue a record; a background thread timestamps,
+# writes and flushes the queue in batches, and rotates the file once it
+# grows past maxBytes. Records below the level are dropped before any
+# formatting, so pass arguments separately: log.Debug("Tank #{}", i).
+
+from __future__ import print_function
+
+from collections import deque
+from datetime import datetime
+import os, threading, time
+
+DEBUG   = 10
+INFO    = 20
+WARNING = 30
+ERROR   = 40
+OFF     = 100
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "OFF": OFF}
+
+class AsyncLog:
+    def __init__(self, name, level=INFO, console=True, maxBytes=1024*1024, backups=3, flushInterval=0.5):
+        self.name     = name
+        self.level    = level
+        self.console  = console
+        self.maxBytes = maxBytes
+        self.backups  = backups
+        self.flushInterval = flushInterval
+        self.path     = None
+        self.file     = None
+        self.queue    = deque()
+        self.wake     = threading.Event()
+        self.thread   = None
+        self.stopping = False
+
+    def Start(self, path=None):
+        # Records queued before Start are written by the first batch
+        if path:
+            try:
+                self.file = open(path, "a")
+                self.path = path
+            except (IOError, OSError):
+                self.console = True
+                self.Error("Failed to open debug log file, forcing debug to console.")
+                self.Error("-> {}", path)
+        self.stopping = False
+        self.thread = threading.Thread(target=self.Run, name=self.name + " log")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Close(self):
+        self.stopping = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(2.0)
+            self.thread = None
+        self.Drain()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def Enabled(self, level):
+        return level >= self.level
+
+    def Log(self, level, msg, *args):
+        if level < self.level:
+            return
+        if args:
+            msg = msg.format(*args)
+        # deque.append is atomic, no lock needed on the sim thread
+        self.queue.append((time.time(), msg))
+
+    def Debug(self, msg, *args):
+        if DEBUG >= self.level:
+            self.Log(DEBUG, msg, *args)
+
+    def Info(self, msg, *args):
+        if INFO >= self.level:
+            self.Log(INFO, msg, *args)
+
+    def Warning(self, msg, *args):
+        self.Log(WARNING, msg, *args)
+
+    def Error(self, msg, *args):
+        self.Log(ERROR, msg, *args)
+
+    def Run(self):
+        while not self.stopping:
+            self.wake.wait(self.flushInterval)
+            self.wake.clear()
+            self.Drain()
+
+    def Drain(self):
+        lines = []
+        while self.queue:
+            stamp, msg = self.queue.popleft()
+            lines.append(str(datetime.fromtimestamp(stamp)) + " " + self.name + ": " + msg)
+        if not lines:
+            return
+        if self.console:
+            print("\n".join(lines))
+        if self.file is not None:
+            text = os.linesep.join(lines) + os.linesep
+            if self.maxBytes and 0 < self.file.tell() and self.file.tell() + len(text) > self.maxBytes:
+                self.Rotate()
+        if self.file is not None:
+            self.file.write(text)
+            self.file.flush()
+
+    def Rotate(self):
+        # Simple_Warp.txt -> Simple_Warp.txt.1 -> ... -> Simple_Warp.txt.<backups>
+        self.file.close()
+        self.file = None
+        try:
+            for i in range(self.backups, 0, -1):
+                src = self.path + ("." + str(i - 1) if i > 1 else "")
+                dst = self.path + "." + str(i)
+                if os.path.exists(src):
+                    if os.path.exists(dst):
+                        os.remove(dst)
+                    os.rename(src, dst)
+            if self.backups < 1:
+                os.remove(self.path)
+        except (IOError, OSError):
+            pass
+        try:
+            self.file = open(self.path, "a")
+        except (IOError, OSError):
+            self.console = True
+
+class NullLog(AsyncLog):
+    # Drops everything, for benchmarks and scripts
+    def __init__(self):
+        AsyncLog.__init__(self, "", level=OFF, console=False)
@@ -0,0 +1,238 @@
+# Simple Warp - navdata files and binary cache
+# See PI_Simple_Warp.py for license.
+#
+# Streams earth_nav.dat / earth_fix.dat / earth_awy.dat line by line and
+# keeps navaids in array-backed columns (NavTable) that can be written to
+# and read back from a compact binary cache keyed on the AIRAC cycle.
+# Nothing here talks to X-Plane, so it runs on any Python with the files.
+
+from collections import namedtuple
+from array import array
+import os, struct
+
+FILE_INF = "cycle_info.txt"
+FILE_AWY = "earth_awy.dat"
+FILE_FIX = "earth_fix.dat"
+FILE_NAV = "earth_nav.dat"
+
+# Same values as the xplm_Nav_* constants of XPLMNavigation
+NAV_UNKNOWN      = 0
+NAV_AIRPORT      = 1
+NAV_NDB          = 2
+NAV_VOR          = 4
+NAV_ILS          = 8
+NAV_LOCALIZER    = 16
+NAV_GLIDESLOPE   = 32
+NAV_OUTERMARKER  = 64
+NAV_MIDDLEMARKER = 128
+NAV_INNERMARKER  = 256
+NAV_FIX          = 512
+NAV_DME          = 1024
+NAV_LATLON       = 2048
+
+NavType = {
+    NAV_UNKNOWN:      "UKN",
+    NAV_AIRPORT:      "APT",
+    NAV_NDB:          "NDB",
+    NAV_VOR:          "VOR",
+    NAV_ILS:          "ILS",
+    NAV_LOCALIZER:    "LOC",
+    NAV_GLIDESLOPE:   "GS",
+    NAV_OUTERMARKER:  "OM",
+    NAV_MIDDLEMARKER: "MM",
+    NAV_INNERMARKER:  "IM",
+    NAV_FIX:          "FIX",
+    NAV_DME:          "DME",
+    NAV_LATLON:       "L/L"}
+
+# earth_nav.dat row codes
+DAT_NAV_TYPES = {
+    2:  NAV_NDB,
+    3:  NAV_VOR,
+    4:  NAV_ILS,
+    5:  NAV_LOCALIZER,
+    6:  NAV_GLIDESLOPE,
+    7:  NAV_OUTERMARKER,
+    8:  NAV_MIDDLEMARKER,
+    9:  NAV_INNERMARKER,
+    12: NAV_DME,
+    13: NAV_DME}
+
+NavAid = namedtuple('NavAid', ['typ', 'lat', 'lon', 'name', 'height', 'freq', 'ident', 'region'])
+Airway = namedtuple('Airway', ['id1', 'reg1', 'lat1', 'lon1', 'id2', 'reg2', 'lat2', 'lon2',
+                               'oneway', 'level', 'base', 'top', 'names'])
+
+CACHE_MAGIC   = b"SWNC"
+CACHE_VERSION = 1
+CACHE_HEADER  = struct.Struct("<4sI16sI")
+
+def NavDataDirs(xplaneRoot):
+    # Navigraph & co. install into Custom Data, which wins over the defaults
+    return [os.path.join(xplaneRoot, "Custom Data"),
+            os.path.join(xplaneRoot, "Resources", "default data")]
+
+def FindNavDataFile(xplaneRoot, fileName):
+    for baseDir in NavDataDirs(xplaneRoot):
+        path = os.path.join(baseDir, fileName)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def ReadCycle(path):
+    # "AIRAC cycle : 1710" and optional "Version : 1" -> "1710.1"
+    cycle, version = None, None
+    try:
+        for line in _Lines(path):
+            key, sep, value = line.partition(":")
+            if not sep: continue
+            key = key.strip().upper()
+            if key == "AIRAC CYCLE":
+                cycle = value.strip()
+            elif key == "VERSION":
+                version = value.strip()
+    except (IOError, OSError):
+        return None
+    if not cycle:
+        return None
+    return cycle + "." + version if version else cycle
+
+def _Lines(path):
+    with open(path, "rb") as fh:
+        for raw in fh:
+            yield raw if str is bytes else raw.decode("latin-1")
+
+def _Records(path):
+    # Skip the "I"/"A" origin line and the version line, stop at "99"
+    lines = _Lines(path)
+    next(lines, None)
+    header = next(lines, "").split()
+    try:
+        version = int(header[0])
+    except (IndexError, ValueError):
+        version = 0
+    for line in lines:
+        fields = line.split()
+        if not fields: continue
+        if fields[0] == "99": break
+        yield version, fields
+
+def ReadNav(path):
+    # 810:  code lat lon elev freq range extra ident name...
+    # 1100: code lat lon elev freq range extra ident terminal region name...
+    for version, fields in _Records(path):
+        try:
+            typ = DAT_NAV_TYPES.get(int(fields[0]))
+            if typ is None: continue
+            if version >= 1100:
+                region, name = fields[9], " ".join(fields[10:])
+            else:
+                region, name = "", " ".join(fields[8:])
+            yield NavAid(typ, float(fields[1]), float(fields[2]), name,
+                         float(fields[3]) * 0.3048, int(fields[4]), fields[7], region)
+        except (IndexError, ValueError):
+            continue
+
+def ReadFix(path):
+    # 600: lat lon ident / 1101: lat lon ident terminal region [type]
+    for version, fields in _Records(path):
+        try:
+            region = fields[4] if version >= 1101 else ""
+            yield NavAid(NAV_FIX, float(fields[0]), float(fields[1]), fields[2], 0.0, 0, fields[2], region)
+        except (IndexError, ValueError):
+            continue
+
+def ReadAwy(path):
+    # 640:  id1 lat1 lon1 id2 lat2 lon2 level base top names
+    # 1100: id1 reg1 typ1 id2 reg2 typ2 dir level base top names
+    # dir is N both ways, F from 1 to 2, B from 2 to 1; B segments come
+    # out turned around, one-way segments always go from 1 to 2
+    for version, fields in _Records(path):
+        try:
+            if len(fields) >= 11:
+                if fields[6] == "B":
+                    fields[0:6] = fields[3:6] + fields[0:3]
+                yield Airway(fields[0], fields[1], None, None, fields[3], fields[4], None, None,
+                             fields[6] != "N", int(fields[7]), int(fields[8]), int(fields[9]), fields[10])
+            else:
+                yield Airway(fields[0], "", float(fields[1]), float(fields[2]),
+                             fields[3], "", float(fields[4]), float(fields[5]),
+                             False, int(fields[6]), int(fields[7]), int(fields[8]), fields[9])
+        except (IndexError, ValueError):
+            continue
+
+class NavTable:
+    # Column store of NavAid records, row number is the navaid handle
+    def __init__(self):
+        self.typ    = array('H')
+        self.lat    = array('d')
+        self.lon    = array('d')
+        self.height = array('f')
+        self.freq   = array('i')
+        self.ident  = []
+        self.name   = []
+        self.region = []
+
+    def __len__(self):
+        return len(self.ident)
+
+    def Append(self, aid):
+        self.typ.append(aid.typ)
+        self.lat.append(aid.lat)
+        self.lon.append(aid.lon)
+        self.height.append(aid.height)
+        self.freq.append(aid.freq)
+        self.ident.append(aid.ident)
+        self.name.append(aid.name)
+        self.region.append(aid.region)
+
+    def Extend(self, aids):
+        for aid in aids:
+            self.Append(aid)
+
+    def Get(self, row):
+        return NavAid(self.typ[row], self.lat[row], self.lon[row], self.name[row],
+                      self.height[row], self.freq[row], self.ident[row], self.region[row])
+
+    def Save(self, path, cycle):
+        # Write to a temp file first so a crash never leaves half a cache
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "wb") as fh:
+            fh.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, _Encode(cycle), len(self)))
+            for column in (self.typ, self.lat, self.lon, self.height, self.freq):
+                column.tofile(fh)
+            for column in (self.ident, self.name, self.region):
+                blob = _Encode("\n".join(column))
+                fh.write(struct.pack("<I", len(blob)))
+                fh.write(blob)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+    @classmethod
+    def Load(cls, path, cycle):
+        # None when missing, damaged or built for another AIRAC cycle
+        table = cls()
+        try:
+            with open(path, "rb") as fh:
+                magic, version, fileCycle, count = CACHE_HEADER.unpack(fh.read(CACHE_HEADER.size))
+                if magic != CACHE_MAGIC or version != CACHE_VERSION or fileCycle.rstrip(b"\0") != _Encode(cycle):
+                    return None
+                for column in (table.typ, table.lat, table.lon, table.height, table.freq):
+                    column.fromfile(fh, count)
+                strings = []
+                for i in range(3):
+                    size, = struct.unpack("<I", fh.read(4))
+                    text = _Decode(fh.read(size))
+                    strings.append(text.split("\n") if count else [])
+                table.ident, table.name, table.region = strings
+        except (IOError, OSError, EOFError, struct.error, ValueError):
+            return None
+        if any(len(column) != count for column in (table.ident, table.name, table.region)):
+            return None
+        return table
+
+def _Encode(text):
+    return text if str is bytes else text.encode("utf-8")
+
+def _Decode(blob):
+    return blob if str is bytes else blob.decode("utf-8")
@@ -0,0 +1,246 @@
+# Simple Warp - navaid index
+# See PI_Simple_Warp.py for license.
+#
+# Navaids are read once into a NavTable and grouped by ID, so that
+# a Find is a dictionary lookup instead of a walk of the XPLM database.
+# NavGrid buckets the same rows into lat/lon tiles per navaid type for
+# nearest-navaid queries, and PrefixIndex sorts IDs and name words for
+# the search as you type.
+
+from array import array
+from bisect import bisect_left
+import heapq, math
+
+from SimpleWarp.Geodesy import RADIUS, NavDistance, Distances
+
+# Above this many keys in a prefix range, the closest matches are found
+# by walking the grid outward instead of measuring every match
+PREFIX_SCAN_MAX = 500
+# Tiles of the short prefix grids, the largest one holding about
+# PREFIX_TILE_ROWS rows where navaids are, over about 40000 square degrees
+PREFIX_TILES = (4.0, 2.0, 1.0, 0.5)
+PREFIX_TILE_ROWS = 2.0
+# Prefixes up to this long get their own grid when they match too much
+PREFIX_GRID_LEN = 2
+# Cells the closest rows of a short prefix are kept for, in degrees
+AROUND_CELL = 0.25
+
+class NavIndex:
+    def __init__(self, table):
+        self.table = table
+        self.count = len(table)
+        self.byId  = {}
+        for row, ident in enumerate(table.ident):
+            self.byId.setdefault(ident, []).append(row)
+        self.grid = NavGrid(table)
+        self.prefix = PrefixIndex(table)
+
+    def Find(self, ident):
+        # All navaids sharing this ID, in database order
+        return [self.table.Get(row) for row in self.byId.get(ident, ())]
+
+    def FindNearest(self, ident, lat, lon):
+        # Same as Find, closest first
+        table = self.table
+        rows = self.byId.get(ident, ())
+        dists = Distances(lat, lon, [table.lat[row] for row in rows], [table.lon[row] for row in rows])
+        return [table.Get(row) for dist, row in sorted(zip(dists, rows))]
+
+    def Nearest(self, lat, lon, count=1, typ=None, radius=None):
+        return [self.table.Get(row) for dist, row in self.grid.Nearest(lat, lon, count, typ, radius)]
+
+    def Search(self, prefix, lat, lon, count):
+        # (distance, NavAid) of the count closest navaids whose ID or a
+        # word of the name starts with prefix, closest first
+        prefix = prefix.upper()
+        lo, hi = self.prefix.Range(prefix)
+        if hi - lo > PREFIX_SCAN_MAX:
+            if prefix in self.prefix.grids:
+                found = self.prefix.Around(prefix, lat, lon, count)
+            else:
+                accept = lambda row: self.prefix.Matches(row, prefix)
+                found = self.prefix.grids[prefix[:PREFIX_GRID_LEN]].Nearest(lat, lon, count, accept=accept)
+            return [(dist, self.table.Get(row)) for dist, row in found]
+        # The closest point has the largest dot product of unit vectors
+        radLat, radLon = math.radians(lat), math.radians(lon)
+        cx, cy, cz = math.cos(radLat) * math.cos(radLon), math.cos(radLat) * math.sin(radLon), math.sin(radLat)
+        X, Y, Z = self.prefix.x, self.prefix.y, self.prefix.z
+        rows = set(self.prefix.rows[lo:hi])
+        found = heapq.nlargest(count, [(X[row]*cx + Y[row]*cy + Z[row]*cz, row) for row in rows])
+        table = self.table
+        return sorted((NavDistance(lat, lon, table.lat[row], table.lon[row]), table.Get(row)) for dot, row in found)
+
+class PrefixIndex:
+    # Every ID and every word of every name, sorted, with the row each key
+    # comes from. The keys starting with a prefix are one contiguous range,
+    # found with two bisections. While typing, each prefix extends the
+    # previous one, so only the previous range is bisected.
+    def __init__(self, table):
+        self.table = table
+        keys = list(table.ident)
+        rows = list(range(len(keys)))
+        for row, name in enumerate(table.name):
+            for word in name.upper().split():
+                if word != keys[row]:
+                    keys.append(word)
+                    rows.append(row)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.rows = array('i', [rows[i] for i in order])
+        # Unit vectors of every row, to rank a range without trigonometry
+        self.x, self.y, self.z = array('d'), array('d'), array('d')
+        for lat, lon in zip(table.lat, table.lon):
+            radLat, radLon = math.radians(lat), math.radians(lon)
+            self.x.append(math.cos(radLat) * math.cos(radLon))
+            self.y.append(math.cos(radLat) * math.sin(radLon))
+            self.z.append(math.sin(radLat))
+        self.last = ("", 0, len(self.keys))
+        # One grid per one or two letter prefix matching too many rows to
+        # rank them all. Every row of it matches the prefix, the type
+        # doesn't matter. Longer prefixes filter their two letter grid.
+        self.grids = {}
+        for length in range(1, PREFIX_GRID_LEN + 1):
+            lo = 0
+            while lo < len(self.keys):
+                short = self.keys[lo][:length]
+                hi = bisect_left(self.keys, short[:-1] + chr(ord(short[-1]) + 1), lo) if short else lo + 1
+                if len(short) == length and hi - lo > PREFIX_SCAN_MAX:
+                    rows = sorted(set(self.rows[lo:hi]))
+                    tileSize = next((size for size in PREFIX_TILES if len(rows) * size * size <= PREFIX_TILE_ROWS * 40000),
+                                    PREFIX_TILES[-1])
+                    self.grids[short] = NavGrid(table, tileSize, rows, typed=False)
+                lo = hi
+        # Rows of each short prefix around the aircraft cell
+        self.around = (None, {})
+
+    def Range(self, prefix):
+        # [lo, hi) of the keys starting with prefix
+        lastPrefix, lo, hi = self.last
+        if not prefix.startswith(lastPrefix):
+            lo, hi = 0, len(self.keys)
+        if prefix:
+            lo = bisect_left(self.keys, prefix, lo, hi)
+            # First string after every string starting with prefix
+            hi = bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo, hi)
+        self.last = (prefix, lo, hi)
+        return lo, hi
+
+    def Around(self, prefix, lat, lon, count):
+        # (distance, row) of the count closest rows of a short prefix grid.
+        # Every search starts with a short prefix, so the rows holding the
+        # closest ones from anywhere in the aircraft cell are kept until it
+        # leaves the cell: the count closest to the cell center, plus all
+        # rows up to two cell radii farther.
+        cLat, cLon = int(math.floor(lat / AROUND_CELL)), int(math.floor(lon / AROUND_CELL))
+        cell = (cLat, cLon, count)
+        if self.around[0] != cell:
+            self.around = (cell, {})
+        rows = self.around[1].get(prefix)
+        if rows is None:
+            grid = self.grids[prefix]
+            south, west = cLat * AROUND_CELL, cLon * AROUND_CELL
+            centerLat, centerLon = south + AROUND_CELL / 2, west + AROUND_CELL / 2
+            reach = max(NavDistance(centerLat, centerLon, cornerLat, cornerLon)
+                        for cornerLat in (south, south + AROUND_CELL) for cornerLon in (west, west + AROUND_CELL))
+            found = grid.Nearest(centerLat, centerLon, count)
+            if len(found) == count:
+                found = grid.Nearest(centerLat, centerLon, len(self.table), radius=found[-1][0] + 2 * reach)
+            rows = self.around[1][prefix] = [row for dist, row in found]
+        table = self.table
+        return heapq.nsmallest(count, [(NavDistance(lat, lon, table.lat[row], table.lon[row]), row) for row in rows])
+
+    def Matches(self, row, prefix):
+        # Same test as the keys, on one row
+        return (self.table.ident[row].startswith(prefix) or
+                (" " + self.table.name[row].upper()).find(" " + prefix) >= 0)
+
+class NavGrid:
+    def __init__(self, table, tileSize=1.0, rows=None, typed=True):
+        # All rows of the table, or only the given ones. Untyped, all rows
+        # share one tile per position and only typ=None can be asked for.
+        self.table    = table
+        self.tileSize = tileSize
+        self.tiles    = {}
+        self.types    = set()
+        # Same keys as TileLat and TileLon, inlined for the build
+        typs, lats, lons = table.typ if typed else None, table.lat, table.lon
+        lonTiles = int(round(360 / tileSize))
+        floor = math.floor
+        for row in (range(len(table)) if rows is None else rows):
+            key = (typs[row] if typed else 0, int(floor(lats[row] / tileSize)), int(floor((lons[row] + 180) / tileSize)) % lonTiles)
+            tile = self.tiles.get(key)
+            if tile is None:
+                self.tiles[key] = tile = []
+                self.types.add(key[0])
+            tile.append(row)
+
+    def TileLat(self, lat):
+        return int(math.floor(lat / self.tileSize))
+
+    def TileLon(self, lon):
+        # Wrap around the antimeridian
+        tiles = int(round(360 / self.tileSize))
+        return int(math.floor((lon + 180) / self.tileSize)) % tiles
+
+    def Nearest(self, lat, lon, count=1, typ=None, radius=None, accept=None):
+        # (distance, row) of the count closest navaids whose type is in the
+        # typ mask, within radius nm, and passing accept(row) when given.
+        # Tiles are visited in growing square rings around the position,
+        # until no unvisited tile can hold anything closer.
+        table = self.table
+        types = [t for t in self.types if typ is None or t & typ]
+        if not types or count < 1:
+            return []
+        tLat, tLon = self.TileLat(lat), self.TileLon(lon)
+        lonTiles = int(round(360 / self.tileSize))
+        latTiles = int(round(180 / self.tileSize))
+        # Offset of the position inside its own tile, in degrees
+        inLat = lat / self.tileSize - math.floor(lat / self.tileSize)
+        inLon = (lon + 180) / self.tileSize - math.floor((lon + 180) / self.tileSize)
+        cosLat = math.cos(math.radians(lat))
+        toPole = math.radians(90 - abs(lat))
+        best = []   # max-heap of (-dist, row)
+        seen = set()
+        ring = 0
+        while True:
+            for keyLat, keyLon in self.Ring(tLat, tLon, ring, lonTiles):
+                if (keyLat, keyLon) in seen: continue
+                seen.add((keyLat, keyLon))
+                for t in types:
+                    for row in self.tiles.get((t, keyLat, keyLon), ()):
+                        if accept is not None and not accept(row): continue
+                        dist = NavDistance(lat, lon, table.lat[row], table.lon[row])
+                        if radius is not None and dist > radius: continue
+                        if len(best) == count and dist >= -best[0][0]: continue
+                        if len(best) == count:
+                            heapq.heapreplace(best, (-dist, row))
+                        else:
+                            heapq.heappush(best, (-dist, row))
+            # Lower bound for anything outside the rings visited so far
+            latBound = min(inLat + ring, 1 - inLat + ring) * self.tileSize * 60
+            maxLat = min(90.0, abs(lat) + (ring + 1) * self.tileSize)
+            halfLon = min(math.pi / 2, math.radians(min(inLon + ring, 1 - inLon + ring) * self.tileSize) / 2)
+            k = math.sqrt(max(0.0, cosLat * math.cos(math.radians(maxLat)))) * math.sin(halfLon)
+            # Once the rings reach a pole that says nothing, the distance
+            # to the first meridian not visited, or to the pole, still holds
+            meridian = toPole if halfLon >= math.pi / 4 else min(math.asin(cosLat * math.sin(2 * halfLon)), toPole)
+            lonBound = max(2 * math.asin(min(1.0, k)), meridian) * RADIUS
+            if 2 * ring + 1 >= lonTiles:
+                lonBound = float("inf")
+            bound = min(latBound, lonBound)
+            if len(best) == count and bound >= -best[0][0]: break
+            if radius is not None and bound > radius: break
+            if ring > max(latTiles, lonTiles): break
+            ring += 1
+        return sorted((-negDist, row) for negDist, row in best)
+
+    def Ring(self, tLat, tLon, ring, lonTiles):
+        if ring == 0:
+            yield tLat, tLon
+            return
+        for dLon in range(-ring, ring + 1):
+            yield tLat - ring, (tLon + dLon) % lonTiles
+            yield tLat + ring, (tLon + dLon) % lonTiles
+        for dLat in range(-ring + 1, ring):
+            yield tLat + dLat, (tLon - ring) % lonTiles
+            yield tLat + dLat, (tLon + ring) % lonTiles
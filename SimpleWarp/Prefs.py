@@ -0,0 +1,127 @@
+# Simple Warp - preferences
+# See PI_Simple_Warp.py for license.
+#
+# Simple_Warp.prf is read once at start. Values are typed and checked
+# when set, and the store only becomes dirty when a value really changes.
+# Writes go to a temp file renamed over the old one, either on a
+# background thread (SaveAsync) or synchronously (Save, at XPluginStop).
+
+from timeit import default_timer as timer
+import os, threading
+
+class PrefField:
+    def __init__(self, name, typ, default, minimum=None, choices=None):
+        self.name    = name      # as written in the file
+        self.typ     = typ       # bool, int or str
+        self.default = default
+        self.minimum = minimum
+        self.choices = choices
+
+    def Parse(self, text):
+        # Value from the file or a widget, ValueError when unusable
+        if self.typ is bool:
+            if isinstance(text, bool):
+                return text
+            if str(text).upper() in ("1", "YES", "TRUE"):
+                return True
+            if str(text).upper() in ("0", "NO", "FALSE"):
+                return False
+            raise ValueError(text)
+        value = self.typ(text)
+        if self.typ is str:
+            value = value.strip().upper()
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(text)
+        if self.minimum is not None:
+            value = max(self.minimum, value)
+        return value
+
+class PrefStore:
+    def __init__(self, path, fields, log, stats=None):
+        self.path   = path
+        self.fields = [PrefField(*field) for field in fields]
+        self.byName = dict((field.name.upper(), field) for field in self.fields)
+        self.values = dict((field.name, field.default) for field in self.fields)
+        self.log    = log
+        self.stats  = stats   # SimpleWarp.Stats.Stats, optional
+        self.dirty  = False
+        self.lock   = threading.Lock()
+        self.thread = None
+
+    def Get(self, name):
+        return self.values[name]
+
+    def Set(self, name, value):
+        # True when the value changed
+        field = self.byName[name.upper()]
+        value = field.Parse(value)
+        if self.values[field.name] == value:
+            return False
+        self.values[field.name] = value
+        self.dirty = True
+        return True
+
+    def Reset(self, names):
+        for name in names:
+            self.Set(name, self.byName[name.upper()].default)
+
+    def Load(self):
+        # Unknown lines and bad values are skipped, the file is not rewritten
+        try:
+            with open(self.path, "rU" if str is bytes else "r") as fh:
+                lines = fh.read().splitlines()
+        except (IOError, OSError):
+            self.log.Info("No preferences in {}, using defaults", self.path)
+            return
+        for line in lines:
+            fields = line.strip().split()
+            if len(fields) != 2 or fields[0].startswith("#"): continue
+            field = self.byName.get(fields[0].upper())
+            if field is None: continue
+            try:
+                self.values[field.name] = field.Parse(fields[1])
+            except ValueError:
+                self.log.Warning("Ignoring preference {} {}", fields[0], fields[1])
+        self.dirty = False
+
+    def Text(self):
+        lines = ["# Simple Warp preferences"]
+        lines.extend("{} {}".format(field.name, self.values[field.name]) for field in self.fields)
+        return "\n".join(lines) + "\n"
+
+    def Save(self):
+        # Synchronous, waits for a background write still running
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.dirty:
+            self.dirty = False
+            self.Write(self.Text())
+
+    def SaveAsync(self):
+        if not self.dirty or (self.thread is not None and self.thread.is_alive()):
+            return
+        # The text is taken now, later changes make the store dirty again
+        self.dirty = False
+        self.thread = threading.Thread(target=self.Write, args=(self.Text(),), name="Simple Warp prefs")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Write(self, text):
+        tmpPath = self.path + ".tmp"
+        start = timer()
+        with self.lock:
+            try:
+                with open(tmpPath, "w") as fh:
+                    fh.write(text)
+                try:
+                    os.rename(tmpPath, self.path)
+                except OSError:
+                    # Windows does not rename over an existing file
+                    os.remove(self.path)
+                    os.rename(tmpPath, self.path)
+            except (IOError, OSError) as e:
+                self.dirty = True
+                self.log.Warning("Failed to write preferences {}: {}", self.path, e)
+        if self.stats is not None:
+            self.stats.Add("prefs", timer() - start)
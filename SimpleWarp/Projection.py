@@ -0,0 +1,156 @@
+# Simple Warp - ellipsoid geodesics and local frame
+# See PI_Simple_Warp.py for license.
+#
+# Inverse and Direct solve the geodesic problems on the WGS84 ellipsoid
+# with Vincenty's formulas, in degrees and nm like SimpleWarp.Geodesy. A
+# warp point worked out here needs no trip through the local frame, the
+# only conversion left is the final WorldToLocal.
+#
+# LocalFrame is a round earth local frame like X-Plane's: meters from a
+# reference point on the ellipsoid, x east, y up, z south. The rotation
+# for the reference point is only worked out again when it moves, the way
+# X-Plane shifts lat_ref/lon_ref while the aircraft flies on.
+
+import math
+
+from SimpleWarp.Geodesy import NavDistance, Bearing, Destination
+
+# WGS84
+AXIS       = 6378137.0
+FLATTENING = 1 / 298.257223563
+MINOR      = AXIS * (1 - FLATTENING)
+ECC2       = FLATTENING * (2 - FLATTENING)
+ECC2_PRIME = ECC2 / (1 - ECC2)
+
+VINCENTY_ITERATIONS = 200
+VINCENTY_TOLERANCE  = 1e-12
+
+def Inverse(degLat1, degLon1, degLat2, degLon2):
+    # (nm, initial azimuth 0-360) along the geodesic from point 1 to point 2.
+    # Near antipodal points don't converge, the great circle is used there.
+    U1 = math.atan((1 - FLATTENING) * math.tan(math.radians(degLat1)))
+    U2 = math.atan((1 - FLATTENING) * math.tan(math.radians(degLat2)))
+    L = math.radians(degLon2 - degLon1)
+    sinU1, cosU1 = math.sin(U1), math.cos(U1)
+    sinU2, cosU2 = math.sin(U2), math.cos(U2)
+    lam = L
+    for i in range(VINCENTY_ITERATIONS):
+        sinLam, cosLam = math.sin(lam), math.cos(lam)
+        sinSigma = math.sqrt((cosU2 * sinLam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cosLam) ** 2)
+        if sinSigma == 0.0:
+            return 0.0, 0.0
+        cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLam
+        sigma = math.atan2(sinSigma, cosSigma)
+        sinAlpha = cosU1 * cosU2 * sinLam / sinSigma
+        cos2Alpha = 1 - sinAlpha * sinAlpha
+        cos2SigmaM = cosSigma - 2 * sinU1 * sinU2 / cos2Alpha if cos2Alpha else 0.0
+        C = FLATTENING / 16 * cos2Alpha * (4 + FLATTENING * (4 - 3 * cos2Alpha))
+        last = lam
+        lam = L + (1 - C) * FLATTENING * sinAlpha * (
+            sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)))
+        if abs(lam - last) < VINCENTY_TOLERANCE:
+            break
+    else:
+        return NavDistance(degLat1, degLon1, degLat2, degLon2), Bearing(degLat1, degLon1, degLat2, degLon2)
+    u2 = cos2Alpha * ECC2_PRIME
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM) -
+                 B / 6 * cos2SigmaM * (-3 + 4 * sinSigma * sinSigma) * (-3 + 4 * cos2SigmaM * cos2SigmaM)))
+    meters = MINOR * A * (sigma - deltaSigma)
+    azimuth = math.atan2(cosU2 * math.sin(lam), cosU1 * sinU2 - sinU1 * cosU2 * math.cos(lam))
+    return meters / 1852.0, math.degrees(azimuth) % 360
+
+def Direct(degLat, degLon, azimuth, distance):
+    # Point reached after distance nm along the geodesic on initial azimuth
+    alpha1 = math.radians(azimuth)
+    sinAlpha1, cosAlpha1 = math.sin(alpha1), math.cos(alpha1)
+    tanU1 = (1 - FLATTENING) * math.tan(math.radians(degLat))
+    cosU1 = 1 / math.sqrt(1 + tanU1 * tanU1)
+    sinU1 = tanU1 * cosU1
+    sigma1 = math.atan2(tanU1, cosAlpha1)
+    sinAlpha = cosU1 * sinAlpha1
+    cos2Alpha = 1 - sinAlpha * sinAlpha
+    u2 = cos2Alpha * ECC2_PRIME
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    first = distance * 1852.0 / (MINOR * A)
+    sigma = first
+    for i in range(VINCENTY_ITERATIONS):
+        cos2SigmaM = math.cos(2 * sigma1 + sigma)
+        sinSigma, cosSigma = math.sin(sigma), math.cos(sigma)
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM) -
+                     B / 6 * cos2SigmaM * (-3 + 4 * sinSigma * sinSigma) * (-3 + 4 * cos2SigmaM * cos2SigmaM)))
+        last = sigma
+        sigma = first + deltaSigma
+        if abs(sigma - last) < VINCENTY_TOLERANCE:
+            break
+    else:
+        return Destination(degLat, degLon, azimuth, distance)
+    sinSigma, cosSigma = math.sin(sigma), math.cos(sigma)
+    cos2SigmaM = math.cos(2 * sigma1 + sigma)
+    tmp = sinU1 * sinSigma - cosU1 * cosSigma * cosAlpha1
+    lat2 = math.atan2(sinU1 * cosSigma + cosU1 * sinSigma * cosAlpha1,
+                      (1 - FLATTENING) * math.sqrt(sinAlpha * sinAlpha + tmp * tmp))
+    lam = math.atan2(sinSigma * sinAlpha1, cosU1 * cosSigma - sinU1 * sinSigma * cosAlpha1)
+    C = FLATTENING / 16 * cos2Alpha * (4 + FLATTENING * (4 - 3 * cos2Alpha))
+    L = lam - (1 - C) * FLATTENING * sinAlpha * (
+        sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)))
+    return math.degrees(lat2), (degLon + math.degrees(L) + 540) % 360 - 180
+
+def ToECEF(degLat, degLon, alt):
+    radLat, radLon = math.radians(degLat), math.radians(degLon)
+    sinLat, cosLat = math.sin(radLat), math.cos(radLat)
+    n = AXIS / math.sqrt(1 - ECC2 * sinLat * sinLat)
+    return ((n + alt) * cosLat * math.cos(radLon), (n + alt) * cosLat * math.sin(radLon),
+            (n * (1 - ECC2) + alt) * sinLat)
+
+def FromECEF(x, y, z):
+    # (lat, lon, alt), Bowring's formula, well under a millimeter near the surface
+    p = math.sqrt(x * x + y * y)
+    theta = math.atan2(z * AXIS, p * MINOR)
+    sinT, cosT = math.sin(theta), math.cos(theta)
+    radLat = math.atan2(z + ECC2_PRIME * MINOR * sinT ** 3, p - ECC2 * AXIS * cosT ** 3)
+    sinLat = math.sin(radLat)
+    n = AXIS / math.sqrt(1 - ECC2 * sinLat * sinLat)
+    if abs(radLat) < math.radians(80):
+        alt = p / math.cos(radLat) - n
+    else:
+        alt = z / sinLat - n * (1 - ECC2)
+    return math.degrees(radLat), math.degrees(math.atan2(y, x)), alt
+
+class LocalFrame:
+    def __init__(self):
+        self.origin = None   # (lat, lon) of the reference point
+        self.shifts = 0
+
+    def SetOrigin(self, degLat, degLon):
+        # True when the reference point moved and the frame was worked out again
+        if self.origin == (degLat, degLon):
+            return False
+        self.origin = (degLat, degLon)
+        self.shifts += 1
+        radLat, radLon = math.radians(degLat), math.radians(degLon)
+        sinLat, cosLat = math.sin(radLat), math.cos(radLat)
+        sinLon, cosLon = math.sin(radLon), math.cos(radLon)
+        self.center = ToECEF(degLat, degLon, 0.0)
+        self.east   = (-sinLon, cosLon, 0.0)
+        self.up     = (cosLat * cosLon, cosLat * sinLon, sinLat)
+        self.south  = (sinLat * cosLon, sinLat * sinLon, -cosLat)
+        return True
+
+    def ToLocal(self, degLat, degLon, alt):
+        x, y, z = ToECEF(degLat, degLon, alt)
+        cx, cy, cz = self.center
+        dx, dy, dz = x - cx, y - cy, z - cz
+        e, u, s = self.east, self.up, self.south
+        return (e[0] * dx + e[1] * dy + e[2] * dz,
+                u[0] * dx + u[1] * dy + u[2] * dz,
+                s[0] * dx + s[1] * dy + s[2] * dz)
+
+    def ToWorld(self, x, y, z):
+        e, u, s = self.east, self.up, self.south
+        cx, cy, cz = self.center
+        return FromECEF(cx + e[0] * x + u[0] * y + s[0] * z,
+                        cy + e[1] * x + u[1] * y + s[1] * z,
+                        cz + e[2] * x + u[2] * y + s[2] * z)
@@ -0,0 +1,65 @@
+# Simple Warp - FMS route geometry
+# See PI_Simple_Warp.py for license.
+#
+# Legs between consecutive FMS waypoints, with their great circle
+# length, initial course and the cumulative along-track distance at
+# each waypoint, computed once when the route is read.
+
+from collections import namedtuple
+import bisect
+
+from SimpleWarp.Geodesy import NavDistance, Bearing, Destination, AlongTrack
+
+Waypoint = namedtuple('Waypoint', ['index', 'ident', 'lat', 'lon'])
+Segment  = namedtuple('Segment' , ['Start', 'End'])
+
+class Route:
+    def __init__(self, waypoints):
+        self.waypoints = list(waypoints)
+        self.legs      = [Segment(a, b) for a, b in zip(self.waypoints, self.waypoints[1:])]
+        self.lengths   = [NavDistance(leg.Start.lat, leg.Start.lon, leg.End.lat, leg.End.lon) for leg in self.legs]
+        self.bearings  = [Bearing(leg.Start.lat, leg.Start.lon, leg.End.lat, leg.End.lon) for leg in self.legs]
+        # Along-track distance of every waypoint from the first one
+        self.cumul = [0.0]
+        for length in self.lengths:
+            self.cumul.append(self.cumul[-1] + length)
+
+    def Length(self):
+        return self.cumul[-1]
+
+    def Position(self, index):
+        # Position in the waypoint list of FMS entry index, None if absent
+        for pos, wpt in enumerate(self.waypoints):
+            if wpt.index == index:
+                return pos
+        return None
+
+    def AlongTrack(self, leg, lat, lon):
+        # Along-track distance of a point abeam leg, clamped to the leg
+        if not self.legs:
+            return 0.0
+        leg = max(0, min(leg, len(self.legs) - 1))
+        start, end = self.legs[leg]
+        along = AlongTrack(start.lat, start.lon, end.lat, end.lon, lat, lon)
+        return self.cumul[leg] + max(0.0, min(self.lengths[leg], along))
+
+    def Locate(self, lat, lon):
+        # Along-track distance of the point of the route closest to lat, lon
+        best, bestAlong = None, 0.0
+        for leg in range(len(self.legs)):
+            along = self.AlongTrack(leg, lat, lon)
+            pLat, pLon, pLeg = self.PositionAt(along)
+            dist = NavDistance(lat, lon, pLat, pLon)
+            if best is None or dist < best:
+                best, bestAlong = dist, along
+        return bestAlong
+
+    def PositionAt(self, along):
+        # (lat, lon, leg) of the point along nm from the first waypoint
+        if not self.legs:
+            wpt = self.waypoints[0]
+            return wpt.lat, wpt.lon, 0
+        along = max(0.0, min(self.Length(), along))
+        leg = min(len(self.legs) - 1, max(0, bisect.bisect_right(self.cumul, along) - 1))
+        lat, lon = Destination(self.legs[leg].Start.lat, self.legs[leg].Start.lon, self.bearings[leg], along - self.cumul[leg])
+        return lat, lon, leg
@@ -0,0 +1,71 @@
+# Simple Warp - timings
+# See PI_Simple_Warp.py for license.
+#
+# Each action keeps its last STATS_WINDOW durations. The p50/p95/max
+# summary is only worked out when read, and kept until the next sample.
+# Samples may come from any thread, deque.append is atomic.
+
+from collections import deque
+from timeit import default_timer as timer
+
+STATS_WINDOW = 256
+
+# Actions in display order
+ACTIONS = ["find", "suggest", "next", "nearest", "route", "warp", "warp_step", "cruise", "fuel", "undo", "prefs", "index", "index_feed"]
+
+class Timing:
+    def __init__(self, size=STATS_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.count   = 0
+        self.summary = None
+
+    def Add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.summary = None
+
+    def Summary(self):
+        # [count, p50, p95, max], durations in ms
+        summary = self.summary
+        if summary is None:
+            samples = sorted(self.samples)
+            if not samples:
+                summary = [0.0, 0.0, 0.0, 0.0]
+            else:
+                last = len(samples) - 1
+                summary = [float(self.count), samples[last // 2] * 1000,
+                           samples[int(last * 0.95)] * 1000, samples[last] * 1000]
+            self.summary = summary
+        return summary
+
+class Stats:
+    def __init__(self):
+        self.timings = dict((action, Timing()) for action in ACTIONS)
+
+    def Add(self, action, seconds):
+        self.timings[action].Add(seconds)
+
+    def Summary(self, action):
+        return self.timings[action].Summary()
+
+    def Lines(self):
+        lines = []
+        for action in ACTIONS:
+            count, p50, p95, top = self.Summary(action)
+            if count:
+                lines.append("{:<10} {:>5.0f}x  p50 {:.2f}  p95 {:.2f}  max {:.2f} ms".format(action, count, p50, p95, top))
+        return lines
+
+def Profiled(action):
+    # Method decorator, the instance has a stats attribute
+    def Wrap(method):
+        def Timed(self, *args):
+            start = timer()
+            try:
+                return method(self, *args)
+            finally:
+                self.stats.Add(action, timer() - start)
+        Timed.__name__ = method.__name__
+        Timed.__doc__  = method.__doc__
+        return Timed
+    return Wrap
@@ -0,0 +1,85 @@
+# Simple Warp - terrain sampling
+# See PI_Simple_Warp.py for license.
+#
+# Terrain elevations come from the sim adapter's ProbeTerrain, one probe
+# reused for the whole session. Samples are cached in small cells grouped
+# by 1 degree tile, like the DSF scenery tiles, and the least recently
+# used tiles are dropped. A sampler probes at most perFrame uncached
+# points per call, so a long line of samples is spread over frames.
+# X-Plane can only probe where scenery is loaded; points it misses stay
+# unknown and are not cached.
+
+from collections import OrderedDict
+import math
+
+from SimpleWarp.Geodesy import NavDistance, Bearing, Destination
+
+TERRAIN_CELL    = 0.01   # degrees, about 0.6nm
+TERRAIN_SPACING = 1.0    # nm between samples along a warp
+TERRAIN_POINTS  = 200    # samples along one warp at most
+
+class TerrainCache:
+    def __init__(self, maxTiles=64):
+        self.maxTiles = maxTiles
+        self.tiles    = OrderedDict()   # (tile lat, tile lon) -> {cell: meters}
+        self.hits     = 0
+        self.misses   = 0
+
+    def Keys(self, lat, lon):
+        cellLat = int(math.floor(lat / TERRAIN_CELL))
+        cellLon = int(math.floor(lon / TERRAIN_CELL))
+        return (int(math.floor(lat)), int(math.floor(lon))), (cellLat, cellLon)
+
+    def Get(self, lat, lon):
+        # Elevation in meters, None when not sampled yet
+        tileKey, cellKey = self.Keys(lat, lon)
+        tile = self.tiles.get(tileKey)
+        elevation = tile.get(cellKey) if tile is not None else None
+        if elevation is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return elevation
+
+    def Put(self, lat, lon, elevation):
+        tileKey, cellKey = self.Keys(lat, lon)
+        tile = self.tiles.pop(tileKey, None)
+        if tile is None:
+            tile = {}
+            if len(self.tiles) >= self.maxTiles:
+                self.tiles.popitem(last=False)
+        # Most recently used last
+        self.tiles[tileKey] = tile
+        tile[cellKey] = elevation
+
+class TerrainSampler:
+    def __init__(self, sim, cache=None, perFrame=16):
+        self.sim      = sim
+        self.cache    = cache or TerrainCache()
+        self.perFrame = perFrame
+        self.points   = []
+        self.queue    = []
+
+    def Start(self, points):
+        self.points = list(points)
+        self.queue  = [(lat, lon) for lat, lon in self.points if self.cache.Get(lat, lon) is None]
+
+    def Step(self):
+        # Probes the next batch, True once every point has been tried
+        batch, self.queue = self.queue[:self.perFrame], self.queue[self.perFrame:]
+        for lat, lon in batch:
+            elevation = self.sim.ProbeTerrain(lat, lon)
+            if elevation is not None:
+                self.cache.Put(lat, lon, elevation)
+        return not self.queue
+
+    def Elevations(self):
+        # One per point, None where the probe missed
+        return [self.cache.Get(lat, lon) for lat, lon in self.points]
+
+def LinePoints(lat1, lon1, lat2, lon2):
+    # Points every TERRAIN_SPACING nm from 1 to 2, both ends included
+    distance = NavDistance(lat1, lon1, lat2, lon2)
+    count = int(min(TERRAIN_POINTS - 1, max(1, math.ceil(distance / TERRAIN_SPACING))))
+    bearing = Bearing(lat1, lon1, lat2, lon2)
+    return [Destination(lat1, lon1, bearing, distance * i / count) for i in range(count)] + [(lat2, lon2)]
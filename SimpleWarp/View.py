@@ -0,0 +1,67 @@
+# Simple Warp - window state
+# See PI_Simple_Warp.py for license.
+#
+# What the window shows is kept here by widget name, whether the widgets
+# exist or not: the plugin runs from commands and scripts with the window
+# never opened. Setting a text or a property to what it already is costs
+# nothing, and a widget built later gets its whole state when bound.
+# Text typed in the window comes back through TextChanged, from the
+# widget change messages, so nothing needs to be read back from a widget.
+# The widget calls are passed in, like the sim adapter of the engine.
+
+class WindowView:
+    def __init__(self, setText, setProperty):
+        self.setText     = setText       # (widget, text)
+        self.setProperty = setProperty   # (widget, property, value)
+        self.widgets = {}   # name -> widget, once built
+        self.texts   = {}   # name -> text
+        self.props   = {}   # name -> {property: value}
+        self.errors  = {}   # name -> text of a field holding an invalid value
+
+    def Bind(self, name, widget):
+        # Returns the widget, with the state set so far
+        self.widgets[name] = widget
+        if name in self.texts:
+            self.setText(widget, self.texts[name])
+        for prop, value in self.props.get(name, {}).items():
+            self.setProperty(widget, prop, value)
+        return widget
+
+    def Unbind(self):
+        # The window is gone, the state stays
+        self.widgets = {}
+
+    def Built(self, name):
+        return name in self.widgets
+
+    def Text(self, name):
+        return self.texts.get(name, "")
+
+    def SetText(self, name, text):
+        if self.texts.get(name) == text:
+            return
+        self.texts[name] = text
+        widget = self.widgets.get(name)
+        if widget is not None:
+            self.setText(widget, text)
+
+    def TextChanged(self, name, text):
+        # Typed in the widget, it already shows it
+        self.texts[name] = text
+
+    def PropertyChanged(self, name, prop, value):
+        # Changed by a click on the widget
+        self.props.setdefault(name, {})[prop] = value
+
+    def SetProperty(self, name, prop, value):
+        props = self.props.setdefault(name, {})
+        if props.get(prop) == value:
+            return
+        props[prop] = value
+        widget = self.widgets.get(name)
+        if widget is not None:
+            self.setProperty(widget, prop, value)
+
+    def SetProperties(self, names, prop, value):
+        for name in names:
+            self.SetProperty(name, prop, value)
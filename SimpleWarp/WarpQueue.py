@@ -0,0 +1,164 @@
+# Simple Warp - scripted warps
+# See PI_Simple_Warp.py for license.
+#
+# Warps asked for by other plugins and scripts wait in a queue and run on
+# later frames, one at a time: a request starts on a frame where nothing
+# else is warping, and position DataRefs only follow local_* on the next
+# frame, so at most one warp starts per frame. Terrain probing and smooth
+# warps go on over as many frames as they need. Every request ends with a
+# WarpResult passed to the reply callback, accepted or not.
+#
+# A request is a dict, "id" is optional and returned as is:
+#   {"id": 1, "lat": 50.03, "lon": 8.57}   toward coordinates
+#   {"id": 2, "ident": "KJFK"}             toward the closest navaid with exactly this ID
+#   {"id": 3, "fms": 4}                    along the route to FMS entry 4
+#   {"id": 4, "fms": None}                 toward the active FMS waypoint
+# sent with PI_SendMessageToScript as MSG_WARP_REQUEST. The result comes
+# back to the sender as MSG_WARP_RESULT, a dict with the WarpResult fields.
+# MSG_WARP_CANCEL drops the requests still waiting. Requests are refused
+# while fast cruise is on.
+
+from collections import deque, namedtuple
+
+from SimpleWarp.Engine import WarpError
+
+QUEUE_MAX = 1000
+
+# Script messages, above the range X-Plane keeps for itself
+MSG_WARP_REQUEST = 0x53570001
+MSG_WARP_CANCEL  = 0x53570002
+MSG_WARP_RESULT  = 0x53570003
+
+WarpRequest = namedtuple('WarpRequest', ['id', 'kind', 'value', 'sender'])
+WarpResult  = namedtuple('WarpResult',  ['id', 'ok', 'message', 'lat', 'lon'])
+
+def ParseRequest(param, sender=None):
+    # WarpRequest from a message parameter, ValueError when unusable
+    if not isinstance(param, dict):
+        raise ValueError("Warp request is not a dict")
+    rid = param.get("id")
+    if "lat" in param or "lon" in param:
+        try:
+            lat, lon = float(param["lat"]), float(param["lon"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Warp request needs numeric lat and lon")
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0) or (lat == 0.0 and lon == 0.0):
+            raise ValueError("Invalid coordinates {} {}".format(lat, lon))
+        return WarpRequest(rid, "coords", (lat, lon), sender)
+    if "ident" in param:
+        ident = str(param["ident"]).strip().upper()
+        if not ident or ident[:1] in ("#", "@"):
+            raise ValueError("Invalid ID {}".format(param["ident"]))
+        return WarpRequest(rid, "ident", ident, sender)
+    if "fms" in param:
+        if param["fms"] is None:
+            return WarpRequest(rid, "fms", None, sender)
+        try:
+            return WarpRequest(rid, "fms", int(param["fms"]), sender)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid FMS entry {}".format(param["fms"]))
+    raise ValueError("Warp request needs lat/lon, ident or fms")
+
+class WarpQueue:
+    def __init__(self, engine, reply, cruise=None, maxLength=QUEUE_MAX):
+        self.engine    = engine
+        self.cruise    = cruise     # FastCruise, no warps while it's on
+        self.reply     = reply      # called with (sender, WarpResult)
+        self.maxLength = maxLength
+        self.requests  = deque()
+        self.active    = None
+        self.message   = None
+        self.done      = 0
+
+    def __len__(self):
+        # Waiting and running
+        return len(self.requests) + (self.active is not None)
+
+    def Submit(self, request):
+        # False when the queue is full, the request is answered right away
+        if len(self.requests) >= self.maxLength:
+            self.Reply(request, False, "Warp queue full, {} requests waiting".format(len(self.requests)))
+            return False
+        self.requests.append(request)
+        return True
+
+    def Clear(self):
+        # Drops the waiting requests, a running warp goes on
+        while self.requests:
+            self.Reply(self.requests.popleft(), False, "Cancelled")
+
+    def Step(self):
+        # Once per frame, True while there's more to do
+        engine = self.engine
+        if self.active is not None:
+            if engine.Busy():
+                message = engine.Step()
+                if message is not None:
+                    self.message = message
+                if engine.Busy():
+                    return True
+            # Done, or cancelled from the window
+            self.Finish()
+            return bool(self.requests)
+        if not self.requests or engine.Busy():
+            # A warp started from the window runs first
+            return bool(self.requests)
+        self.Start(self.requests.popleft())
+        return len(self) > 0
+
+    def Start(self, request):
+        engine = self.engine
+        self.active  = request
+        self.message = None
+        if self.cruise is not None and self.cruise.active:
+            self.Finish(False, "fast cruise active")
+            return
+        engine.lastWarp = None
+        message = self.Target(request)
+        if message is not None:
+            self.Finish(False, message)
+            return
+        try:
+            self.message = engine.DoWarp()
+        except WarpError as e:
+            self.Finish(False, str(e))
+            return
+        if not engine.Busy():
+            self.Finish()
+
+    def Target(self, request):
+        # Sets the engine destination, None or why there's none
+        engine = self.engine
+        engine.SetDestination(0.0, 0.0, "")
+        if request.kind == "coords":
+            lat, lon = request.value
+            engine.SetDestination(lat, lon, "{:.4f} {:.4f}".format(lat, lon))
+            return None
+        if request.kind == "ident":
+            # Exactly this ID, never a prefix or name match
+            my_Lat, my_Lon = engine.GetMyCoords()
+            found = engine.FindExact(request.value, my_Lat, my_Lon)
+            if not found:
+                return "{} not found".format(request.value)
+            engine.SetDestination(found[0].lat, found[0].lon, found[0].name)
+            return None
+        if request.value is None:
+            message = engine.Find("")
+        else:
+            message = engine.Find("#{}".format(request.value))
+        if engine.destLat == 0.0 and engine.destLon == 0.0:
+            return message
+        return None
+
+    def Finish(self, ok=None, message=None):
+        # ok is whether the aircraft moved, unless given
+        request, self.active = self.active, None
+        lastWarp = self.engine.lastWarp
+        if ok is None:
+            ok = lastWarp is not None
+        self.done += 1
+        self.Reply(request, ok, message or self.message or "", lastWarp)
+
+    def Reply(self, request, ok, message, lastWarp=None):
+        lat, lon = (lastWarp[0], lastWarp[1]) if ok and lastWarp else (None, None)
+        self.reply(request.sender, WarpResult(request.id, ok, message, lat, lon))
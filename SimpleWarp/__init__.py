@@ -0,0 +1,3 @@
+# Simple Warp helper package
+# Pure Python parts of PI_Simple_Warp.py, usable without X-Plane running.
+# See PI_Simple_Warp.py for license.